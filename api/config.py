@@ -22,6 +22,9 @@ class Config:
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB
     ALLOWED_EXTENSIONS = {'mp3', 'wav', 'ogg', 'm4a', 'aac'}
     
+    # Configurações de busca
+    SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', 50))
+    
     # Configurações de segurança
     SECRET_KEY = os.environ.get('SECRET_KEY', 'musickera-secret-key-2024')
 
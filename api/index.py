@@ -1,11 +1,15 @@
 import os
 import json
 import re
+import threading
 from flask import Flask, jsonify, request, send_from_directory
 from flask_cors import CORS
 from typing import Optional, Dict
 import mimetypes
 from config import config
+# Cópia de utils/catalog.py e utils/search_index.py dentro de api/ (atualizada
+# pelo build_catalog.py): o deploy do api/ não inclui a raiz do projeto
+from utils.catalog import Catalog, load_catalog
 
 # Configuração para Vercel
 app = Flask(__name__)
@@ -22,96 +26,127 @@ mimetypes.add_type('audio/aac', '.aac')
 # Para Vercel, vamos usar variáveis de ambiente ou valores padrão
 MUSIC_DIR = os.environ.get('MUSIC_DIR', '/tmp/musics')
 COVERS_DIR = os.environ.get('COVERS_DIR', '/tmp/covers')
+CATALOG_PATH = os.environ.get('CATALOG_PATH', os.path.join(os.path.dirname(__file__), 'catalog.json'))
+SEARCH_MAX_RESULTS = app.config['SEARCH_MAX_RESULTS']
+
+# Catálogo usado enquanto não há snapshot (gerado por build_catalog.py)
+FALLBACK_MUSICS = [
+    {
+        "id": 1,
+        "title": "Acima do Sol (Ao Vivo)",
+        "artist": "Jota Quest",
+        "filename": "Acima do Sol (Ao Vivo).m4a",
+        "cover": "/musics/covers/Acima_do_Sol_Ao_Vivo_.jpg",
+        "duration": "3:45"
+    },
+    {
+        "id": 2,
+        "title": "Epitáfio",
+        "artist": "Titãs",
+        "filename": "Epitáfio.m4a",
+        "cover": "/musics/covers/Epit_fio.jpg",
+        "duration": "4:15"
+    },
+    {
+        "id": 3,
+        "title": "Fácil",
+        "artist": "Jota Quest",
+        "filename": "Fácil.m4a",
+        "cover": "/musics/covers/F_cil.jpg",
+        "duration": "3:30"
+    },
+    {
+        "id": 4,
+        "title": "Jackie Tequila",
+        "artist": "Jota Quest",
+        "filename": "Jackie Tequila.m4a",
+        "cover": "/musics/covers/Jackie_Tequila.jpg",
+        "duration": "4:20"
+    },
+    {
+        "id": 5,
+        "title": "Resposta",
+        "artist": "Jota Quest",
+        "filename": "Resposta.m4a",
+        "cover": "/musics/covers/Resposta.jpg",
+        "duration": "3:55"
+    },
+    {
+        "id": 6,
+        "title": "Só Hoje (Acústico)",
+        "artist": "Jota Quest",
+        "filename": "Só Hoje (Acústico).m4a",
+        "cover": "/musics/covers/S_Hoje_Ac_stico_.jpg",
+        "duration": "4:10"
+    },
+    {
+        "id": 7,
+        "title": "Te Ver",
+        "artist": "Jota Quest",
+        "filename": "Te Ver.mp4",
+        "cover": "/musics/covers/Te_Ver.jpg",
+        "duration": "3:40"
+    },
+    {
+        "id": 8,
+        "title": "Tempos Modernos (Estúdio)",
+        "artist": "Jota Quest",
+        "filename": "Tempos Modernos (Estúdio).m4a",
+        "cover": "/musics/covers/Tempos_Modernos_Est_dio_.jpg",
+        "duration": "4:05"
+    },
+    {
+        "id": 9,
+        "title": "Vamos Fugir",
+        "artist": "Jota Quest",
+        "filename": "Vamos Fugir.m4a",
+        "cover": "/musics/covers/Vamos_Fugir.jpg",
+        "duration": "3:50"
+    },
+    {
+        "id": 10,
+        "title": "Vou Deixar",
+        "artist": "Jota Quest",
+        "filename": "Vou Deixar.m4a",
+        "cover": "/musics/covers/Vou_Deixar.jpg",
+        "duration": "4:00"
+    }
+]
+FALLBACK_PLAYLISTS = [
+    {
+        "id": 1,
+        "name": "Jota Quest Hits",
+        "description": "Melhores músicas do Jota Quest",
+        "musics": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    }
+]
+
+_catalog: Optional[Catalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    """Snapshot do catálogo, carregado uma vez por instância (cold start).
+    Prefere o .msgpack ao lado do JSON, que já traz o índice de busca."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                msgpack_path = os.path.splitext(CATALOG_PATH)[0] + '.msgpack'
+                catalog = None
+                try:
+                    catalog = load_catalog(CATALOG_PATH, msgpack_path)
+                except Exception as e:
+                    print(f"Erro ao carregar o catálogo {CATALOG_PATH}: {e}")
+                _catalog = catalog or Catalog(FALLBACK_MUSICS, FALLBACK_PLAYLISTS)
+    return _catalog
+
 
 @app.route('/api/musics', methods=['GET'])
 def get_musics():
     """Lista todas as músicas disponíveis"""
     try:
-        # Para Vercel, vamos retornar uma lista estática das músicas
-        # ou implementar uma solução baseada em banco de dados
-        musics = [
-            {
-                "id": 1,
-                "title": "Acima do Sol (Ao Vivo)",
-                "artist": "Jota Quest",
-                "filename": "Acima do Sol (Ao Vivo).m4a",
-                "cover": "/musics/covers/Acima_do_Sol_Ao_Vivo_.jpg",
-                "duration": "3:45"
-            },
-            {
-                "id": 2,
-                "title": "Epitáfio",
-                "artist": "Titãs",
-                "filename": "Epitáfio.m4a",
-                "cover": "/musics/covers/Epit_fio.jpg",
-                "duration": "4:15"
-            },
-            {
-                "id": 3,
-                "title": "Fácil",
-                "artist": "Jota Quest",
-                "filename": "Fácil.m4a",
-                "cover": "/musics/covers/F_cil.jpg",
-                "duration": "3:30"
-            },
-            {
-                "id": 4,
-                "title": "Jackie Tequila",
-                "artist": "Jota Quest",
-                "filename": "Jackie Tequila.m4a",
-                "cover": "/musics/covers/Jackie_Tequila.jpg",
-                "duration": "4:20"
-            },
-            {
-                "id": 5,
-                "title": "Resposta",
-                "artist": "Jota Quest",
-                "filename": "Resposta.m4a",
-                "cover": "/musics/covers/Resposta.jpg",
-                "duration": "3:55"
-            },
-            {
-                "id": 6,
-                "title": "Só Hoje (Acústico)",
-                "artist": "Jota Quest",
-                "filename": "Só Hoje (Acústico).m4a",
-                "cover": "/musics/covers/S_Hoje_Ac_stico_.jpg",
-                "duration": "4:10"
-            },
-            {
-                "id": 7,
-                "title": "Te Ver",
-                "artist": "Jota Quest",
-                "filename": "Te Ver.mp4",
-                "cover": "/musics/covers/Te_Ver.jpg",
-                "duration": "3:40"
-            },
-            {
-                "id": 8,
-                "title": "Tempos Modernos (Estúdio)",
-                "artist": "Jota Quest",
-                "filename": "Tempos Modernos (Estúdio).m4a",
-                "cover": "/musics/covers/Tempos_Modernos_Est_dio_.jpg",
-                "duration": "4:05"
-            },
-            {
-                "id": 9,
-                "title": "Vamos Fugir",
-                "artist": "Jota Quest",
-                "filename": "Vamos Fugir.m4a",
-                "cover": "/musics/covers/Vamos_Fugir.jpg",
-                "duration": "3:50"
-            },
-            {
-                "id": 10,
-                "title": "Vou Deixar",
-                "artist": "Jota Quest",
-                "filename": "Vou Deixar.m4a",
-                "cover": "/musics/covers/Vou_Deixar.jpg",
-                "duration": "4:00"
-            }
-        ]
-        
+        musics = get_catalog().tracks
         return jsonify({
             "success": True,
             "musics": musics,
@@ -126,7 +161,7 @@ def get_musics():
 @app.route('/api/search', methods=['GET'])
 def search_musics():
     """Busca músicas por termo"""
-    query = request.args.get('q', '').lower()
+    query = request.args.get('q', '').strip()
     if not query:
         return jsonify({
             "success": False,
@@ -134,25 +169,7 @@ def search_musics():
         }), 400
     
     try:
-        # Implementar busca nas músicas
-        all_musics = [
-            {
-                "id": 1,
-                "title": "Acima do Sol (Ao Vivo)",
-                "artist": "Jota Quest",
-                "filename": "Acima do Sol (Ao Vivo).m4a",
-                "cover": "/musics/covers/Acima_do_Sol_Ao_Vivo_.jpg",
-                "duration": "3:45"
-            },
-            # ... outras músicas
-        ]
-        
-        # Filtrar por termo de busca
-        results = []
-        for music in all_musics:
-            if (query in music['title'].lower() or 
-                query in music['artist'].lower()):
-                results.append(music)
+        results = [music for _, _, music in get_catalog().search.search(query, SEARCH_MAX_RESULTS)]
         
         return jsonify({
             "success": True,
@@ -179,14 +196,7 @@ def health_check():
 def get_playlist():
     """Retorna playlist padrão"""
     try:
-        playlist = [
-            {
-                "id": 1,
-                "name": "Jota Quest Hits",
-                "description": "Melhores músicas do Jota Quest",
-                "musics": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
-            }
-        ]
+        playlist = get_catalog().playlists
         
         return jsonify({
             "success": True,
@@ -0,0 +1,117 @@
+"""
+Snapshot do catálogo (faixas, playlists e índice de busca)
+
+Gerado por ``build_catalog.py`` a partir de ``musics/`` e lido pelo
+``api/index.py`` (Vercel), que não tem acesso à biblioteca. O JSON traz
+faixas e playlists; a forma binária opcional (msgpack) traz também o índice
+de busca já calculado, para o cold start não normalizar todos os textos.
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.search_index import SearchIndex
+
+CATALOG_VERSION = 1
+
+
+def _msgpack():
+    """Módulo msgpack (opcional), importado só ao ler ou gravar a forma binária."""
+    try:
+        import msgpack
+    except Exception:
+        return None
+    return msgpack
+
+
+def msgpack_available() -> bool:
+    return _msgpack() is not None
+
+
+class Catalog:
+    """Snapshot carregado: ``tracks``, ``playlists`` e ``search`` (SearchIndex)."""
+
+    def __init__(self, tracks: List[Dict[str, Any]], playlists: List[Dict[str, Any]],
+                 generated: Optional[float] = None, search_state: Optional[Dict[str, list]] = None):
+        self.tracks = tracks
+        self.playlists = playlists
+        self.generated = generated
+        payloads = {str(track['id']): track for track in tracks}
+        if search_state is not None:
+            self.search = SearchIndex.from_export(search_state, payloads)
+        else:
+            self.search = SearchIndex()
+            for track in tracks:
+                self.search.add(str(track['id']), search_fields(track), track)
+
+    def snapshot(self, with_search: bool = False) -> Dict[str, Any]:
+        data = {
+            'version': CATALOG_VERSION,
+            'generated': self.generated,
+            'tracks': self.tracks,
+            'playlists': self.playlists,
+        }
+        if with_search:
+            data['search'] = self.search.export()
+        return data
+
+
+def search_fields(track: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    return {
+        'title': track.get('title'),
+        'artist': track.get('artist'),
+        'album': track.get('album'),
+        'playlist': track.get('playlist'),
+        'name': os.path.splitext(track.get('filename') or '')[0],
+    }
+
+
+def write_catalog(catalog: Catalog, json_path: str, msgpack_path: Optional[str] = None) -> None:
+    """Grava o JSON compacto (e, se pedido, o msgpack com o índice de busca)
+    em arquivos temporários renomeados no fim."""
+    catalog.generated = catalog.generated or time.time()
+    _write_atomic(json_path, json.dumps(catalog.snapshot(), ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    if msgpack_path:
+        msgpack = _msgpack()
+        if msgpack is None:
+            raise RuntimeError("msgpack não está instalado. Instale 'msgpack' para gerar o snapshot binário.")
+        _write_atomic(msgpack_path, msgpack.packb(catalog.snapshot(with_search=True), use_bin_type=True))
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _not_older(path: str, other: str) -> bool:
+    """``path`` existe e foi gravado depois de ``other`` (ou ``other`` não existe)."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return False
+    try:
+        return mtime >= os.stat(other).st_mtime_ns
+    except OSError:
+        return True
+
+
+def load_catalog(json_path: str, msgpack_path: Optional[str] = None) -> Optional[Catalog]:
+    """Carrega o snapshot, preferindo o msgpack (com índice pronto) se ele não
+    for mais antigo que o JSON. None se nenhum arquivo existe ou a versão não
+    é compatível."""
+    data = None
+    msgpack = _msgpack() if msgpack_path and _not_older(msgpack_path, json_path) else None
+    if msgpack is not None:
+        with open(msgpack_path, 'rb') as f:
+            data = msgpack.unpackb(f.read(), raw=False, strict_map_key=False)
+    elif os.path.exists(json_path):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    if not data or data.get('version') != CATALOG_VERSION:
+        return None
+    return Catalog(data['tracks'], data['playlists'], data.get('generated'), data.get('search'))
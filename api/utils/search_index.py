@@ -0,0 +1,222 @@
+"""
+Índice de busca em memória (título, artista, álbum, playlist)
+
+Os textos são normalizados sem acentos e sem diferenciar maiúsculas
+("Epitáfio" casa com "epitafio"). Cada termo da consulta casa com palavras
+inteiras, com prefixos (autocompletar enquanto o usuário digita) e, para
+termos com 4+ letras, com palavras a até 1-2 letras de distância (erros de
+digitação), encontradas por trigramas. Todas as palavras da consulta precisam
+casar; o resultado é ordenado pela qualidade do casamento e pelo peso do
+campo. Documentos podem ser adicionados e removidos a qualquer momento.
+"""
+
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from collections import Counter
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+FIELD_WEIGHTS = {'title': 3.0, 'artist': 2.0, 'album': 1.0, 'playlist': 1.0, 'name': 0.5}
+
+EXACT = 1.0
+# Prefixos de termos muito curtos casam com muitas palavras: limita a expansão
+MAX_PREFIX_EXPANSIONS = 512
+MAX_FUZZY_CANDIDATES = 256
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def fold(text: str) -> str:
+    """Minúsculas e sem acentos ('Só Hoje' -> 'so hoje')."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(fold(text))
+
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f'${token}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_distance(term: str) -> int:
+    if len(term) < 4:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Distância de Levenshtein, interrompida (retorna limit + 1) acima de ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class SearchIndex:
+    """
+    Índice invertido (palavra -> documentos) com vocabulário ordenado para
+    prefixos e trigramas para tolerância a erros.
+
+    ``add(doc_id, fields, payload)`` indexa os campos de FIELD_WEIGHTS
+    presentes em ``fields``; ``search`` devolve ``(score, doc_id, payload)``.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        self.weights = dict(weights or FIELD_WEIGHTS)
+        self._docs: Dict[str, Tuple[Dict[str, float], Any, str]] = {}
+        # palavra -> {documento: peso do campo em que ela aparece}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._vocab: List[str] = []
+        self._trigram_index: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._docs
+
+    def add(self, doc_id: str, fields: Dict[str, Optional[str]], payload: Any = None) -> None:
+        """Indexa (ou reindexa) um documento."""
+        tokens: Dict[str, float] = {}
+        for field, weight in self.weights.items():
+            for token in tokenize(fields.get(field) or ''):
+                if weight > tokens.get(token, 0):
+                    tokens[token] = weight
+        sort_key = fold(fields.get('title') or fields.get('name') or doc_id)
+        with self._lock:
+            self._remove(doc_id)
+            self._docs[doc_id] = (tokens, payload, sort_key)
+            for token, weight in tokens.items():
+                posting = self._postings.get(token)
+                if posting is None:
+                    posting = self._postings[token] = {}
+                    bisect.insort(self._vocab, token)
+                    for trigram in _trigrams(token):
+                        self._trigram_index.setdefault(trigram, set()).add(token)
+                posting[doc_id] = weight
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: str) -> None:
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        for token in entry[0]:
+            posting = self._postings[token]
+            posting.pop(doc_id, None)
+            if not posting:
+                # Palavra sem documentos sai do vocabulário e dos trigramas
+                del self._postings[token]
+                del self._vocab[bisect.bisect_left(self._vocab, token)]
+                for trigram in _trigrams(token):
+                    tokens = self._trigram_index[trigram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigram_index[trigram]
+
+    def _expand(self, term: str) -> Dict[str, float]:
+        """Palavras do vocabulário que casam com ``term`` e a qualidade (0-1) de cada casamento."""
+        matches: Dict[str, float] = {}
+        if term in self._postings:
+            matches[term] = EXACT
+        start = bisect.bisect_left(self._vocab, term)
+        for token in self._vocab[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not token.startswith(term):
+                break
+            if token != term:
+                matches[token] = 0.5 + 0.4 * len(term) / len(token)
+
+        limit = _max_distance(term)
+        if not matches and limit:
+            overlap = Counter()
+            for trigram in _trigrams(term):
+                overlap.update(self._trigram_index.get(trigram, ()))
+            # O termo tem len(term) trigramas e cada edição altera no máximo 3
+            needed = max(1, len(term) - 3 * limit)
+            candidates = [token for token, count in overlap.most_common(MAX_FUZZY_CANDIDATES) if count >= needed]
+            for token in candidates:
+                distance = edit_distance(term, token, limit)
+                if distance <= limit:
+                    matches[token] = 0.6 - 0.15 * distance
+        return matches
+
+    def search(self, query: str, limit: int = 50) -> List[Tuple[float, str, Any]]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or limit <= 0:
+            return []
+        with self._lock:
+            per_term = []
+            for term in terms:
+                matches = self._expand(term)
+                if not matches:
+                    return []
+                per_term.append(matches)
+
+            # Pontua os documentos do termo mais raro direto das listas
+            # invertidas; os demais termos são conferidos nas palavras de cada um
+            per_term.sort(key=lambda matches: sum(len(self._postings[token]) for token in matches))
+            scores: Dict[str, float] = {}
+            for token, quality in per_term[0].items():
+                for doc_id, weight in self._postings[token].items():
+                    score = quality * weight
+                    if score > scores.get(doc_id, 0.0):
+                        scores[doc_id] = score
+            for matches in per_term[1:]:
+                remaining = {}
+                for doc_id, score in scores.items():
+                    tokens = self._docs[doc_id][0]
+                    if len(matches) <= len(tokens):
+                        pairs = ((quality, tokens[token]) for token, quality in matches.items() if token in tokens)
+                    else:
+                        pairs = ((matches[token], weight) for token, weight in tokens.items() if token in matches)
+                    best = max((quality * weight for quality, weight in pairs), default=0.0)
+                    if best:
+                        remaining[doc_id] = score + best
+                scores = remaining
+            if not scores:
+                return []
+
+            # Os ``limit`` melhores; empates no corte são decididos pelo título
+            top = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+            threshold = top[-1][1]
+            ranked = sorted(
+                ((score, self._docs[doc_id][2], doc_id) for doc_id, score in scores.items() if score >= threshold),
+                key=lambda item: (-item[0], item[1], item[2]),
+            )[:limit]
+            return [(round(score, 4), doc_id, self._docs[doc_id][1]) for score, _, doc_id in ranked]
+
+    def export(self) -> Dict[str, list]:
+        """Estado serializável (palavras e peso de cada documento), sem os payloads."""
+        with self._lock:
+            return {doc_id: [tokens, sort_key] for doc_id, (tokens, _, sort_key) in self._docs.items()}
+
+    @classmethod
+    def from_export(cls, state: Dict[str, list], payloads: Dict[str, Any],
+                    weights: Optional[Dict[str, float]] = None) -> 'SearchIndex':
+        """Reconstrói um índice exportado sem normalizar os textos de novo."""
+        index = cls(weights)
+        for doc_id, (tokens, sort_key) in state.items():
+            index._docs[doc_id] = (tokens, payloads.get(doc_id), sort_key)
+            for token, weight in tokens.items():
+                index._postings.setdefault(token, {})[doc_id] = weight
+        index._vocab = sorted(index._postings)
+        for token in index._vocab:
+            for trigram in _trigrams(token):
+                index._trigram_index.setdefault(trigram, set()).add(token)
+        return index
@@ -0,0 +1,458 @@
+"""
+Benchmark das rotas de catálogo com bibliotecas sintéticas
+
+Gera bibliotecas de faixas pequenas, mas com tags de verdade (MP3 com ID3v2.4
+e M4A com átomos ilst, lidas normalmente pelo mutagen), espalhadas por
+várias pastas de playlist, com capas. Parte das faixas não tem tags nem
+"Artista - Título" no nome, para passar pelo Deezer. O Deezer é um servidor
+HTTP local (DeezerStub), com latência configurável.
+
+Cada tamanho de biblioteca roda num processo próprio (o pico de RSS é do
+processo) e mede pelo test client do Flask, na ordem de SCENARIOS: a
+primeira requisição (``cold_ms``, que inclui montar índice, ler tags e
+consultar o Deezer), a espera até o trabalho em segundo plano que ela
+disparou terminar (``settle_ms``: capas, miniaturas) e depois ``--repeat``
+requisições (p50/p90/p95/p99).
+O resultado é um JSON (--output) que pode ser comparado com o de outra
+execução (--compare).
+
+Uso: python benchmarks/library.py [--sizes 1000,10000,100000] [--repeat 20]
+                                  [--output resultados.json] [--compare anterior.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (nome, URL); executados nesta ordem, todos sobre a mesma biblioteca
+SCENARIOS = [
+    ('list_playlists', '/list_playlists'),
+    ('list_music_skip_metadata', '/list_music?skip_metadata=true'),
+    ('list_music_metadata', '/list_music?skip_metadata=false'),
+    ('check_music_changes', '/check_music_changes?last_check=0'),
+    ('check_music_changes_since', '/check_music_changes?since={seq}&journal_id={journal_id}'),
+]
+
+PERCENTILES = (50, 90, 95, 99)
+
+ARTISTS = ['Titãs', 'Jota Quest', 'Legião Urbana', 'Skank', 'Os Paralamas do Sucesso', 'Pitty',
+           'Capital Inicial', 'Nação Zumbi', 'Marisa Monte', 'Gilberto Gil', 'Céu', 'Emicida']
+WORDS = ['amor', 'noite', 'coração', 'estrada', 'mar', 'sol', 'saudade', 'cidade', 'tempo',
+         'lua', 'canção', 'vento', 'sonho', 'rua', 'fogo', 'janela']
+
+
+# --- Arquivos sintéticos ---------------------------------------------------
+
+def _syncsafe(n: int) -> bytes:
+    return bytes(((n >> 21) & 0x7f, (n >> 14) & 0x7f, (n >> 7) & 0x7f, n & 0x7f))
+
+
+def mp3_bytes(tags: Dict[str, str], frames: int = 4) -> bytes:
+    """MP3 mínimo: ID3v2.4 (UTF-8) com title/artist/album/year e alguns quadros MPEG vazios."""
+    body = b''
+    for frame_id, key in (('TIT2', 'title'), ('TPE1', 'artist'), ('TALB', 'album'), ('TDRC', 'year')):
+        if tags.get(key):
+            data = b'\x03' + tags[key].encode('utf-8')
+            body += frame_id.encode('ascii') + _syncsafe(len(data)) + b'\x00\x00' + data
+    header = b'ID3\x04\x00\x00' + _syncsafe(len(body)) if body else b''
+    # MPEG-1 Layer III, 128 kbps, 44,1 kHz: 417 bytes por quadro
+    return header + body + (b'\xff\xfb\x90\x64' + bytes(413)) * frames
+
+
+def _atom(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I', 8 + len(payload)) + kind + payload
+
+
+def m4a_bytes(tags: Dict[str, str], seconds: int = 1, audio_bytes: int = 64) -> bytes:
+    """M4A mínimo: ftyp + moov (mvhd e udta/meta/ilst com as tags) + mdat."""
+    ilst = b''
+    for atom, key in (('\xa9nam', 'title'), ('\xa9ART', 'artist'), ('\xa9alb', 'album'), ('\xa9day', 'year')):
+        if tags.get(key):
+            data = _atom(b'data', struct.pack('>II', 1, 0) + tags[key].encode('utf-8'))
+            ilst += _atom(atom.encode('latin-1'), data)
+    meta = _atom(b'meta', bytes(4) + _atom(b'hdlr', bytes(8) + b'mdirappl' + bytes(9)) + _atom(b'ilst', ilst))
+    mvhd = _atom(b'mvhd', bytes(4) + struct.pack('>IIII', 0, 0, 1000, seconds * 1000)
+                 + struct.pack('>IH', 0x10000, 0x100) + bytes(10)
+                 + struct.pack('>9I', 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+                 + bytes(24) + struct.pack('>I', 2))
+    moov = _atom(b'moov', mvhd + _atom(b'udta', meta))
+    return _atom(b'ftyp', b'M4A \x00\x00\x02\x00M4A isom') + moov + _atom(b'mdat', bytes(audio_bytes))
+
+
+def cover_images(count: int = 8) -> List[bytes]:
+    """Algumas capas JPEG distintas (Pillow); sem Pillow, nenhuma."""
+    try:
+        from PIL import Image
+    except Exception:
+        return []
+    images = []
+    for i in range(count):
+        buffer = BytesIO()
+        Image.new('RGB', (300, 300), ((i * 67) % 256, (i * 131) % 256, (i * 29) % 256)).save(buffer, 'JPEG')
+        images.append(buffer.getvalue())
+    return images
+
+
+def _safe_name(text: str) -> str:
+    return ''.join('_' if c in '<>:"/\\|?*' else c for c in text)
+
+
+def generate_library(music_dir: str, tracks: int, playlists: int = 50, untagged_ratio: float = 0.05,
+                     cover_ratio: float = 0.5, loose_ratio: float = 0.02, seed: int = 0,
+                     audio_bytes: int = 0) -> Dict[str, Any]:
+    """Cria ``tracks`` faixas em ``playlists`` pastas de ``music_dir`` (e
+    ``loose_ratio`` delas na raiz, a playlist "Geral"), metade M4A e metade MP3,
+    com cerca de ``audio_bytes`` de áudio cada (o mínimo se 0).
+
+    ``untagged_ratio`` das faixas não tem tags nem "Artista - Título" no nome
+    (só o Deezer resolve); ``cover_ratio`` das faixas e das playlists ganha
+    capa em ``covers/``, com o nome que o server.py procura."""
+    from server import _cover_stem, _safe_stem
+
+    rng = random.Random(seed)
+    covers_dir = os.path.join(music_dir, 'covers')
+    os.makedirs(covers_dir, exist_ok=True)
+    images = cover_images()
+    folders = [f'Playlist {i:03d} {WORDS[i % len(WORDS)].title()}' for i in range(max(1, playlists))]
+    for folder in folders:
+        os.makedirs(os.path.join(music_dir, folder), exist_ok=True)
+        if images and rng.random() < cover_ratio:
+            with open(os.path.join(covers_dir, f'{_safe_stem(folder)}.jpg'), 'wb') as f:
+                f.write(rng.choice(images))
+
+    started = time.perf_counter()
+    total_bytes = untagged = covers = 0
+    for i in range(tracks):
+        folder = '' if rng.random() < loose_ratio else folders[i % len(folders)]
+        ext = 'm4a' if i % 2 else 'mp3'
+        if rng.random() < untagged_ratio:
+            name = f'faixa_{i:06d}.{ext}'
+            tags = {}
+            untagged += 1
+        else:
+            artist = rng.choice(ARTISTS)
+            title = f'{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}'
+            name = _safe_name(f'{artist} - {title}.{ext}')
+            tags = {'title': title, 'artist': artist, 'album': f'Álbum {i % 997}',
+                    'year': str(1980 + i % 45)}
+        if ext == 'm4a':
+            data = m4a_bytes(tags, audio_bytes=max(64, audio_bytes))
+        else:
+            data = mp3_bytes(tags, frames=max(4, audio_bytes // 417))
+        with open(os.path.join(music_dir, folder, name), 'wb') as f:
+            f.write(data)
+        total_bytes += len(data)
+        if images and rng.random() < cover_ratio:
+            with open(os.path.join(covers_dir, f'{_cover_stem(name)}.jpg'), 'wb') as f:
+                f.write(rng.choice(images))
+            covers += 1
+    return {
+        'tracks': tracks,
+        'playlists': len(folders),
+        'untagged': untagged,
+        'covers': covers,
+        'bytes': total_bytes,
+        'generate_s': round(time.perf_counter() - started, 3),
+    }
+
+
+# --- Deezer local ----------------------------------------------------------
+
+class DeezerStub:
+    """Servidor HTTP local que responde /search, /album/<id> e /cover/<n>.jpg
+    como a API do Deezer, com ``latency`` segundos de atraso por requisição.
+
+    ``error_rate`` das requisições falha como o Deezer real falha: metade com
+    HTTP 503, metade com HTTP 200 e o erro de cota no corpo."""
+
+    def __init__(self, latency: float = 0.0, images: Optional[List[bytes]] = None,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.images = images or [b'\xff\xd8\xff\xd9']
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        self._thread = threading.Thread(target=self._server.serve_forever, name='deezer-stub', daemon=True)
+
+    def __enter__(self) -> 'DeezerStub':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    failure = stub._rng.random() < stub.error_rate and stub._rng.choice(('http', 'quota'))
+                    if failure:
+                        stub.errors += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                url = urlsplit(self.path)
+                if failure == 'http':
+                    return self._send(b'{}', 'application/json', 503)
+                if failure == 'quota':
+                    body = {'error': {'type': 'Exception', 'message': 'Quota limit exceeded', 'code': 4}}
+                elif url.path == '/search':
+                    query = (parse_qs(url.query).get('q') or [''])[0]
+                    album_id = sum(query.encode('utf-8')) % 1000
+                    body = {'data': [{
+                        'title': query.title() or 'Faixa',
+                        'artist': {'name': 'Artista Deezer'},
+                        'album': {'id': album_id, 'title': f'Álbum Deezer {album_id}',
+                                  'cover_xl': f'{stub.url}/cover/{album_id}.jpg'},
+                    }]}
+                elif url.path.startswith('/album/'):
+                    body = {'id': url.path.rsplit('/', 1)[-1], 'release_date': '2001-05-04'}
+                elif url.path.startswith('/cover/'):
+                    number = int(url.path.rsplit('/', 1)[-1].split('.')[0] or 0)
+                    return self._send(stub.images[number % len(stub.images)], 'image/jpeg')
+                else:
+                    body = {'error': {'type': 'DataException', 'message': 'no data', 'code': 800}}
+                self._send(json.dumps(body).encode('utf-8'), 'application/json')
+
+            def _send(self, data: bytes, content_type: str, status: int = 200):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# --- Medição ---------------------------------------------------------------
+
+def peak_rss_mb() -> float:
+    """Pico de memória residente do processo até agora."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KiB; macOS, bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Percentis (p50/p90/p95/p99), média e máximo, em ms."""
+    ordered = sorted(samples)
+    summary = {}
+    for p in PERCENTILES:
+        # Método nearest-rank
+        rank = max(1, -(-p * len(ordered) // 100))
+        summary[f'p{p}_ms'] = round(ordered[rank - 1], 3)
+    summary['mean_ms'] = round(statistics.fmean(ordered), 3)
+    summary['max_ms'] = round(ordered[-1], 3)
+    return summary
+
+
+def _timed_get(client, url: str) -> Tuple[float, Any]:
+    started = time.perf_counter()
+    response = client.get(url)
+    body = response.get_data()
+    return (time.perf_counter() - started) * 1000, (response, body)
+
+
+def wait_idle(work_queue, timeout: float = 300) -> None:
+    """Espera a fila de segundo plano (DedupWorkQueue) esvaziar."""
+    deadline = time.monotonic() + timeout
+    while work_queue.pending_count() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def benchmark_library(client, repeat: int = 20, journal=None,
+                      settle=None) -> Dict[str, Dict[str, Any]]:
+    """Roda SCENARIOS com o test client ``client``. ``journal`` (o
+    ``_library_journal`` do server) preenche o cursor de check_music_changes?since;
+    ``settle()`` espera o trabalho em segundo plano antes das medições repetidas."""
+    results = {}
+    for name, template in SCENARIOS:
+        url = template.format(seq=journal.seq if journal else 0,
+                              journal_id=journal.journal_id if journal else '')
+        cold_ms, (response, body) = _timed_get(client, url)
+        started = time.perf_counter()
+        if settle is not None:
+            settle()
+        settle_ms = (time.perf_counter() - started) * 1000
+        samples = [_timed_get(client, url)[0] for _ in range(repeat)]
+        data = response.get_json(silent=True) or {}
+        music = data.get('music') or []
+        results[name] = {
+            'url': url,
+            'status': response.status_code,
+            'response_bytes': len(body),
+            'items': data.get('count'),
+            'metadata_pending': sum(1 for item in music if item.get('metadata_pending')),
+            'cold_ms': round(cold_ms, 3),
+            'settle_ms': round(settle_ms, 3),
+            **summarize(samples),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+    return results
+
+
+def run_single(tracks: int, args) -> Dict[str, Any]:
+    """Um tamanho de biblioteca, do zero (roda no processo filho)."""
+    workdir = tempfile.mkdtemp(prefix=f'musickera-bench-{tracks}-', dir=args.workdir)
+    try:
+        music_dir = os.path.join(workdir, 'musics')
+        os.environ['CACHE_DIR'] = os.path.join(workdir, 'cache')
+        os.environ['LIBRARY_WATCHER'] = 'off'
+        sys.path.insert(0, PROJECT_ROOT)
+        import server
+
+        library = generate_library(music_dir, tracks, args.playlists or max(1, tracks // 200),
+                                   args.untagged_ratio, args.cover_ratio, seed=args.seed)
+        server.MUSIC_DIR = music_dir
+        server.COVERS_DIR = os.path.join(music_dir, 'covers')
+        rss_before = peak_rss_mb()
+        with DeezerStub(args.deezer_latency / 1000, cover_images(2)) as stub:
+            server.settings.DEEZER_API_URL = stub.url
+            server.settings.RATE_LIMIT = dict(server.settings.RATE_LIMIT, deezer=args.deezer_rate)
+            scenarios = benchmark_library(server.app.test_client(), args.repeat, server._library_journal,
+                                          settle=lambda: wait_idle(server._cover_queue))
+            deezer_requests = stub.requests
+        return {
+            **library,
+            'rss_before_requests_mb': rss_before,
+            'peak_rss_mb': peak_rss_mb(),
+            'deezer_requests': deezer_requests,
+            'scenarios': scenarios,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> List[str]:
+    """Linhas com a variação de p50/p95/cold e do pico de RSS por tamanho e cenário."""
+    before = {lib['tracks']: lib for lib in previous.get('libraries', [])}
+    lines = []
+    for lib in current['libraries']:
+        old = before.get(lib['tracks'])
+        if old is None:
+            continue
+        lines.append(f"{lib['tracks']} faixas: pico de RSS {old['peak_rss_mb']} -> {lib['peak_rss_mb']} MB")
+        for name, result in lib['scenarios'].items():
+            old_result = old['scenarios'].get(name)
+            if old_result is None:
+                continue
+            changes = []
+            for metric in ('p50_ms', 'p95_ms', 'cold_ms'):
+                if old_result[metric]:
+                    changes.append(f"{metric[:-3]} {result[metric] / old_result[metric] - 1:+.0%}")
+            lines.append(f"  {name:28} {', '.join(changes)}")
+    return lines
+
+
+def _print_report(results: Dict[str, Any]) -> None:
+    for lib in results['libraries']:
+        print(f"\n{lib['tracks']} faixas em {lib['playlists']} playlists ({lib['untagged']} sem tags, "
+              f"{lib['covers']} capas) - gerada em {lib['generate_s']}s, "
+              f"{lib['deezer_requests']} chamadas ao Deezer local, pico de RSS {lib['peak_rss_mb']} MB")
+        print(f"  {'cenário':28} {'cold':>9} {'settle':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'RSS':>8}")
+        for name, r in lib['scenarios'].items():
+            print(f"  {name:28} {r['cold_ms']:8.1f}ms {r['settle_ms']:8.1f}ms {r['p50_ms']:8.1f}ms "
+                  f"{r['p95_ms']:8.1f}ms {r['p99_ms']:8.1f}ms {r['peak_rss_mb']:6.0f}MB")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark das rotas de catálogo com bibliotecas sintéticas")
+    parser.add_argument('--sizes', default='1000,10000,100000', help="quantidade de faixas, separadas por vírgula")
+    parser.add_argument('--playlists', type=int, help="pastas de playlist (padrão: uma a cada 200 faixas)")
+    parser.add_argument('--repeat', type=int, default=20, help="requisições medidas por cenário, após a primeira")
+    parser.add_argument('--untagged-ratio', type=float, default=0.05, help="fração de faixas que dependem do Deezer")
+    parser.add_argument('--cover-ratio', type=float, default=0.5, help="fração de faixas e playlists com capa")
+    parser.add_argument('--deezer-latency', type=float, default=20, help="latência do Deezer local, em ms")
+    parser.add_argument('--deezer-rate', default='1000 per second',
+                        help="limite de taxa usado com o Deezer local (o real é '50 per 5 seconds')")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help="onde criar as bibliotecas (padrão: pasta temporária do sistema)")
+    parser.add_argument('--output', help="grava os resultados em JSON")
+    parser.add_argument('--compare', help="JSON de uma execução anterior para comparar")
+    parser.add_argument('--json', action='store_true', help="imprime os resultados em JSON")
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.single is not None:
+        print(json.dumps(run_single(args.single, args)))
+        return 0
+
+    own_args = list(argv if argv is not None else sys.argv[1:])
+    libraries = []
+    for size in (int(s) for s in args.sizes.split(',') if s.strip()):
+        # Processo novo por tamanho: o pico de RSS não se mistura entre bibliotecas
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), *own_args, '--single', str(size)],
+                              cwd=PROJECT_ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr, file=sys.stderr)
+            print(f"❌ Falha no benchmark com {size} faixas", file=sys.stderr)
+            return 1
+        libraries.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'repeat': args.repeat,
+            'deezer_latency_ms': args.deezer_latency,
+            'deezer_rate': args.deezer_rate,
+        },
+        'libraries': libraries,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        _print_report(results)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        print(f"\nComparação com {args.compare} ({previous.get('meta', {}).get('commit')}):")
+        for line in compare(results, previous):
+            print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,470 @@
+"""
+Teste de carga: vários navegadores consultando o server.py enquanto um
+download roda
+
+Sobe o server.py num servidor WSGI de verdade (gunicorn com --workers e
+--threads; sem gunicorn, o servidor do werkzeug com threads, num processo
+só) sobre uma biblioteca sintética (benchmarks/library.py). O Deezer é o
+DeezerStub local, com latência e taxa de erros configuráveis, e o "YouTube"
+é um feed RSS local (MediaFeedStub) que o yt-dlp baixa como playlist, com
+banda limitada para o download durar o teste.
+
+A carga é de malha aberta: as requisições chegam a ``--qps`` por segundo
+(intervalos exponenciais) numa mistura de /list_playlists, /list_music,
+/check_music_changes e /musics/... com Range, independentemente de quanto
+o servidor demora. A latência é medida a partir do horário agendado, então
+inclui a espera quando o cliente satura (sem "coordinated omission").
+Navegadores reaproveitam conexões e revalidam com If-None-Match, como o
+front-end faz ao consultar periodicamente.
+
+Relata p50/p95/p99, vazão e taxa de erros (geral, por tipo de requisição e
+durante o download) e grava JSON com --output.
+
+Uso: python benchmarks/load.py [--qps 50] [--duration 30] [--workers 4] [--threads 4]
+                               [--deezer-latency 50] [--deezer-error-rate 0.05] [--output carga.json]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.library import DeezerStub, cover_images, generate_library, m4a_bytes, summarize  # noqa: E402
+
+# Peso de cada tipo de requisição na mistura padrão
+DEFAULT_MIX = {
+    'list_playlists': 2,
+    'list_music': 3,
+    'list_music_metadata': 1,
+    'check_music_changes': 6,
+    'range': 4,
+}
+
+OK_STATUSES = (200, 206, 304)
+
+
+class MediaFeedStub:
+    """Feed RSS local (``/feed.rss``) com ``tracks`` faixas M4A de
+    ``track_bytes`` cada, servidas a até ``bandwidth`` bytes/s por conexão.
+    O yt-dlp trata o feed como playlist (extrator genérico)."""
+
+    def __init__(self, tracks: int = 10, track_bytes: int = 2 * 1024 * 1024, bandwidth: int = 512 * 1024):
+        self.tracks = tracks
+        self.bandwidth = bandwidth
+        self.audio = m4a_bytes({'title': 'Faixa', 'artist': 'Feed Local'}, audio_bytes=track_bytes)
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        self._thread = threading.Thread(target=self._server.serve_forever, name='media-stub', daemon=True)
+
+    def __enter__(self) -> 'MediaFeedStub':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def feed(self) -> bytes:
+        items = ''.join(
+            f'<item><title>Faixa {i:03d}</title><guid>faixa-{i:03d}</guid>'
+            f'<enclosure url="{self.url}/media/{i}.m4a" type="audio/mp4" length="{len(self.audio)}"/></item>'
+            for i in range(self.tracks)
+        )
+        return (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+                f'<title>Carga</title><link>{self.url}/</link>{items}</channel></rss>').encode('utf-8')
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/feed.rss':
+                    return self._send(stub.feed(), 'application/rss+xml')
+                if self.path.startswith('/media/'):
+                    return self._send(stub.audio, 'audio/mp4', throttle=True)
+                self.send_error(404)
+
+            def do_HEAD(self):
+                self.send_response(200 if self.path.startswith('/media/') else 404)
+                self.send_header('Content-Length', str(len(stub.audio)))
+                self.end_headers()
+
+            def _send(self, data: bytes, content_type: str, throttle: bool = False):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                chunk = max(1024, stub.bandwidth // 10) if throttle else len(data)
+                try:
+                    for start in range(0, len(data), chunk):
+                        self.wfile.write(data[start:start + chunk])
+                        if throttle:
+                            time.sleep(chunk / stub.bandwidth)
+                except ConnectionError:
+                    # O yt-dlp fecha a conexão de sondagem antes do fim
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def parse_mix(spec: Optional[str]) -> Dict[str, float]:
+    """'list_playlists=2,range=4' -> pesos (tipos omitidos ficam de fora)."""
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Tipo de requisição desconhecido: {kind!r} (use {', '.join(DEFAULT_MIX)})")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind: str, port: int, workers: int, threads: int, env: Dict[str, str],
+                 log_path: str) -> subprocess.Popen:
+    """Sobe o server.py com gunicorn ou, na falta dele, com o werkzeug."""
+    if kind == 'gunicorn':
+        args = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+                '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', '--timeout', '120', 'server:app']
+        # Cada worker fica com 1/workers da cota do Deezer
+        env = dict(env, WEB_CONCURRENCY=str(workers))
+    else:
+        args = [sys.executable, '-c',
+                'import server\n'
+                'from werkzeug.serving import run_simple\n'
+                f'run_simple("127.0.0.1", {port}, server.app, threaded=True)']
+    log = open(log_path, 'wb')
+    return subprocess.Popen(args, cwd=PROJECT_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(session, base_url: str, proc: subprocess.Popen, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"o servidor terminou com código {proc.returncode}")
+        try:
+            if session.get(base_url + '/list_playlists', timeout=30).status_code == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("o servidor não respondeu a tempo")
+
+
+class LoadGenerator:
+    """Dispara a mistura de requisições a ``qps`` por segundo e guarda cada
+    resultado (tipo, status, latência, se havia download em andamento)."""
+
+    def __init__(self, base_url: str, mix: Dict[str, float], tracks: List[Dict[str, Any]],
+                 playlists: List[str], concurrency: int, timeout: float, seed: int = 0):
+        import requests
+
+        self._requests = requests
+        self.base_url = base_url
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.tracks = tracks
+        self.playlists = playlists
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.download_active = threading.Event()
+        self.samples: List[Dict[str, Any]] = []
+        self._rng = random.Random(seed)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _browser(self):
+        """Sessão (conexões keep-alive) e ETags de um "navegador" por thread."""
+        browser = getattr(self._local, 'browser', None)
+        if browser is None:
+            session = self._requests.Session()
+            # Uma nova tentativa, como o navegador faz quando o servidor fecha
+            # uma conexão keep-alive ociosa no momento do envio
+            adapter = self._requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=1)
+            session.mount('http://', adapter)
+            browser = self._local.browser = {'session': session, 'etags': {}, 'last_check': time.time()}
+        return browser
+
+    def _request_for(self, kind: str, rng: random.Random):
+        headers = {}
+        if kind == 'list_playlists':
+            path = '/list_playlists'
+        elif kind == 'list_music':
+            path = '/list_music?playlist=' + rng.choice(self.playlists)
+        elif kind == 'list_music_metadata':
+            path = '/list_music?skip_metadata=false&playlist=' + rng.choice(self.playlists)
+        elif kind == 'check_music_changes':
+            path = '/check_music_changes?last_check={last_check}'
+        else:
+            track = rng.choice(self.tracks)
+            size = max(1, track['size'])
+            start = rng.randrange(size)
+            end = min(size - 1, start + rng.choice((16, 64, 256)) * 1024)
+            path, headers['Range'] = track['path'], f'bytes={start}-{end}'
+        return path, headers
+
+    def _fire(self, kind: str, path: str, headers: Dict[str, str], scheduled: float) -> None:
+        browser = self._browser()
+        if '{last_check}' in path:
+            path = path.format(last_check=browser['last_check'])
+        elif kind != 'range' and path in browser['etags']:
+            headers = dict(headers, **{'If-None-Match': browser['etags'][path]})
+        during_download = self.download_active.is_set()
+        sent = time.perf_counter()
+        status, error, size = None, None, 0
+        try:
+            response = browser['session'].get(self.base_url + path, headers=headers, timeout=self.timeout)
+            status, size = response.status_code, len(response.content)
+            if response.headers.get('ETag'):
+                browser['etags'][path] = response.headers['ETag']
+            if kind == 'check_music_changes' and status == 200:
+                browser['last_check'] = response.json().get('current_time', browser['last_check'])
+        except Exception as e:
+            error = type(e).__name__
+        done = time.perf_counter()
+        with self._lock:
+            self.samples.append({
+                'kind': kind,
+                'status': status,
+                'error': error,
+                'bytes': size,
+                'latency_ms': (done - scheduled) * 1000,
+                'service_ms': (done - sent) * 1000,
+                'during_download': during_download,
+            })
+
+    def run(self, qps: float, duration: float) -> float:
+        """Gera carga por ``duration`` segundos; retorna o tempo até a última resposta."""
+        started = time.perf_counter()
+        next_at = started
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='browser') as executor:
+            while next_at < started + duration:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                kind = self._rng.choices(self.kinds, self.weights)[0]
+                path, headers = self._request_for(kind, self._rng)
+                executor.submit(self._fire, kind, path, headers, next_at)
+                # Chegadas de Poisson: intervalos exponenciais com média 1/qps
+                next_at += self._rng.expovariate(qps)
+        return time.perf_counter() - started
+
+
+def report(samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Percentis, vazão e erros de um conjunto de amostras."""
+    if not samples:
+        return {'requests': 0}
+    failures = [s for s in samples if s['error'] or s['status'] not in OK_STATUSES]
+    ok = [s for s in samples if s not in failures]
+    statuses: Dict[str, int] = {}
+    for sample in samples:
+        key = sample['error'] or str(sample['status'])
+        statuses[key] = statuses.get(key, 0) + 1
+    result = {
+        'requests': len(samples),
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else None,
+        'error_rate': round(len(failures) / len(samples), 4),
+        'statuses': statuses,
+        **summarize([s['latency_ms'] for s in samples]),
+    }
+    result['service_p50_ms'] = summarize([s['service_ms'] for s in samples])['p50_ms']
+    return result
+
+
+def _wait_download(session, base_url: str, job_id: str, active: threading.Event,
+                   state: Dict[str, Any], timeout: float) -> None:
+    """Acompanha o job de download até terminar (ou ``timeout``)."""
+    started = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            job = session.get(f'{base_url}/download_status/{job_id}', timeout=30).json()
+            state['status'] = job.get('status')
+            if job.get('status') not in ('queued', 'running'):
+                result = job.get('result') or {}
+                state['downloaded'] = len(result.get('downloaded') or [])
+                state['failed'] = result.get('failed_count', 0)
+                state['error'] = job.get('error') or result.get('error')
+                break
+            time.sleep(0.5)
+    except Exception as e:
+        state['error'] = str(e)
+    finally:
+        state['duration_s'] = round(time.perf_counter() - started, 2)
+        active.clear()
+
+
+def _print_report(results: Dict[str, Any]) -> None:
+    meta = results['meta']
+    processes = (f"{meta['workers']} workers x {meta['threads']} threads" if meta['server'] == 'gunicorn'
+                 else "um processo, com threads")
+    print(f"Servidor: {meta['server']} ({processes}), "
+          f"{meta['tracks']} faixas, alvo {meta['qps']} req/s por {meta['duration']}s, "
+          f"Deezer local com {meta['deezer_latency_ms']:.0f}ms e {meta['deezer_error_rate']:.0%} de erros")
+    print(f"\n  {'requisições':22} {'total':>6} {'req/s':>7} {'erros':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = [('geral', results['overall']), ('durante o download', results['during_download'])]
+    rows += sorted(results['by_kind'].items())
+    for name, r in rows:
+        if not r.get('requests'):
+            continue
+        print(f"  {name:22} {r['requests']:6d} {r['throughput_rps']:7.1f} {r['error_rate']:7.1%} "
+              f"{r['p50_ms']:8.1f}ms {r['p95_ms']:8.1f}ms {r['p99_ms']:8.1f}ms")
+    download = results.get('download')
+    if download:
+        print(f"\nDownload: {download.get('status')} em {download.get('duration_s')}s, "
+              f"{download.get('downloaded', 0)} de {download.get('tracks')} faixas do feed" + (f" - {download['error']}" if download.get('error') else ''))
+    print(f"Deezer local: {results['deezer']['requests']} chamadas, {results['deezer']['errors']} com erro injetado")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga do server.py com Deezer e YouTube locais")
+    parser.add_argument('--qps', type=float, default=50, help="requisições por segundo (alvo)")
+    parser.add_argument('--duration', type=float, default=30, help="segundos de carga")
+    parser.add_argument('--concurrency', type=int, default=64, help="navegadores simultâneos (threads do cliente)")
+    parser.add_argument('--timeout', type=float, default=30, help="timeout de cada requisição, em segundos")
+    parser.add_argument('--mix', help=f"pesos por tipo, ex.: {','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())}")
+    parser.add_argument('--server', choices=('auto', 'gunicorn', 'werkzeug'), default='auto')
+    parser.add_argument('--workers', type=int, default=4, help="processos do gunicorn")
+    parser.add_argument('--threads', type=int, default=4, help="threads por processo do gunicorn")
+    parser.add_argument('--tracks', type=int, default=2000, help="faixas da biblioteca sintética")
+    parser.add_argument('--track-kb', type=int, default=256, help="tamanho de cada faixa, em KB")
+    parser.add_argument('--deezer-latency', type=float, default=50, help="latência do Deezer local, em ms")
+    parser.add_argument('--deezer-error-rate', type=float, default=0.05, help="fração de chamadas ao Deezer que falham")
+    parser.add_argument('--no-download', action='store_true', help="não baixa a playlist durante o teste")
+    parser.add_argument('--download-tracks', type=int, default=10, help="faixas do feed baixado durante o teste")
+    parser.add_argument('--download-kbps', type=int, default=512, help="banda do feed local, em KB/s por conexão")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help="onde criar a biblioteca (padrão: pasta temporária do sistema)")
+    parser.add_argument('--output', help="grava os resultados em JSON")
+    parser.add_argument('--server-log', help="copia para cá o log do servidor (erros 5xx aparecem nele)")
+    parser.add_argument('--json', action='store_true', help="imprime os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    import requests
+
+    mix = parse_mix(args.mix)
+    server_kind = args.server
+    if server_kind == 'auto':
+        server_kind = 'gunicorn' if importlib.util.find_spec('gunicorn') else 'werkzeug'
+    if server_kind == 'werkzeug':
+        print("⚠️ gunicorn não está instalado: usando o servidor do werkzeug (um processo, com threads)",
+              file=sys.stderr)
+
+    workdir = tempfile.mkdtemp(prefix='musickera-load-', dir=args.workdir)
+    proc = None
+    try:
+        music_dir = os.path.join(workdir, 'musics')
+        library = generate_library(music_dir, args.tracks, max(1, args.tracks // 100), seed=args.seed,
+                                   audio_bytes=args.track_kb * 1024)
+        with DeezerStub(args.deezer_latency / 1000, cover_images(2), args.deezer_error_rate, args.seed) as deezer, \
+                MediaFeedStub(args.download_tracks, args.track_kb * 1024, args.download_kbps * 1024) as media:
+            port = _free_port()
+            base_url = f'http://127.0.0.1:{port}'
+            env = dict(os.environ, MUSIC_DIR=music_dir, COVERS_DIR=os.path.join(music_dir, 'covers'),
+                       CACHE_DIR=os.path.join(workdir, 'cache'), DEEZER_API_URL=deezer.url)
+            log_path = os.path.join(workdir, 'server.log')
+            proc = start_server(server_kind, port, args.workers, args.threads, env, log_path)
+            session = requests.Session()
+            try:
+                wait_ready(session, base_url, proc)
+            except RuntimeError as e:
+                with open(log_path, 'rb') as f:
+                    sys.stderr.write(f.read()[-4000:].decode('utf-8', 'replace'))
+                print(f"❌ {e}", file=sys.stderr)
+                return 1
+
+            playlists = [p['name'] for p in session.get(base_url + '/list_playlists', timeout=60).json()['playlists']]
+            tracks = session.get(base_url + '/list_music?skip_metadata=true', timeout=120).json()['music']
+            generator = LoadGenerator(base_url, mix, tracks, playlists, args.concurrency, args.timeout, args.seed)
+
+            download: Dict[str, Any] = {}
+            waiter = None
+            if not args.no_download:
+                response = session.post(base_url + '/download_playlist', timeout=60, json={
+                    'url': media.url + '/feed.rss', 'playlist': 'Carga', 'background': True})
+                job_id = response.json().get('job_id')
+                download = {'tracks': args.download_tracks, 'job_id': job_id, 'status': response.status_code}
+                if job_id:
+                    generator.download_active.set()
+                    waiter = threading.Thread(
+                        target=_wait_download, daemon=True,
+                        args=(requests.Session(), base_url, job_id, generator.download_active, download,
+                              args.duration + 600))
+                    waiter.start()
+
+            elapsed = generator.run(args.qps, args.duration)
+            if waiter is not None:
+                waiter.join()
+
+            samples = generator.samples
+            by_kind = {kind: report([s for s in samples if s['kind'] == kind], elapsed) for kind in mix}
+            results = {
+                'meta': {
+                    'server': server_kind,
+                    'workers': args.workers if server_kind == 'gunicorn' else 1,
+                    'threads': args.threads if server_kind == 'gunicorn' else None,
+                    'qps': args.qps,
+                    'duration': args.duration,
+                    'concurrency': args.concurrency,
+                    'mix': mix,
+                    'tracks': library['tracks'],
+                    'playlists': library['playlists'],
+                    'deezer_latency_ms': args.deezer_latency,
+                    'deezer_error_rate': args.deezer_error_rate,
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                },
+                'overall': report(samples, elapsed),
+                'during_download': report([s for s in samples if s['during_download']], elapsed),
+                'by_kind': by_kind,
+                'download': download,
+                'deezer': {'requests': deezer.requests, 'errors': deezer.errors},
+            }
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            if args.server_log:
+                shutil.copyfile(os.path.join(workdir, 'server.log'), args.server_log)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        _print_report(results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Benchmark de inicialização do server.py e do api/index.py
+
+Cada rodada é um processo Python novo que importa o ponto de entrada (com
+``-X importtime``) e faz a primeira requisição pelo test client do Flask.
+Mede:
+
+- ``import_ms``: importação do módulo;
+- ``first_response_ms``: do início da importação até a primeira resposta;
+- ``process_ms``: o processo inteiro, início do interpretador incluído
+  (``interpreter_ms`` é o mesmo para ``python -c pass``);
+- os módulos mais caros segundo o ``-X importtime``;
+- quais dependências pesadas (HEAVY_MODULES) foram carregadas até a
+  primeira resposta: elas devem continuar sendo importadas sob demanda.
+
+Termina com código 1 se a mediana passar do orçamento (BUDGETS ou
+--max-import-ms/--max-first-response-ms), se uma dependência pesada voltar
+a ser importada na inicialização ou, com --baseline, se piorar mais que
+--tolerance em relação à medição salva com --save-baseline.
+
+Uso: python benchmarks/startup.py [--runs 5] [--json] [--baseline arq] [--save-baseline arq]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Carregadas só pelos caminhos de download, tags e Deezer
+HEAVY_MODULES = ('yt_dlp', 'requests', 'urllib3', 'PIL', 'mutagen')
+
+ENTRY_POINTS = {
+    'server': {'cwd': PROJECT_ROOT, 'module': 'server', 'path': '/list_playlists'},
+    'api': {'cwd': os.path.join(PROJECT_ROOT, 'api'), 'module': 'index', 'path': '/api/musics'},
+}
+
+# Orçamento em ms (mediana das rodadas)
+BUDGETS = {
+    'server': {'import_ms': 600, 'first_response_ms': 900},
+    'api': {'import_ms': 500, 'first_response_ms': 700},
+}
+
+TOP_IMPORTS = 8
+
+_CHILD = """\
+import json, sys, time
+started = time.perf_counter()
+import {module} as entry
+imported = time.perf_counter()
+music_dir = {music_dir!r}
+if music_dir and hasattr(entry, 'COVERS_DIR'):
+    entry.MUSIC_DIR, entry.COVERS_DIR = music_dir, music_dir + '/covers'
+response = entry.app.test_client().get({path!r})
+answered = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'first_response_ms': (answered - started) * 1000,
+    'status': response.status_code,
+    'loaded': sorted(m for m in {heavy!r} if m in sys.modules),
+}}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Linhas do ``-X importtime`` como {module, self_ms, cumulative_ms}."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            modules.append({
+                'module': name.strip(),
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+            })
+        except ValueError:
+            continue
+    return modules
+
+
+def _run(args: List[str], cwd: str, env: Dict[str, str]) -> subprocess.CompletedProcess:
+    return subprocess.run(args, cwd=cwd, env=env, capture_output=True, text=True, check=True)
+
+
+def interpreter_startup(runs: int) -> float:
+    """Mediana (ms) de ``python -c pass``: o piso de qualquer processo."""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        _run([sys.executable, '-c', 'pass'], PROJECT_ROOT, dict(os.environ))
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def measure(name: str, runs: int = 5, cache_dir: Optional[str] = None,
+            music_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Mede ``runs`` inicializações de ENTRY_POINTS[name] (depois de uma rodada
+    de aquecimento, que compila os .pyc e cria o índice em ``cache_dir``).
+    Sem ``music_dir``, o server.py lê uma biblioteca vazia em uma pasta
+    temporária: a medição não depende (nem escreve) no musics/ do projeto."""
+    entry = ENTRY_POINTS[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        music_dir = music_dir or os.path.join(tmp, 'musics')
+        os.makedirs(os.path.join(music_dir, 'covers'), exist_ok=True)
+        script = _CHILD.format(module=entry['module'], path=entry['path'], music_dir=music_dir,
+                               heavy=HEAVY_MODULES)
+        # Sem observador de arquivos: threads extras não entram na medição
+        env = dict(os.environ, CACHE_DIR=cache_dir or tmp, LIBRARY_WATCHER='off',
+                   MUSIC_DIR=music_dir, COVERS_DIR=os.path.join(music_dir, 'covers'),
+                   PYTHONDONTWRITEBYTECODE='')
+        samples = []
+        for run in range(runs + 1):
+            started = time.perf_counter()
+            proc = _run([sys.executable, '-X', 'importtime', '-c', script], entry['cwd'], env)
+            elapsed = (time.perf_counter() - started) * 1000
+            if run == 0:
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            result['process_ms'] = elapsed
+            result['imports'] = parse_importtime(proc.stderr)
+            samples.append(result)
+
+    last = samples[-1]
+    return {
+        'entry_point': name,
+        'path': entry['path'],
+        'runs': runs,
+        'status': last['status'],
+        'import_ms': statistics.median(s['import_ms'] for s in samples),
+        'first_response_ms': statistics.median(s['first_response_ms'] for s in samples),
+        'process_ms': statistics.median(s['process_ms'] for s in samples),
+        'loaded_heavy_modules': last['loaded'],
+        'slowest_imports': sorted(last['imports'], key=lambda m: m['self_ms'], reverse=True)[:TOP_IMPORTS],
+    }
+
+
+def check(result: Dict[str, Any], budget: Dict[str, float], baseline: Optional[Dict[str, Any]] = None,
+          tolerance: float = 0.25) -> List[str]:
+    """Violações do orçamento e regressões em relação à ``baseline``."""
+    name = result['entry_point']
+    problems = []
+    if result['status'] >= 500:
+        problems.append(f"{name}: primeira resposta com HTTP {result['status']}")
+    if result['loaded_heavy_modules']:
+        problems.append(f"{name}: dependências pesadas carregadas na inicialização: "
+                        f"{', '.join(result['loaded_heavy_modules'])}")
+    for metric, limit in budget.items():
+        if result[metric] > limit:
+            problems.append(f"{name}: {metric} = {result[metric]:.0f}ms (orçamento {limit:.0f}ms)")
+    if baseline:
+        for metric in budget:
+            previous = baseline.get(metric)
+            if previous and result[metric] > previous * (1 + tolerance):
+                problems.append(f"{name}: {metric} = {result[metric]:.0f}ms, "
+                                f"{result[metric] / previous - 1:.0%} acima da referência ({previous:.0f}ms)")
+    return problems
+
+
+def _print_report(interpreter_ms: float, results: List[Dict[str, Any]]) -> None:
+    print(f"Interpretador (python -c pass): {interpreter_ms:.0f}ms")
+    for result in results:
+        print(f"\n{result['entry_point']} (GET {result['path']} -> {result['status']}, "
+              f"mediana de {result['runs']} rodadas)")
+        print(f"  importação:        {result['import_ms']:7.1f}ms")
+        print(f"  primeira resposta: {result['first_response_ms']:7.1f}ms")
+        print(f"  processo inteiro:  {result['process_ms']:7.1f}ms")
+        print(f"  dependências pesadas carregadas: {', '.join(result['loaded_heavy_modules']) or 'nenhuma'}")
+        print("  módulos mais lentos (-X importtime, tempo próprio):")
+        for module in result['slowest_imports']:
+            print(f"    {module['self_ms']:7.1f}ms  {module['module']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Mede a inicialização do server.py e do api/index.py")
+    parser.add_argument('--runs', type=int, default=5, help="processos medidos por ponto de entrada")
+    parser.add_argument('--entry-point', choices=sorted(ENTRY_POINTS), action='append',
+                        help="mede só este ponto de entrada (pode repetir)")
+    parser.add_argument('--music-dir', help="biblioteca usada pelo server.py (padrão: pasta temporária vazia)")
+    parser.add_argument('--cache-dir', help="CACHE_DIR do server.py (padrão: pasta temporária)")
+    parser.add_argument('--max-import-ms', type=float, help="orçamento de importação para todos os pontos de entrada")
+    parser.add_argument('--max-first-response-ms', type=float,
+                        help="orçamento até a primeira resposta para todos os pontos de entrada")
+    parser.add_argument('--baseline', help="JSON salvo com --save-baseline para comparar")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="piora aceita em relação à referência (padrão: 0.25 = 25%%)")
+    parser.add_argument('--save-baseline', help="grava as medições como referência")
+    parser.add_argument('--json', action='store_true', help="saída em JSON")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f).get('entry_points', {})
+
+    interpreter_ms = interpreter_startup(args.runs)
+    results, problems = [], []
+    for name in args.entry_point or sorted(ENTRY_POINTS):
+        result = measure(name, args.runs, args.cache_dir, args.music_dir)
+        budget = dict(BUDGETS[name])
+        if args.max_import_ms is not None:
+            budget['import_ms'] = args.max_import_ms
+        if args.max_first_response_ms is not None:
+            budget['first_response_ms'] = args.max_first_response_ms
+        results.append(result)
+        problems += check(result, budget, baseline.get(name), args.tolerance)
+
+    report = {
+        'python': sys.version.split()[0],
+        'interpreter_ms': interpreter_ms,
+        'entry_points': {result['entry_point']: result for result in results},
+        'problems': problems,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(interpreter_ms, results)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if not problems:
+            print("\n✅ Inicialização dentro do orçamento")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
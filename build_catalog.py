@@ -0,0 +1,146 @@
+"""
+Gera o snapshot do catálogo usado pelo api/index.py (Vercel)
+
+Percorre musics/ com o mesmo índice e a mesma extração de tags do
+server.py e grava api/catalog.json (e, com --msgpack, api/catalog.msgpack
+com o índice de busca pronto). Também atualiza em api/utils/ a cópia dos
+módulos que leem o snapshot (API_MODULES): o deploy do api/ não inclui a
+raiz do projeto.
+
+Uso: python build_catalog.py [--music-dir DIR] [--output api/catalog.json] [--msgpack]
+"""
+
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(PROJECT_ROOT, 'api', 'catalog.json')
+# Módulos de utils/ usados pelo api/index.py, copiados para api/utils/
+API_MODULES = ('catalog.py', 'search_index.py')
+
+
+def _read(path: str) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def stale_api_modules() -> List[str]:
+    """Módulos de API_MODULES cuja cópia em api/utils/ difere de utils/."""
+    return [name for name in API_MODULES
+            if _read(os.path.join(PROJECT_ROOT, 'api', 'utils', name))
+            != _read(os.path.join(PROJECT_ROOT, 'utils', name))]
+
+
+def sync_api_modules() -> List[str]:
+    """Atualiza as cópias desatualizadas em api/utils/; retorna as que mudaram."""
+    stale = stale_api_modules()
+    os.makedirs(os.path.join(PROJECT_ROOT, 'api', 'utils'), exist_ok=True)
+    for name in stale:
+        with open(os.path.join(PROJECT_ROOT, 'api', 'utils', name), 'wb') as f:
+            f.write(_read(os.path.join(PROJECT_ROOT, 'utils', name)))
+    return stale
+
+
+def _format_duration(seconds) -> str:
+    if not seconds:
+        return ''
+    seconds = int(round(seconds))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def _track_duration(path: str) -> str:
+    try:
+        from mutagen import File as MFile
+        audio = MFile(path)
+        return _format_duration(getattr(audio.info, 'length', None)) if audio is not None else ''
+    except Exception:
+        return ''
+
+
+def build(server):
+    """Monta o Catalog a partir da biblioteca (sem consultar o Deezer: usa só o
+    que já está nas tags, no nome do arquivo ou no índice)."""
+    from utils.catalog import Catalog
+
+    index = server._get_library_index()
+    index.refresh()
+    index.ensure_tags(index.tracks())
+    rows = index.tracks()
+    cover_names = frozenset(os.listdir(server.COVERS_DIR)) if os.path.isdir(server.COVERS_DIR) else frozenset()
+
+    tracks = []
+    playlists = {}
+    for track_id, row in enumerate(rows, 1):
+        metadata = server._fallback_track_metadata(row)
+        playlist = row['dir'].split('/')[0] if row['dir'] else "Geral"
+        tracks.append({
+            'id': track_id,
+            'title': metadata['title'],
+            'artist': metadata['artist'],
+            'album': metadata['album'],
+            'year': metadata['year'],
+            'filename': row['name'],
+            'path': '/musics/' + row['rel'],
+            'playlist': playlist,
+            'cover': server._track_cover_url(row['name'], cover_names),
+            'duration': _track_duration(os.path.join(server.MUSIC_DIR, row['rel'])),
+            'size': row['size'],
+        })
+        playlists.setdefault(playlist, []).append(track_id)
+
+    playlist_items = []
+    for playlist_id, (name, track_ids) in enumerate(sorted(playlists.items()), 1):
+        cover_file = f"{server._safe_stem(name)}.jpg"
+        playlist_items.append({
+            'id': playlist_id,
+            'name': name,
+            'description': '',
+            'cover': '/musics/covers/' + cover_file if cover_file in cover_names else server.DEFAULT_COVER,
+            'musics': track_ids,
+        })
+    return Catalog(tracks, playlist_items)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Gera o snapshot do catálogo para o api/index.py")
+    parser.add_argument('--music-dir', help="pasta das músicas (padrão: MUSIC_DIR de config/settings.py)")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="arquivo JSON de saída")
+    parser.add_argument('--msgpack', action='store_true',
+                        help="grava também <output>.msgpack com o índice de busca (requer msgpack)")
+    args = parser.parse_args(argv)
+
+    if args.music_dir:
+        # config/settings.py lê MUSIC_DIR na importação
+        os.environ['MUSIC_DIR'] = os.path.abspath(args.music_dir)
+    sys.path.insert(0, PROJECT_ROOT)
+    import server
+    from utils import catalog as catalog_module
+
+    if args.msgpack and not catalog_module.msgpack_available():
+        print("❌ msgpack não está instalado. Instale 'msgpack' ou gere só o JSON.", file=sys.stderr)
+        return 1
+
+    catalog = build(server)
+    msgpack_path = os.path.splitext(args.output)[0] + '.msgpack'
+    if not args.msgpack:
+        if os.path.exists(msgpack_path):
+            # Um snapshot binário de uma geração anterior ficaria desatualizado
+            os.remove(msgpack_path)
+            print(f"🗑️ Snapshot binário antigo removido: {msgpack_path}")
+        msgpack_path = None
+    catalog_module.write_catalog(catalog, args.output, msgpack_path)
+    print(f"✅ Catálogo gerado: {len(catalog.tracks)} músicas, {len(catalog.playlists)} playlists -> {args.output}")
+    if msgpack_path:
+        print(f"✅ Snapshot binário com índice de busca: {msgpack_path}")
+    for name in sync_api_modules():
+        print(f"📦 api/utils/{name} atualizado a partir de utils/{name}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
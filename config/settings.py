@@ -12,8 +12,8 @@ HOST = os.environ.get('HOST', '0.0.0.0')
 
 # Diretórios
 BASE_DIR = Path(__file__).parent.parent
-MUSIC_DIR = os.environ.get('MUSIC_DIR', BASE_DIR / 'musics')
-COVERS_DIR = os.environ.get('COVERS_DIR', MUSIC_DIR / 'covers')
+MUSIC_DIR = Path(os.environ.get('MUSIC_DIR', BASE_DIR / 'musics'))
+COVERS_DIR = Path(os.environ.get('COVERS_DIR', MUSIC_DIR / 'covers'))
 
 # Criar diretórios se não existirem
 os.makedirs(MUSIC_DIR, exist_ok=True)
@@ -30,6 +30,15 @@ ALLOWED_EXTENSIONS = {
         'jpg', 'jpeg', 'png', 'webp', 'gif'
     }
 }
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB por leitura ao gravar (e calcular o hash de) um upload
+# Upload com conteúdo idêntico a um arquivo de outra playlist vira hardlink
+# para ele em vez de uma segunda cópia (mesmo sistema de arquivos)
+UPLOAD_HARDLINK_DUPLICATES = os.environ.get('UPLOAD_HARDLINK_DUPLICATES', 'False').lower() == 'true'
+# Uploads retomáveis (/uploads, estilo tus): sem o limite de MAX_CONTENT_LENGTH
+RESUMABLE_UPLOAD_MAX_SIZE = 4 * 1024 * 1024 * 1024  # 4GB por arquivo
+RESUMABLE_UPLOAD_MAX_CHUNK = 64 * 1024 * 1024  # 64MB por PATCH
+RESUMABLE_UPLOAD_TTL = 24 * 3600  # uploads parados há mais que isso são descartados
+RESUMABLE_UPLOADS_FILE = 'uploads.sqlite3'  # estado dos uploads retomáveis (dentro de CACHE_DIR)
 
 # Configurações de API
 API_VERSION = 'v1'
@@ -40,15 +49,42 @@ CORS_ORIGINS = [
     'http://localhost:3000',
     'http://localhost:8000',
     'http://127.0.0.1:3000',
-    'http://127.0.0.1:8000',,
+    'http://127.0.0.1:8000',
     'https://musickera-plus.vercel.app'
 ]
 
 # Configurações de cache
 CACHE_TIMEOUT = 300  # 5 minutos
-CACHE_DIR = BASE_DIR / 'cache'
+CACHE_DIR = Path(os.environ.get('CACHE_DIR', BASE_DIR / 'cache'))
+LIBRARY_INDEX_FILE = 'library.sqlite3'  # Índice persistente da biblioteca (dentro de CACHE_DIR)
+
+# Observador da biblioteca: 'auto' (inotify quando disponível), 'inotify', 'poll' ou 'off'
+LIBRARY_WATCHER = os.environ.get('LIBRARY_WATCHER', 'auto').lower()
+LIBRARY_POLL_INTERVAL = 2.0  # segundos entre verificações no modo polling
+LIBRARY_JOURNAL_SIZE = 4096  # eventos mantidos em memória para /check_music_changes?since=N
+
+# Server-Sent Events (/events)
+EVENTS_HEARTBEAT = 15  # segundos entre comentários de keep-alive quando não há eventos
+EVENTS_RETRY_MS = 3000  # intervalo de reconexão sugerido ao EventSource
 os.makedirs(CACHE_DIR, exist_ok=True)
 
+# Cliente da API do Deezer (limite em RATE_LIMIT['deezer'], timeout em SEARCH_TIMEOUT,
+# novas tentativas em DOWNLOAD_RETRIES)
+DEEZER_API_URL = os.environ.get('DEEZER_API_URL', 'https://api.deezer.com')
+DEEZER_MAX_CONCURRENCY = 4  # Requisições simultâneas ao Deezer
+# O limite de taxa vale por processo: a cota é dividida entre os workers do
+# gunicorn (WEB_CONCURRENCY) para o total não passar de RATE_LIMIT['deezer']
+DEEZER_RATE_PROCESSES = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+
+# Cache das respostas do Deezer (dentro de CACHE_DIR)
+DEEZER_CACHE_FILE = 'deezer.sqlite3'
+DEEZER_CACHE_HIT_TTL = 30 * 24 * 3600  # 30 dias para resultados encontrados
+DEEZER_CACHE_MISS_TTL = 24 * 3600  # 1 dia para buscas sem resultado
+DEEZER_CACHE_MAX_ENTRIES = 50000
+
+# Métricas do Prometheus em /metrics (por processo)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+
 # Configurações de logging
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
 LOG_FILE = BASE_DIR / 'logs' / 'server.log'
@@ -58,7 +94,8 @@ os.makedirs(LOG_FILE.parent, exist_ok=True)
 SECRET_KEY = os.environ.get('SECRET_KEY', 'musickera-secret-key-change-in-production')
 RATE_LIMIT = {
     'default': '100 per minute',
-    'upload': '10 per minute'
+    'upload': '10 per minute',
+    'deezer': '50 per 5 seconds'  # Cota da API pública do Deezer (total de todos os processos)
 }
 
 # Configurações de metadados
@@ -68,17 +105,57 @@ METADATA_PROVIDERS = [
     'musicbrainz' # MusicBrainz (futuro)
 ]
 
+# Resolução de capas em segundo plano
+COVER_RESOLVER_WORKERS = 2
+COVER_MISS_RETRY = 600  # segundos até tentar de novo uma playlist sem capa encontrada
+
+# Miniaturas WebP das capas (em COVERS_DIR/thumbs; requer Pillow)
+THUMBNAIL_SIZES = (64, 256, 600)
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_INDEX_FILE = 'thumbnails.sqlite3'  # dentro de CACHE_DIR
+
+# Entrega de arquivos em /musics/<arquivo>
+AUDIO_CACHE_CONTROL = 'public, no-cache'  # sempre revalida (ETag/Last-Modified), resposta 304 barata
+COVER_CACHE_CONTROL = 'public, max-age=86400'  # capas mudam raramente
+THUMBNAIL_CACHE_CONTROL = 'public, max-age=31536000, immutable'  # covers/thumbs: nome = hash do conteúdo
+# Atrás de um proxy, delega o envio do arquivo: prefixo interno do nginx
+# (ex.: '/_musics/' -> X-Accel-Redirect) ou cabeçalho X-Sendfile (Apache/lighttpd)
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT', '')
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER', '')
+
 # Configurações de download
 DOWNLOAD_TIMEOUT = 300  # 5 minutos
 DOWNLOAD_CHUNK_SIZE = 8192  # 8KB
 DOWNLOAD_RETRIES = 3
+DOWNLOAD_PROGRESS_INTERVAL = 0.5  # segundos mínimos entre eventos de progresso do mesmo arquivo
+DOWNLOAD_JOURNAL_SIZE = 1024  # eventos de download mantidos em memória para /events
+DOWNLOAD_WORKERS = 2  # downloads (jobs do yt-dlp) simultâneos
+DOWNLOAD_ENTRY_WORKERS = 4  # vídeos da mesma playlist baixados em paralelo (por job)
+DOWNLOAD_CONCURRENT_FRAGMENTS = 4  # fragmentos DASH/HLS simultâneos por arquivo (yt-dlp)
+MEDIA_INFO_TTL = 600  # segundos que o resultado do extract_info de uma URL é reaproveitado
+MEDIA_INFO_CACHE_SIZE = 64  # URLs mantidas no cache do extract_info
+DOWNLOAD_JOBS_FILE = 'downloads.sqlite3'  # estado dos jobs de download (dentro de CACHE_DIR)
+DOWNLOAD_JOBS_KEEP = 500  # jobs concluídos mantidos para /download_status
+DOWNLOAD_JOB_LEASE = 30  # segundos sem renovação até outro processo assumir um job em execução
+PLAYLIST_SYNC_FILE = 'sync.sqlite3'  # vídeos já baixados por playlist e playlists seguidas (dentro de CACHE_DIR)
+PLAYLIST_SYNC_INTERVAL = 6 * 3600  # intervalo padrão (segundos) entre sincronizações de uma playlist seguida
+PLAYLIST_SYNC_CHECK_INTERVAL = 60  # segundos entre verificações do agendador de sincronização
+# Retomar downloads e sincronizar playlists seguidas a partir da primeira requisição de cada processo
+BACKGROUND_SERVICES = os.environ.get('BACKGROUND_SERVICES', 'True').lower() == 'true'
 
 # Configurações de playlist
 PLAYLIST_MAX_SIZE = 1000  # Máximo de músicas por playlist
 PLAYLIST_NAME_MAX_LENGTH = 100
 
+# Configurações de listagem (/list_music)
+LIST_MUSIC_MAX_LIMIT = 1000  # Tamanho máximo de página com limit/cursor
+LIST_MUSIC_STREAM_BATCH = 200  # Músicas lidas do índice por vez no modo stream
+METADATA_WORKERS = 8  # Threads padrão para extrair tags/enriquecer (skip_metadata=false)
+METADATA_MAX_WORKERS = 16  # Limite para o parâmetro workers e total de threads de metadados do processo
+METADATA_DEADLINE = 30  # segundos; o que não terminar volta com dados do nome do arquivo
+
 # Configurações de busca
-SEARCH_MAX_RESULTS = 50
+SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', '50'))  # Mesmo valor no api/ (api/config.py)
 SEARCH_TIMEOUT = 10  # segundos
 
 # Configurações de desenvolvimento
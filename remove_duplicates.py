@@ -1,7 +1,38 @@
+import argparse
+import hashlib
+import json
 import os
 import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    from mutagen import File as MutagenFile
+except Exception:
+    MutagenFile = None
+
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.mp4', '.wav', '.flac', '.aac', '.ogg', '.opus', '.webm')
+
+# Priority order for file formats (higher = better), used to pick the copy to keep
+FORMAT_PRIORITY = {
+    '.flac': 5,  # Lossless
+    '.wav': 4,   # Lossless
+    '.m4a': 3,   # AAC codec
+    '.opus': 3,
+    '.ogg': 2,
+    '.mp3': 2,   # MP3
+    '.webm': 1,
+    '.mp4': 1,   # Video format (lower priority for audio)
+    '.aac': 0    # AAC
+}
+
+PARTIAL_BLOCK = 64 * 1024  # bytes hashed at the head and at the tail of each candidate
+FULL_CHUNK = 1024 * 1024
+DURATION_TOLERANCE = 2.0  # seconds; similar tracks must have close durations
+
+
 def clean_song_name(filename):
     """Remove file extension and clean the song name for comparison"""
     # Remove file extension
@@ -10,98 +41,295 @@ def clean_song_name(filename):
     name = re.sub(r'\s*\([^)]*\)\s*$', '', name)
     return name.strip().lower()
 
-def find_duplicates(music_dir):
-    """Find duplicate music files based on song names"""
-    music_path = Path(music_dir)
-    if not music_path.exists():
-        print(f"Directory {music_dir} does not exist!")
-        return
-    
-    # Get all music files
-    music_files = []
-    for ext in ['.mp3', '.m4a', '.mp4', '.wav', '.flac', '.aac']:
-        music_files.extend(music_path.glob(f'*{ext}'))
-    
-    # Group files by cleaned song name
-    song_groups = {}
-    for file in music_files:
-        clean_name = clean_song_name(file.name)
-        if clean_name not in song_groups:
-            song_groups[clean_name] = []
-        song_groups[clean_name].append(file)
-    
-    # Find duplicates
-    duplicates = {}
-    for song_name, files in song_groups.items():
-        if len(files) > 1:
-            duplicates[song_name] = files
-    
-    return duplicates
-
-def remove_duplicates(music_dir, dry_run=True):
-    """Remove duplicate music files, keeping the best quality version"""
-    duplicates = find_duplicates(music_dir)
-    
-    if not duplicates:
+
+def scan_audio_files(music_dir):
+    """Walk the whole tree (playlist subfolders included) and stat every audio file.
+
+    Hidden files and the covers folder are skipped. Paths that are already
+    hardlinks of each other count once, since they take no extra space."""
+    files = []
+    seen_inodes = set()
+    stack = [str(music_dir)]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = list(os.scandir(current))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name != 'covers':
+                    stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False) and entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                st = entry.stat(follow_symlinks=False)
+                inode = (st.st_dev, st.st_ino)
+                if inode in seen_inodes:
+                    continue
+                seen_inodes.add(inode)
+                files.append((entry.path, st))
+    return files
+
+
+def partial_hash(path, size):
+    """Hash of the first and last PARTIAL_BLOCK bytes (plus the size)."""
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(PARTIAL_BLOCK))
+        if size > 2 * PARTIAL_BLOCK:
+            f.seek(size - PARTIAL_BLOCK)
+            digest.update(f.read(PARTIAL_BLOCK))
+        elif size > PARTIAL_BLOCK:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def full_hash(path):
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(FULL_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hash_groups(groups, hasher, executor, stats_key, stats):
+    """Split every group of paths by ``hasher(path)``, hashing in parallel.
+    Unreadable files are dropped. Returns only the buckets with 2+ files."""
+    paths = [path for group in groups for path in group]
+    stats[stats_key] += len(paths)
+
+    def safe(path):
+        try:
+            return hasher(path)
+        except OSError:
+            return None
+
+    digests = dict(zip(paths, executor.map(safe, paths)))
+    result = []
+    for group in groups:
+        buckets = {}
+        for path in group:
+            if digests[path] is not None:
+                buckets.setdefault(digests[path], []).append(path)
+        result.extend((digest, bucket) for digest, bucket in buckets.items() if len(bucket) > 1)
+    return result
+
+
+def find_exact_duplicates(files, workers=8, stats=None):
+    """Byte-identical files, in three stages: size buckets, then a partial
+    hash (head and tail blocks), then a full hash only for what still collides."""
+    stats = stats if stats is not None else {}
+    stats.setdefault('partial_hashed', 0)
+    stats.setdefault('full_hashed', 0)
+    sizes = {}
+    by_size = {}
+    for path, st in files:
+        sizes[path] = st.st_size
+        by_size.setdefault(st.st_size, []).append(path)
+    candidates = [group for size, group in by_size.items() if len(group) > 1 and size > 0]
+    stats['size_candidates'] = sum(len(group) for group in candidates)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        partial = _hash_groups(
+            candidates, lambda path: partial_hash(path, sizes[path]), executor, 'partial_hashed', stats
+        )
+        full = _hash_groups([group for _, group in partial], full_hash, executor, 'full_hashed', stats)
+    return [{'hash': digest, 'size': sizes[group[0]], 'files': sorted(group)} for digest, group in full]
+
+
+def read_track_info(path):
+    """(normalized 'artist - title', duration in seconds or None) from tags,
+    falling back to the cleaned file name when tags are missing."""
+    title = artist = duration = None
+    if MutagenFile is not None:
+        try:
+            audio = MutagenFile(path, easy=True)
+            if audio is not None:
+                title = (audio.get('title') or [None])[0]
+                artist = (audio.get('artist') or [None])[0]
+                duration = getattr(audio.info, 'length', None)
+        except Exception:
+            pass
+    if title:
+        key = f"{artist or ''} - {title}".strip(' -').lower()
+    else:
+        key = clean_song_name(os.path.basename(path))
+    return re.sub(r'\s+', ' ', key), duration
+
+
+def find_similar_tracks(files, exclude=(), workers=8):
+    """Second signal: different bytes but the same artist/title and a close
+    duration (e.g. the same song as FLAC and MP3). Tags are read in parallel.
+    Files without a known duration are never grouped: a shared name alone
+    does not make two recordings the same."""
+    paths = [path for path, _ in files if path not in exclude]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        infos = dict(zip(paths, executor.map(read_track_info, paths)))
+    by_key = {}
+    for path in paths:
+        if infos[path][1]:
+            by_key.setdefault(infos[path][0], []).append(path)
+
+    groups = []
+    for key, group in by_key.items():
+        if len(group) < 2 or not key:
+            continue
+        # Chain files whose durations are within the tolerance
+        group.sort(key=lambda p: infos[p][1])
+        cluster = [group[0]]
+        for path in group[1:]:
+            previous, current = infos[cluster[-1]][1], infos[path][1]
+            if current - previous <= DURATION_TOLERANCE:
+                cluster.append(path)
+            else:
+                if len(cluster) > 1:
+                    groups.append({'key': key, 'files': sorted(cluster)})
+                cluster = [path]
+        if len(cluster) > 1:
+            groups.append({'key': key, 'files': sorted(cluster)})
+    return groups
+
+
+def choose_keeper(paths):
+    """Best format first, then the oldest file, then the shortest path."""
+    def rank(path):
+        st = os.stat(path)
+        return (-FORMAT_PRIORITY.get(Path(path).suffix.lower(), -1), st.st_mtime, len(path), path)
+    return min(paths, key=rank)
+
+
+def replace_with_hardlink(keep, duplicate):
+    """Atomically turn ``duplicate`` into a hardlink of ``keep``."""
+    tmp = f"{duplicate}.dedup-tmp"
+    os.link(keep, tmp)
+    os.replace(tmp, duplicate)
+
+
+def find_duplicates(music_dir, similar=False, workers=8):
+    """Scan ``music_dir`` and return a JSON-serializable report."""
+    started = time.monotonic()
+    music_dir = str(music_dir)
+    files = scan_audio_files(music_dir)
+    stats = {'files': len(files), 'bytes': sum(st.st_size for _, st in files)}
+
+    def rel(path):
+        return os.path.relpath(path, music_dir)
+
+    exact = []
+    for group in find_exact_duplicates(files, workers, stats):
+        keep = choose_keeper(group['files'])
+        duplicates = [path for path in group['files'] if path != keep]
+        exact.append({
+            'hash': group['hash'],
+            'size': group['size'],
+            'keep': rel(keep),
+            'duplicates': [rel(path) for path in duplicates],
+            'reclaimable': group['size'] * len(duplicates),
+        })
+
+    report = {'music_dir': music_dir, 'exact': exact, 'similar': []}
+    if similar:
+        in_exact = {os.path.join(music_dir, path) for group in exact for path in group['duplicates']}
+        for group in find_similar_tracks(files, in_exact, workers):
+            keep = choose_keeper(group['files'])
+            report['similar'].append({
+                'key': group['key'],
+                'keep': rel(keep),
+                'others': [rel(path) for path in group['files'] if path != keep],
+            })
+    stats['reclaimable'] = sum(group['reclaimable'] for group in exact)
+    stats['elapsed'] = round(time.monotonic() - started, 3)
+    report['stats'] = stats
+    return report
+
+
+def remove_duplicates(music_dir, report=None, mode='delete', include_similar=False):
+    """Apply a report: ``mode`` is 'delete' or 'hardlink' for exact duplicates.
+    Similar (non-identical) tracks can only be deleted, and only when asked."""
+    report = report or find_duplicates(music_dir, similar=include_similar)
+    music_dir = str(music_dir)
+    actions = []
+    plan = [(group['keep'], path, mode) for group in report['exact'] for path in group['duplicates']]
+    if include_similar:
+        plan.extend((group['keep'], path, 'delete') for group in report['similar'] for path in group['others'])
+
+    for keep, path, action in plan:
+        keep_path = os.path.join(music_dir, keep)
+        target = os.path.join(music_dir, path)
+        try:
+            if action == 'hardlink':
+                replace_with_hardlink(keep_path, target)
+            else:
+                os.remove(target)
+            actions.append({'path': path, 'action': action, 'keep': keep})
+        except OSError as e:
+            actions.append({'path': path, 'action': action, 'keep': keep, 'error': str(e)})
+    report['actions'] = actions
+    return report
+
+
+def print_report(report):
+    stats = report['stats']
+    print(f"Scanned {stats['files']} files in {stats['elapsed']}s "
+          f"({stats['size_candidates']} same-size candidates, {stats['full_hashed']} fully hashed)")
+    if not report['exact'] and not report['similar']:
         print("No duplicate music files found!")
         return
-    
-    print(f"Found {len(duplicates)} songs with duplicates:")
     print("-" * 50)
-    
-    # Priority order for file formats (higher index = higher priority)
-    format_priority = {
-        '.flac': 5,  # Lossless
-        '.wav': 4,   # Lossless
-        '.m4a': 3,   # AAC codec
-        '.mp3': 2,   # MP3
-        '.mp4': 1,   # Video format (lower priority for audio)
-        '.aac': 0    # AAC
-    }
-    
-    files_to_remove = []
-    
-    for song_name, files in duplicates.items():
-        print(f"\nSong: {song_name}")
-        print("Files:")
-        
-        # Sort files by priority
-        sorted_files = sorted(files, key=lambda f: format_priority.get(f.suffix.lower(), -1), reverse=True)
-        
-        # Keep the highest priority file, mark others for removal
-        keep_file = sorted_files[0]
-        remove_files = sorted_files[1:]
-        
-        print(f"  KEEP: {keep_file.name} ({keep_file.suffix})")
-        for file in remove_files:
-            print(f"  REMOVE: {file.name} ({file.suffix})")
-            files_to_remove.append(file)
-    
-    if not dry_run and files_to_remove:
-        print(f"\nRemoving {len(files_to_remove)} duplicate files...")
-        for file in files_to_remove:
-            try:
-                file.unlink()
-                print(f"Removed: {file.name}")
-            except Exception as e:
-                print(f"Error removing {file.name}: {e}")
-        print("Duplicate removal completed!")
-    elif dry_run:
-        print(f"\nDRY RUN: Would remove {len(files_to_remove)} duplicate files")
-        print("Run with dry_run=False to actually remove the files")
+    for group in report['exact']:
+        print(f"\nIdentical ({group['size']} bytes):")
+        print(f"  KEEP: {group['keep']}")
+        for path in group['duplicates']:
+            print(f"  DUPLICATE: {path}")
+    for group in report['similar']:
+        print(f"\nSimilar: {group['key']}")
+        print(f"  KEEP: {group['keep']}")
+        for path in group['others']:
+            print(f"  SIMILAR: {path}")
+    print(f"\n{stats['reclaimable']} bytes reclaimable from identical copies")
 
-if __name__ == "__main__":
-    music_directory = "musics"
-    
-    print("Music Duplicate Remover")
-    print("=" * 30)
-    
-    # First, show what would be removed (dry run)
-    remove_duplicates(music_directory, dry_run=True)
-    
-    # Ask for confirmation
-    response = input("\nDo you want to proceed with removing the duplicates? (y/N): ")
-    if response.lower() in ['y', 'yes']:
-        remove_duplicates(music_directory, dry_run=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find (and remove or hardlink) duplicate music files.")
+    parser.add_argument('music_dir', nargs='?', default='musics')
+    parser.add_argument('--similar', action='store_true',
+                        help="also report tracks with the same tags and duration but different bytes")
+    parser.add_argument('--apply', choices=('delete', 'hardlink'),
+                        help="act on identical duplicates (default: dry run)")
+    parser.add_argument('--include-similar', action='store_true', help="with --apply, also delete similar tracks")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    parser.add_argument('--workers', type=int, default=8, help="parallel hashing/tag reading threads")
+    parser.add_argument('--yes', action='store_true', help="do not ask for confirmation")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.music_dir):
+        print(f"Directory {args.music_dir} does not exist!", file=sys.stderr)
+        return 1
+
+    report = find_duplicates(args.music_dir, similar=args.similar or args.include_similar, workers=args.workers)
+    if args.apply:
+        if not args.yes and not args.json:
+            print_report(report)
+            response = input(f"\nDo you want to {args.apply} the duplicates? (y/N): ")
+            if response.lower() not in ['y', 'yes']:
+                print("Operation cancelled.")
+                return 0
+        report = remove_duplicates(args.music_dir, report, args.apply, args.include_similar)
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    elif args.apply:
+        failed = [action for action in report['actions'] if 'error' in action]
+        print(f"{len(report['actions']) - len(failed)} files processed ({args.apply}), {len(failed)} errors")
+        for action in failed:
+            print(f"Error on {action['path']}: {action['error']}")
     else:
-        print("Operation cancelled.")
+        print_report(report)
+        print("\nDRY RUN: run with --apply delete or --apply hardlink to act on identical duplicates")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
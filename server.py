@@ -1,95 +1,258 @@
 import os
+import copy
 import threading
 import mimetypes
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, abort, g, jsonify, request, stream_with_context
 from flask_cors import CORS
-from typing import Optional, Dict
+from typing import TYPE_CHECKING, Optional, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait as futures_wait
 import json
+import hashlib
 import re
 import time
 import shutil
-import requests
+import uuid
 import base64
-from io import BytesIO
+from urllib.parse import quote
 from flask import Response
-
-try:
-    from yt_dlp import YoutubeDL
-except Exception:
-    YoutubeDL = None
-
-try:
-    from mutagen.mp4 import MP4
-except Exception:
-    MP4 = None
-
-
-MUSIC_DIR = os.path.join(os.path.dirname(__file__), 'musics')
+from werkzeug.utils import safe_join
+
+from config import settings
+from utils.library_index import LibraryIndex, is_audio_file
+from utils.library_watcher import ChangeJournal, LibraryWatcher, wait_for_events
+from utils.work_queue import DedupWorkQueue
+from utils.deezer_cache import DeezerCache, normalize_query
+from utils.enrichment import EnrichmentJobs
+from utils.media_files import send_media_file
+from utils.thumbnails import CoverThumbnails
+from utils.download_jobs import ACTIVE_STATUSES, DownloadJobs
+from utils.media_info import InfoCache, canonical_media_url
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, SampleCollector, render as render_metrics
+from utils.playlist_sync import PlaylistArchive, SyncScheduler
+from utils.helpers import generate_file_hash, sanitize_filename, save_stream_with_hash
+from utils.resumable_uploads import ResumableUploads, UploadError
+from utils.search_index import SearchIndex
+
+if TYPE_CHECKING:
+    from utils.deezer_client import DeezerClient
+
+# Dependências pesadas (yt-dlp, requests, mutagen.mp4) são importadas no
+# primeiro uso: listar e servir arquivos não paga pelas centenas de módulos
+# de extratores do yt-dlp a cada início de processo (ou cold start)
+YoutubeDL = None
+DownloadCancelled = None
+
+
+class _DownloadCancelled(Exception):
+    """Cancelamento de download quando o yt_dlp.utils não pôde ser importado."""
+
+
+# musics/ do projeto, a menos que MUSIC_DIR/COVERS_DIR estejam no ambiente
+MUSIC_DIR = str(settings.MUSIC_DIR)
 os.makedirs(MUSIC_DIR, exist_ok=True)
 
 # Capa default e pasta de capas
-COVERS_DIR = os.path.join(MUSIC_DIR, 'covers')
+COVERS_DIR = str(settings.COVERS_DIR)
 os.makedirs(COVERS_DIR, exist_ok=True)
 DEFAULT_COVER = '/musics/default-cover.jpg'
 
+# Cache persistente (índice da biblioteca etc.)
+CACHE_DIR = str(settings.CACHE_DIR)
+
 app = Flask(__name__)
-CORS(app)
+# Cabeçalhos do upload retomável precisam ser legíveis pelo navegador
+CORS(app, expose_headers=['Location', 'Upload-Offset', 'Upload-Length', 'Tus-Resumable'])
 
 # Ensure correct audio MIME types
 mimetypes.add_type('audio/webm', '.webm')
 mimetypes.add_type('audio/mp4', '.m4a')
 mimetypes.add_type('audio/aac', '.aac')
 
+# Métricas expostas em /metrics (por processo; ver utils/metrics.py)
+metrics = CollectorRegistry()
+REQUEST_SECONDS = Histogram(
+    'musickera_http_request_duration_seconds',
+    "Tempo até a resposta (cabeçalhos) por rota, método e status",
+    ('route', 'method', 'status'), registry=metrics)
+LIBRARY_SCAN_SECONDS = Histogram(
+    'musickera_library_scan_seconds',
+    "Duração da varredura de musics/ (LibraryIndex.refresh)", ('trigger',), registry=metrics)
+TAG_EXTRACTION_SECONDS = Histogram(
+    'musickera_tag_extraction_seconds', "Leitura das tags de um arquivo de áudio", ('format',),
+    registry=metrics)
+DEEZER_REQUEST_SECONDS = Histogram(
+    'musickera_deezer_request_seconds', "Chamadas à API do Deezer (fora do cache)", ('endpoint',),
+    registry=metrics)
+DEEZER_ERRORS = Counter(
+    'musickera_deezer_errors_total', "Chamadas à API do Deezer que falharam", ('endpoint',), registry=metrics)
+COVER_DOWNLOAD_SECONDS = Histogram(
+    'musickera_cover_download_seconds', "Download de capas (Deezer) e thumbnails de playlist (YouTube)",
+    ('source',), registry=metrics)
+CACHE_REQUESTS = SampleCollector(
+    'counter', 'musickera_cache_requests_total', "Consultas aos caches do Deezer e do extract_info",
+    ('cache', 'result'), registry=metrics)
+DOWNLOAD_JOBS = SampleCollector(
+    'gauge', 'musickera_download_jobs', "Jobs de download na fila ou em execução (todos os processos)",
+    ('status',), registry=metrics)
+SERVED_BYTES = Counter(
+    'musickera_served_bytes_total', "Bytes enviados por /musics/<arquivo> (sem os delegados ao proxy)",
+    ('kind',), registry=metrics)
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _observe_request(response: Response) -> Response:
+    started = g.get('request_started')
+    if started is not None and settings.METRICS_ENABLED:
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        REQUEST_SECONDS.labels(route, request.method, response.status_code).observe(time.perf_counter() - started)
+    return response
+
 
 def _get_playlist_folder(playlist_name: str) -> str:
-    """Cria e retorna o caminho para a pasta da playlist."""
+    """Cria e retorna o caminho para a pasta da playlist.
+    ValueError se o nome não é uma pasta dentro de MUSIC_DIR ('', '.', '..')."""
     # Remove caracteres inválidos do nome da playlist
     safe_name = re.sub(r'[<>:"/\\|?*]', '_', playlist_name)
+    if not safe_name.strip(' .'):
+        raise ValueError(f"Nome de playlist inválido: {playlist_name!r}")
     playlist_dir = os.path.join(MUSIC_DIR, safe_name)
     os.makedirs(playlist_dir, exist_ok=True)
     return playlist_dir
 
 
+def _youtube_dl():
+    """Classe YoutubeDL, importando o yt-dlp na primeira chamada (None se não
+    estiver instalado)."""
+    global YoutubeDL, DownloadCancelled
+    if DownloadCancelled is None:
+        try:
+            from yt_dlp.utils import DownloadCancelled
+        except Exception:
+            pass
+    if YoutubeDL is None:
+        try:
+            from yt_dlp import YoutubeDL
+        except Exception:
+            pass
+    return YoutubeDL
+
+
+def _download_cancelled_class() -> type:
+    """Exceção que os hooks lançam para cancelar: a do yt-dlp (que ele deixa
+    passar sem tentar de novo) ou, na falta dela, a local."""
+    _youtube_dl()
+    return DownloadCancelled or _DownloadCancelled
+
+
+_media_info_cache = InfoCache(ttl=settings.MEDIA_INFO_TTL, max_entries=settings.MEDIA_INFO_CACHE_SIZE)
+
+
+def _extract_media_info(url: str, fresh: bool = False) -> dict:
+    """``extract_info`` sem download, com a playlist expandida sem resolver cada
+    vídeo. O resultado é compartilhado (por URL canônica, MEDIA_INFO_TTL)
+    entre /extract_playlist_name, a escolha da thumbnail e o download; quem o
+    recebe não deve modificá-lo. ``fresh`` ignora o que está em cache."""
+    canonical = canonical_media_url(url)
+    if fresh:
+        _media_info_cache.invalidate(canonical)
+
+    def extract():
+        with _youtube_dl()({'quiet': True, 'no_warnings': True, 'extract_flat': 'in_playlist'}) as ydl:
+            return ydl.extract_info(canonical, download=False)
+
+    return _media_info_cache.get(canonical, extract)
+
+
 def _extract_playlist_name_from_url(url: str) -> str:
     """Extrai o nome da playlist do YouTube a partir da URL."""
-    if YoutubeDL is None:
+    if _youtube_dl() is None:
         return "Playlist"
     
     try:
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': True,
-        }
+        info = _extract_media_info(url)
         
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            # Se for uma playlist, extrai o nome
-            if info.get('_type') == 'playlist':
-                playlist_name = info.get('title', 'Playlist')
-                # Remove caracteres inválidos para nome de pasta
-                safe_name = re.sub(r'[<>:"/\\|?*]', '_', playlist_name)
+        # Se for uma playlist, extrai o nome
+        if info.get('_type') == 'playlist':
+            playlist_name = info.get('title', 'Playlist')
+            # Remove caracteres inválidos para nome de pasta
+            safe_name = re.sub(r'[<>:"/\\|?*]', '_', playlist_name)
+            return safe_name
+        else:
+            # Se for um vídeo único, usa o nome do canal ou título do vídeo
+            channel_name = info.get('uploader', '')
+            video_title = info.get('title', '')
+            if channel_name and video_title:
+                safe_name = re.sub(r'[<>:"/\\|?*]', '_', f"{channel_name} - {video_title}")
+                return safe_name
+            elif video_title:
+                safe_name = re.sub(r'[<>:"/\\|?*]', '_', video_title)
                 return safe_name
             else:
-                # Se for um vídeo único, usa o nome do canal ou título do vídeo
-                channel_name = info.get('uploader', '')
-                video_title = info.get('title', '')
-                if channel_name and video_title:
-                    safe_name = re.sub(r'[<>:"/\\|?*]', '_', f"{channel_name} - {video_title}")
-                    return safe_name
-                elif video_title:
-                    safe_name = re.sub(r'[<>:"/\\|?*]', '_', video_title)
-                    return safe_name
-                else:
-                    return "Playlist"
+                return "Playlist"
     except Exception as e:
         print(f"Erro ao extrair nome da playlist: {e}")
         return "Playlist"
 
 
-def _download_youtube_playlist(url: str, playlist_name: str = None) -> dict:
-    if YoutubeDL is None:
+def _publish_download(action: str, download_id: str, **extra) -> None:
+    _download_journal.append(action, download_id, **extra)
+
+
+def _playlist_thumbnail_url(info: Optional[dict]) -> Optional[str]:
+    """Thumbnail da playlist (ou do primeiro vídeo, ou do vídeo único)."""
+    if not info:
+        return None
+    if info.get('_type') == 'playlist':
+        # Tenta pegar thumbnail da playlist primeiro
+        thumbnail = info.get('thumbnails', [{}])[0].get('url') if info.get('thumbnails') else None
+        if not thumbnail:
+            # Tenta pegar thumbnail do primeiro vídeo
+            entries = [entry for entry in info.get('entries') or [] if entry]
+            if entries:
+                first_video = entries[0]
+                if first_video.get('thumbnails'):
+                    thumbnail = first_video['thumbnails'][-1].get('url')
+                elif first_video.get('thumbnail'):
+                    thumbnail = first_video['thumbnail']
+        return thumbnail
+    # Se for um vídeo único, usa sua thumbnail
+    return info.get('thumbnail')
+
+
+def _playlist_entries(url: str, info: Optional[dict]) -> List[dict]:
+    """Itens a baixar: as entradas da playlist expandida ou o próprio vídeo."""
+    if info and info.get('_type') == 'playlist':
+        entries = []
+        for entry in info.get('entries') or []:
+            entry_url = entry and (entry.get('url') or entry.get('webpage_url'))
+            if entry_url:
+                entries.append({'id': entry.get('id'), 'title': entry.get('title'), 'url': entry_url})
+        return entries
+    # Vídeo único: a extração completa já foi feita e é reaproveitada no download
+    return [{'id': (info or {}).get('id'), 'title': (info or {}).get('title'), 'url': url, 'info': info}]
+
+
+def _download_youtube_playlist(url: str, playlist_name: str = None, download_id: Optional[str] = None,
+                               on_progress=None, should_cancel=None,
+                               sync: bool = False, prune: bool = False) -> dict:
+    """Baixa uma playlist (ou vídeo) do YouTube para a pasta da playlist.
+
+    A playlist é expandida uma vez e as entradas são baixadas em paralelo
+    (DOWNLOAD_ENTRY_WORKERS); o erro de uma entrada não derruba as outras e
+    aparece em ``entries``. ``on_progress(**campos)`` recebe o progresso do
+    arquivo atual e ``should_cancel()`` é consultado a cada aviso do yt-dlp.
+
+    Cada vídeo baixado é registrado no arquivo da playlist (PlaylistArchive).
+    Com ``sync`` a playlist é expandida de novo (sem cache) e só os vídeos
+    fora do arquivo são baixados; com ``prune`` os arquivos dos vídeos que
+    saíram da playlist são apagados."""
+    if _youtube_dl() is None:
         return {"success": False, "error": "yt-dlp não está instalado. Adicione 'yt-dlp' ao requirements.txt e instale as dependências."}
 
     # Se não foi fornecido um nome, extrai da URL
@@ -98,15 +261,20 @@ def _download_youtube_playlist(url: str, playlist_name: str = None) -> dict:
 
     # Cria pasta para a playlist
     playlist_dir = _get_playlist_folder(playlist_name)
+    download_id = download_id or uuid.uuid4().hex[:12]
+    _publish_download('download_started', download_id, url=url, playlist=playlist_name)
 
     # Download best audio without requiring ffmpeg conversion
     # Browser can play m4a/webm/opus in most cases. If you want MP3, install ffmpeg and enable postprocessors below.
     ydl_opts = {
         'format': 'bestaudio[ext=m4a]/bestaudio/best',
         'outtmpl': os.path.join(playlist_dir, '%(title)s.%(ext)s'),
-        'ignoreerrors': True,
         'noprogress': True,
-        'noplaylist': False,
+        'quiet': True,
+        'no_warnings': True,
+        'noplaylist': True,
+        # Fragmentos (DASH/HLS) do mesmo arquivo baixados em paralelo
+        'concurrent_fragment_downloads': settings.DOWNLOAD_CONCURRENT_FRAGMENTS,
         # Uncomment to force MP3 conversion (requires ffmpeg installed in PATH):
         # 'postprocessors': [{
         #     'key': 'FFmpegExtractAudio',
@@ -117,75 +285,165 @@ def _download_youtube_playlist(url: str, playlist_name: str = None) -> dict:
 
     downloaded = []
     errors = []
+    pruned = []
     playlist_thumbnail = None
-
-    def hook(d):
-        if d.get('status') == 'finished':
-            filename = d.get('filename')
+    entries: List[dict] = []
+    expanded = False
+    archive = _get_playlist_archive()
+    known = archive.archived(playlist_name) if sync else {}
+
+    last_progress: Dict[str, float] = {}
+
+    def hook(d, entry):
+        if should_cancel is not None and should_cancel():
+            raise _download_cancelled_class()('Download cancelado')
+        filename = d.get('filename')
+        name = os.path.basename(filename) if filename else None
+        if on_progress is not None:
+            on_progress(
+                file=name,
+                status=d.get('status'),
+                downloaded_bytes=d.get('downloaded_bytes'),
+                total_bytes=d.get('total_bytes') or d.get('total_bytes_estimate'),
+                files_done=len(downloaded) + (1 if d.get('status') == 'finished' else 0),
+                entries_total=len(entries),
+            )
+        if d.get('status') == 'downloading':
+            # Progresso limitado a um evento a cada DOWNLOAD_PROGRESS_INTERVAL por arquivo
+            now = time.monotonic()
+            if now - last_progress.get(name, 0) < settings.DOWNLOAD_PROGRESS_INTERVAL:
+                return
+            last_progress[name] = now
+            _publish_download(
+                'download_progress', download_id,
+                playlist=playlist_name,
+                file=name,
+                downloaded_bytes=d.get('downloaded_bytes'),
+                total_bytes=d.get('total_bytes') or d.get('total_bytes_estimate'),
+                speed=d.get('speed'),
+                eta=d.get('eta'),
+            )
+        elif d.get('status') == 'finished':
             if filename:
-                downloaded.append(os.path.basename(filename))
+                downloaded.append(name)
+                entry['file'] = name
+                last_progress.pop(name, None)
+                _publish_download('download_file_finished', download_id, playlist=playlist_name, file=name)
                 try:
                     _ensure_cover_for_file(filename)
                 except Exception:
                     pass
 
-    ydl_opts['progress_hooks'] = [hook]
+    def download_entry(entry: dict) -> None:
+        if should_cancel is not None and should_cancel():
+            entry['status'] = 'cancelled'
+            return
+        # Uma instância do YoutubeDL por entrada: ela não é thread-safe
+        opts = dict(ydl_opts, progress_hooks=[lambda d: hook(d, entry)])
+        info = entry.pop('info', None)
+        try:
+            with YoutubeDL(opts) as ydl:
+                if info and info.get('formats'):
+                    # process_ie_result altera o dict: usa uma cópia do que está em cache
+                    ydl.process_ie_result(copy.deepcopy(info), download=True)
+                else:
+                    ydl.download([entry['url']])
+            entry['status'] = 'downloaded'
+        except Exception as e:
+            cancelled = isinstance(e, (_download_cancelled_class(), _DownloadCancelled))
+            entry['status'] = 'cancelled' if cancelled else 'failed'
+            entry['error'] = str(e)
 
     try:
-        with YoutubeDL(ydl_opts) as ydl:
-            # Primeiro, extrai informações da playlist para obter a thumbnail
-            try:
-                info = ydl.extract_info(url, download=False)
-                if info and info.get('_type') == 'playlist':
-                    # Tenta pegar thumbnail da playlist primeiro
-                    playlist_thumbnail = info.get('thumbnails', [{}])[0].get('url') if info.get('thumbnails') else None
-                    if not playlist_thumbnail:
-                        # Tenta pegar thumbnail do primeiro vídeo
-                        entries = info.get('entries', [])
-                        if entries and len(entries) > 0:
-                            first_video = entries[0]
-                            if first_video and first_video.get('thumbnails'):
-                                playlist_thumbnail = first_video['thumbnails'][0].get('url')
-                            elif first_video and first_video.get('thumbnail'):
-                                playlist_thumbnail = first_video['thumbnail']
-                elif info and info.get('thumbnail'):
-                    # Se for um vídeo único, usa sua thumbnail
-                    playlist_thumbnail = info['thumbnail']
-            except Exception as e:
-                print(f"Erro ao extrair thumbnail da playlist: {e}")
-            
-            # Agora faz o download
-            ydl.download([url])
+        # Expande a playlist uma única vez (sem resolver cada vídeo); reaproveita
+        # a extração feita por /extract_playlist_name
+        info = _extract_media_info(url, fresh=sync)
+        expanded = True
+        playlist_thumbnail = _playlist_thumbnail_url(info)
+        entries = _playlist_entries(url, info)
+        pending = []
+        for entry in entries:
+            if entry['id'] and entry['id'] in known:
+                entry['status'] = 'archived'
+                entry['file'] = known[entry['id']]
+            else:
+                pending.append(entry)
+        if pending:
+            workers = max(1, min(settings.DOWNLOAD_ENTRY_WORKERS, len(pending)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download-entry') as executor:
+                list(executor.map(download_entry, pending))
     except Exception as e:
         errors.append(str(e))
 
+    failed = [entry for entry in entries if entry.get('status') == 'failed']
+    for entry in failed:
+        errors.append(f"{entry.get('title') or entry['url']}: {entry['error']}")
+    ok = [entry for entry in entries if entry.get('status') == 'downloaded']
+    for entry in ok:
+        if entry['id']:
+            archive.record(playlist_name, entry['id'], entry.get('file'))
+
+    # Só poda com a playlist expandida e não vazia: uma extração que voltou
+    # sem entradas não deve apagar a pasta inteira
+    if sync and prune and expanded and entries:
+        current = {entry['id'] for entry in entries if entry['id']}
+        removed = [video_id for video_id in known if video_id not in current]
+        # Vídeos diferentes podem ter gerado o mesmo nome de arquivo: só apaga
+        # o arquivo registrado se nenhum vídeo que continua na playlist o usa
+        in_use = {known[video_id] for video_id in current if known.get(video_id)}
+        in_use.update(entry['file'] for entry in ok if entry.get('file'))
+        for video_id in removed:
+            name = known[video_id]
+            if name and name not in in_use:
+                try:
+                    os.remove(os.path.join(playlist_dir, os.path.basename(name)))
+                    pruned.append(name)
+                except OSError:
+                    pass
+        archive.forget(playlist_name, removed)
+
     # Baixa a thumbnail da playlist se encontrou uma
-    if playlist_thumbnail and not errors:
+    if playlist_thumbnail and ok:
         try:
             print(f"🎯 Thumbnail encontrada: {playlist_thumbnail}")
-            response = requests.get(playlist_thumbnail, timeout=10)
+            import requests
+            with COVER_DOWNLOAD_SECONDS.labels('youtube').time():
+                response = requests.get(playlist_thumbnail, timeout=10)
             if response.status_code == 200:
                 safe_playlist = _safe_stem(playlist_name)
                 cover_path = os.path.join(COVERS_DIR, f"{safe_playlist}.jpg")
-                with open(cover_path, 'wb') as f:
-                    f.write(response.content)
+                _write_cover_file(cover_path, response.content)
                 print(f"✅ Thumbnail da playlist salva: {cover_path}")
+                _library_journal.append('cover', playlist_name, playlist=playlist_name,
+                                        cover=f'/musics/covers/{safe_playlist}.jpg')
             else:
                 print(f"❌ Erro HTTP ao baixar thumbnail: {response.status_code}")
         except Exception as e:
             print(f"❌ Erro ao baixar thumbnail da playlist: {e}")
-    else:
+    elif not playlist_thumbnail:
         print(f"⚠️ Nenhuma thumbnail encontrada para playlist: {playlist_name}")
 
-    success = len(downloaded) > 0 and len(errors) == 0
+    # Sucesso se alguma entrada foi baixada (ou, na sincronização, se não havia
+    # nada novo a baixar); falhas parciais ficam em 'entries'
+    skipped = sum(1 for entry in entries if entry.get('status') == 'archived')
+    success = len(ok) > 0 or (sync and expanded and not failed)
     result = {
         "success": success,
         "downloaded": downloaded,
         "errors": errors,
+        "entries": entries,
+        "failed_count": len(failed),
+        "partial": success and len(ok) < len(entries) - skipped,
         "playlist": playlist_name,
+        "download_id": download_id,
+        "sync": sync,
+        "skipped": skipped,
+        "pruned": pruned,
     }
     if not success:
         result["error"] = errors[0] if errors else "Falha no download"
+    _publish_download('download_done', download_id, playlist=playlist_name, success=success,
+                      downloaded=len(downloaded), errors=errors, skipped=skipped, pruned=len(pruned))
     return result
 
 
@@ -203,7 +461,9 @@ def _infer_title_artist_from_filename(filename: str) -> Dict[str, str]:
 
 def _extract_mp4_tags(path: str) -> Dict[str, Optional[str]]:
     tags = {'title': None, 'artist': None, 'album': None, 'year': None}
-    if MP4 is None:
+    try:
+        from mutagen.mp4 import MP4
+    except Exception:
         return tags
     try:
         audio = MP4(path)
@@ -249,82 +509,181 @@ def _extract_generic_tags(path: str) -> Dict[str, Optional[str]]:
     return tags
 
 
+_deezer_cache: Optional[DeezerCache] = None
+_deezer_cache_lock = threading.Lock()
+
+
+def _get_deezer_cache() -> DeezerCache:
+    """Cache em disco das respostas do Deezer (em CACHE_DIR)."""
+    global _deezer_cache
+    db_path = os.path.join(CACHE_DIR, settings.DEEZER_CACHE_FILE)
+    with _deezer_cache_lock:
+        if _deezer_cache is None or _deezer_cache.db_path != db_path:
+            _deezer_cache = DeezerCache(
+                db_path,
+                hit_ttl=settings.DEEZER_CACHE_HIT_TTL,
+                miss_ttl=settings.DEEZER_CACHE_MISS_TTL,
+                max_entries=settings.DEEZER_CACHE_MAX_ENTRIES,
+            )
+        return _deezer_cache
+
+
+_deezer_client: Optional['DeezerClient'] = None
+
+
+def _get_deezer_client() -> 'DeezerClient':
+    """Cliente HTTP do Deezer compartilhado (pool de conexões + limite de taxa).
+    O requests só é importado aqui, na primeira busca no Deezer."""
+    global _deezer_client
+    with _deezer_cache_lock:
+        if _deezer_client is None:
+            from utils.deezer_client import DeezerClient
+            _deezer_client = DeezerClient(
+                base_url=settings.DEEZER_API_URL,
+                rate=settings.RATE_LIMIT['deezer'],
+                timeout=settings.SEARCH_TIMEOUT,
+                retries=settings.DOWNLOAD_RETRIES,
+                max_concurrency=settings.DEEZER_MAX_CONCURRENCY,
+                processes=settings.DEEZER_RATE_PROCESSES,
+            )
+        return _deezer_client
+
+
+def _deezer_get_json(endpoint: str, path: str, **kwargs) -> dict:
+    """``get_json`` do cliente do Deezer com tempo e falhas nas métricas."""
+    try:
+        with DEEZER_REQUEST_SECONDS.labels(endpoint).time():
+            return _get_deezer_client().get_json(path, **kwargs)
+    except Exception:
+        DEEZER_ERRORS.labels(endpoint).inc()
+        raise
+
+
+def _cache_samples() -> Dict[tuple, int]:
+    """Acertos e faltas dos caches (lidos dos próprios caches na coleta)."""
+    samples = {('media_info', 'hit'): _media_info_cache.hits, ('media_info', 'miss'): _media_info_cache.misses}
+    if _deezer_cache is not None:
+        stats = _deezer_cache.stats()
+        samples[('deezer', 'hit')] = stats['hits']
+        samples[('deezer', 'negative_hit')] = stats['negative_hits']
+        samples[('deezer', 'miss')] = stats['misses']
+    return samples
+
+
+CACHE_REQUESTS.set_function(_cache_samples)
+
+
+def _deezer_search_track(title: str, artist: str) -> Optional[dict]:
+    """Primeiro resultado de /search do Deezer para "artista título".
+    Resultados (inclusive vazios) ficam no cache em disco; erros não."""
+    query = f"{artist} {title}".strip() or title
+    if not query:
+        return None
+    key = 'search:' + normalize_query(query)
+    cache = _get_deezer_cache()
+    found, track = cache.get(key)
+    if found:
+        return track
+    # Erros (inclusive cota excedida) viram exceção e não entram no cache
+    data = _deezer_get_json('search', '/search', params={'q': query})
+    track = (data.get('data') or [None])[0]
+    if track:
+        album = track.get('album') or {}
+        track = {
+            'title': track.get('title'),
+            'artist': {'name': (track.get('artist') or {}).get('name')},
+            'album': {k: album.get(k) for k in ('id', 'title', 'cover', 'cover_xl')},
+        }
+    cache.set(key, track)
+    return track
+
+
+def _deezer_album_release_date(album_id) -> Optional[str]:
+    """release_date de /album/{id} do Deezer (com cache em disco)."""
+    key = f'album:{album_id}'
+    cache = _get_deezer_cache()
+    found, album = cache.get(key)
+    if found:
+        return (album or {}).get('release_date')
+    album_json = _deezer_get_json('album', f'/album/{album_id}')
+    release_date = album_json.get('release_date')
+    cache.set(key, {'release_date': release_date} if release_date else None)
+    return release_date
+
+
+def _write_cover_file(path: str, data: bytes) -> None:
+    """Grava uma capa de forma atômica (temporário + rename), o que também
+    atualiza o mtime de COVERS_DIR e invalida os caches que dependem dele."""
+    tmp = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
 def _download_cover_from_deezer(title: str, artist: str, out_filename: Optional[str] = None) -> Optional[str]:
     """Tenta obter capa via Deezer API e salvar em musics/covers.
     Se out_filename (basename sem extensão) for informado, usa esse nome.
     Retorna URL relativa começando com /musics/.
     """
     try:
-        import requests
-        query = f"{artist} {title}".strip()
-        if not query:
-            query = title
-        if not query:
-            return None
-        r = requests.get('https://api.deezer.com/search', params={'q': query}, timeout=10)
-        data = r.json()
-        track = (data.get('data') or [None])[0]
+        track = _deezer_search_track(title, artist)
         if not track:
             return None
         cover_url = track.get('album', {}).get('cover_xl') or track.get('album', {}).get('cover')
         if not cover_url:
             return None
-        img = requests.get(cover_url, timeout=10).content
+        with COVER_DOWNLOAD_SECONDS.labels('deezer').time():
+            img = _get_deezer_client().get_bytes(cover_url)
         if out_filename:
             safe_name = re.sub(r'[^a-zA-Z0-9_-]+', '_', out_filename)[:80] or 'cover'
         else:
             safe_name = re.sub(r'[^a-zA-Z0-9_-]+', '_', f"{artist}_{title}")[:80] or 'cover'
         cover_file = os.path.join(COVERS_DIR, f"{safe_name}.jpg")
-        with open(cover_file, 'wb') as f:
-            f.write(img)
+        _write_cover_file(cover_file, img)
         rel = '/musics/covers/' + os.path.basename(cover_file)
         return rel
     except Exception:
         return None
 
 
+def _lookup_metadata_on_deezer(title: str, artist: str) -> Dict[str, Optional[str]]:
+    """Busca metadados no Deezer (title, artist, album, year, cover).
+    Falhas na busca sobem como exceção: "não encontrado" é um dict vazio."""
+    enriched = {'title': None, 'artist': None, 'album': None, 'year': None, 'cover': None}
+    track = _deezer_search_track(title, artist)
+    if not track:
+        return enriched
+    enriched['title'] = track.get('title')
+    enriched['artist'] = track.get('artist', {}).get('name')
+    enriched['album'] = track.get('album', {}).get('title')
+    enriched['cover'] = track.get('album', {}).get('cover_xl') or track.get('album', {}).get('cover')
+    # busca album para pegar release_date
+    album_id = track.get('album', {}).get('id')
+    if album_id:
+        try:
+            release_date = _deezer_album_release_date(album_id)
+            if release_date:
+                m = re.search(r'(\d{4})', release_date)
+                if m:
+                    enriched['year'] = m.group(1)
+        except Exception:
+            pass
+    return enriched
+
+
 def _enrich_metadata_from_deezer(title: str, artist: str) -> Dict[str, Optional[str]]:
     """Busca metadados no Deezer (title, artist, album, year, cover)."""
-    enriched = {'title': None, 'artist': None, 'album': None, 'year': None, 'cover': None}
     try:
-        import requests
-        query = f"{artist} {title}".strip() or title
-        if not query:
-            return enriched
-        r = requests.get('https://api.deezer.com/search', params={'q': query}, timeout=10)
-        data = r.json()
-        track = (data.get('data') or [None])[0]
-        if not track:
-            return enriched
-        enriched['title'] = track.get('title')
-        enriched['artist'] = track.get('artist', {}).get('name')
-        enriched['album'] = track.get('album', {}).get('title')
-        enriched['cover'] = track.get('album', {}).get('cover_xl') or track.get('album', {}).get('cover')
-        # busca album para pegar release_date
-        album_id = track.get('album', {}).get('id')
-        if album_id:
-            try:
-                album_resp = requests.get(f'https://api.deezer.com/album/{album_id}', timeout=10)
-                album_json = album_resp.json()
-                release_date = album_json.get('release_date')
-                if release_date:
-                    import re as _re
-                    m = _re.search(r'(\d{4})', release_date)
-                    if m:
-                        enriched['year'] = m.group(1)
-            except Exception:
-                pass
+        return _lookup_metadata_on_deezer(title, artist)
     except Exception:
-        return enriched
-    return enriched
+        return {'title': None, 'artist': None, 'album': None, 'year': None, 'cover': None}
 
 
 def _ensure_cover_for_file(audio_path: str) -> Optional[str]:
     """Garante que exista uma imagem de capa para um arquivo de áudio.
     Usa o nome base do arquivo como nome da capa. Retorna URL relativa se existir/baixar."""
     try:
-        stem = os.path.splitext(os.path.basename(audio_path))[0]
-        safe_stem = re.sub(r'[^a-zA-Z0-9_-]+', '_', stem)[:80] or 'cover'
+        safe_stem = _cover_stem(audio_path)
         target = os.path.join(COVERS_DIR, f"{safe_stem}.jpg")
         if os.path.exists(target):
             return '/musics/covers/' + os.path.basename(target)
@@ -345,6 +704,329 @@ def _ensure_cover_for_file(audio_path: str) -> Optional[str]:
         return None
 
 
+def _cover_stem(filename: str) -> str:
+    """Nome (sem extensão) da capa associada a um arquivo de áudio."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return re.sub(r'[^a-zA-Z0-9_-]+', '_', stem)[:80] or 'cover'
+
+
+_cover_names_cache = {'key': None, 'names': frozenset()}
+_cover_names_lock = threading.Lock()
+
+
+def _existing_cover_names() -> frozenset:
+    """Nomes dos arquivos em COVERS_DIR; a pasta só é relida quando o mtime muda."""
+    try:
+        mtime_ns = os.stat(COVERS_DIR).st_mtime_ns
+    except OSError:
+        return frozenset()
+    key = (COVERS_DIR, mtime_ns)
+    with _cover_names_lock:
+        if _cover_names_cache['key'] == key:
+            return _cover_names_cache['names']
+    names = frozenset(os.listdir(COVERS_DIR))
+    # Conferir as miniaturas custa um stat por capa: fica para a fila de capas
+    _cover_queue.submit(('thumbs-scan', COVERS_DIR), _scan_thumbnails, _get_cover_thumbnails())
+    # Pasta alterada agora há pouco: não confia no mtime para a próxima leitura
+    if time.time_ns() - mtime_ns > 2 * 1_000_000_000:
+        with _cover_names_lock:
+            _cover_names_cache.update(key=key, names=names)
+    return names
+
+
+def _track_cover_url(filename: str, cover_names: frozenset) -> str:
+    """URL da capa já existente de uma música (sem baixar nada)."""
+    cover_file = f"{_cover_stem(filename)}.jpg"
+    return '/musics/covers/' + cover_file if cover_file in cover_names else DEFAULT_COVER
+
+
+_cover_thumbnails: Optional[CoverThumbnails] = None
+_cover_thumbnails_lock = threading.Lock()
+
+
+def _get_cover_thumbnails() -> CoverThumbnails:
+    """Registro das miniaturas das capas (recriado se COVERS_DIR/CACHE_DIR mudarem)."""
+    global _cover_thumbnails
+    db_path = os.path.join(CACHE_DIR, settings.THUMBNAIL_INDEX_FILE)
+    with _cover_thumbnails_lock:
+        if (_cover_thumbnails is None or _cover_thumbnails.covers_dir != COVERS_DIR
+                or _cover_thumbnails.db_path != db_path):
+            if _cover_thumbnails is not None:
+                _cover_thumbnails.close()
+            _cover_thumbnails = CoverThumbnails(
+                COVERS_DIR, db_path, sizes=settings.THUMBNAIL_SIZES, quality=settings.THUMBNAIL_QUALITY
+            )
+        return _cover_thumbnails
+
+
+def _scan_thumbnails(thumbnails: CoverThumbnails) -> None:
+    """Tarefa da fila de capas: agenda as miniaturas que faltam ou estão
+    desatualizadas. Se a pasta mudar durante a varredura, varre de novo (um
+    pedido feito nesse meio-tempo foi descartado como duplicado)."""
+    while True:
+        try:
+            mtime_ns = os.stat(thumbnails.covers_dir).st_mtime_ns
+            names = os.listdir(thumbnails.covers_dir)
+        except OSError:
+            return
+        for name in thumbnails.stale(names):
+            _cover_queue.submit(('thumbs', name), thumbnails.generate, name)
+        try:
+            if os.stat(thumbnails.covers_dir).st_mtime_ns == mtime_ns:
+                return
+        except OSError:
+            return
+
+
+def _cover_thumbs(cover_url: str) -> Optional[Dict[str, str]]:
+    """{tamanho: URL imutável} das miniaturas de uma capa, se já geradas."""
+    prefix = '/musics/covers/'
+    if not cover_url.startswith(prefix):
+        return None
+    return _get_cover_thumbnails().urls(cover_url[len(prefix):], prefix)
+
+
+def _parse_cover_size() -> Optional[int]:
+    raw = request.args.get('cover_size')
+    if raw is None:
+        return None
+    try:
+        size = int(raw)
+    except ValueError:
+        return None
+    return size if size > 0 else None
+
+
+def _apply_cover_size(item: dict, size: Optional[int]) -> dict:
+    """Troca ``cover`` pela menor miniatura com pelo menos ``size`` pixels."""
+    thumbs = item.get('cover_thumbs')
+    if size and thumbs:
+        sizes = sorted(int(s) for s in thumbs)
+        best = next((s for s in sizes if s >= size), sizes[-1])
+        item['cover'] = thumbs[str(best)]
+    return item
+
+
+def _extract_local_tags(path: str) -> Dict[str, Optional[str]]:
+    """Extrai as tags gravadas no próprio arquivo de áudio."""
+    if path.lower().endswith('.m4a'):
+        with TAG_EXTRACTION_SECONDS.labels('mp4').time():
+            return _extract_mp4_tags(path)
+    tags = {'title': None, 'artist': None, 'album': None, 'year': None}
+    with TAG_EXTRACTION_SECONDS.labels('generic').time():
+        gtags = _extract_generic_tags(path)
+    tags.update({k: v or tags.get(k) for k, v in gtags.items()})
+    return tags
+
+
+_library_index: Optional[LibraryIndex] = None
+_library_index_lock = threading.Lock()
+
+
+def _get_library_index() -> LibraryIndex:
+    """Retorna o índice persistente da biblioteca (recriado se MUSIC_DIR/CACHE_DIR mudarem)."""
+    global _library_index
+    db_path = os.path.join(CACHE_DIR, settings.LIBRARY_INDEX_FILE)
+    with _library_index_lock:
+        if _library_index is None or _library_index.root != MUSIC_DIR or _library_index.db_path != db_path:
+            if _library_index is not None:
+                _library_index.close()
+            _library_index = LibraryIndex(db_path, MUSIC_DIR, tag_reader=_extract_local_tags)
+        return _library_index
+
+
+# Jornal de mudanças da biblioteca (criações, alterações, remoções e renomeações)
+_library_journal = ChangeJournal(maxlen=settings.LIBRARY_JOURNAL_SIZE)
+# Eventos de download ficam em um jornal próprio (mesma condição, para /events
+# esperar pelos dois) e não invalidam os ETags do catálogo
+_download_journal = ChangeJournal(maxlen=settings.DOWNLOAD_JOURNAL_SIZE, condition=_library_journal.condition)
+_library_watcher: Optional[LibraryWatcher] = None
+_library_watcher_lock = threading.Lock()
+
+
+def _record_library_changes(changes) -> None:
+    for change in changes:
+        change = dict(change)
+        _library_journal.append(change.pop('action'), change.pop('path'), **change)
+
+
+def _on_library_change(dirs, force: bool) -> None:
+    """Callback do observador: reindexa o que mudou e registra no jornal."""
+    with LIBRARY_SCAN_SECONDS.labels('watcher').time():
+        changes = _get_library_index().refresh(force=force, dirs=dirs)
+    _record_library_changes(changes)
+
+
+def _library_watcher_running() -> bool:
+    watcher = _library_watcher
+    return watcher is not None and watcher.root == MUSIC_DIR and watcher.is_alive()
+
+
+def _ensure_library_watcher() -> None:
+    """Inicia o observador da biblioteca (uma vez por processo e por MUSIC_DIR)."""
+    global _library_watcher
+    if settings.LIBRARY_WATCHER == 'off':
+        return
+    with _library_watcher_lock:
+        if _library_watcher_running():
+            return
+        if _library_watcher is not None:
+            _library_watcher.stop()
+        _library_watcher = LibraryWatcher(
+            MUSIC_DIR,
+            _on_library_change,
+            mode=settings.LIBRARY_WATCHER,
+            poll_interval=settings.LIBRARY_POLL_INTERVAL,
+            is_relevant=is_audio_file,
+        )
+        _library_watcher.start()
+
+
+def _refresh_library() -> LibraryIndex:
+    """Retorna o índice da biblioteca atualizado.
+
+    Com o observador rodando, o índice já está em dia e nada é lido do disco.
+    Caso contrário, sincroniza apenas os diretórios alterados e inicia o observador."""
+    index = _get_library_index()
+    if _library_watcher_running():
+        return index
+    _ensure_library_watcher()
+    with LIBRARY_SCAN_SECONDS.labels('request').time():
+        changes = index.refresh()
+    _record_library_changes(changes)
+    return index
+
+
+def _catalog_etag(*parts, ignore: Tuple[str, ...] = ()) -> Optional[str]:
+    """ETag forte para respostas do catálogo.
+
+    Deriva da geração do catálogo (id + sequência do jornal da biblioteca e
+    mtime da pasta de capas) e dos parâmetros da requisição, exceto os de
+    ``ignore``. Retorna None se a pasta de capas acabou de mudar, pois o mtime
+    ainda não é confiável."""
+    try:
+        covers_mtime_ns = os.stat(COVERS_DIR).st_mtime_ns
+    except OSError:
+        covers_mtime_ns = 0
+    if time.time_ns() - covers_mtime_ns < 2 * 1_000_000_000:
+        return None
+    key = json.dumps([
+        _library_journal.journal_id,
+        _library_journal.seq,
+        covers_mtime_ns,
+        _get_cover_thumbnails().generation,
+        request.path,
+        sorted((name, value) for name, value in request.args.items(multi=True) if name not in ignore),
+        *parts,
+    ])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _not_modified(etag: Optional[str]) -> Optional[Response]:
+    """Resposta 304 se o cliente já tem a versão identificada por ``etag``."""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    return _with_etag(response, etag)
+
+
+def _with_etag(response: Response, etag: Optional[str]) -> Response:
+    if etag is not None:
+        response.set_etag(etag)
+        # Sempre revalida: a resposta muda assim que o catálogo muda
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _rel_dir(rel: str) -> str:
+    return rel.rsplit('/', 1)[0] if '/' in rel else ''
+
+
+def _change_item(event: dict, action: Optional[str] = None) -> dict:
+    """Converte um evento do jornal no formato usado por /check_music_changes."""
+    if event['action'] == 'cover':
+        return {'seq': event['seq'], 'action': 'cover', 'playlist': event['playlist'], 'cover': event['cover']}
+    rel = event['path']
+    item = {
+        'seq': event['seq'],
+        'name': os.path.basename(rel),
+        'path': '/musics/' + rel,
+        'playlist': os.path.basename(_rel_dir(rel)) or "Geral",
+        'action': action or event['action'],
+    }
+    if 'size' in event:
+        item['size'] = event['size']
+        item['modified'] = event['mtime']
+    if 'old_path' in event:
+        item['old_path'] = '/musics/' + event['old_path']
+    if 'metadata' in event:
+        item['metadata'] = event['metadata']
+    return item
+
+
+def _event_in_playlist(event: dict, prefix: str) -> bool:
+    if not prefix:
+        return True
+    if event['action'] == 'cover':
+        return event['playlist'] + '/' == prefix
+    return event['path'].startswith(prefix) or event.get('old_path', '').startswith(prefix)
+
+
+def _track_item(row, cover_names: frozenset) -> dict:
+    """Monta a entrada básica de uma música a partir de uma linha do índice."""
+    cover = _track_cover_url(row['name'], cover_names)
+    return {
+        'name': row['name'],
+        'path': '/musics/' + row['rel'],
+        'playlist': os.path.basename(row['dir']) if row['dir'] else "Geral",
+        'cover': cover,
+        'cover_thumbs': _cover_thumbs(cover),
+        'size': row['size'],
+        'modified': row['mtime'],
+    }
+
+
+def _local_title_artist(filename: str, tags: Dict[str, Optional[str]]):
+    """Título e artista a partir das tags locais, completados pelo nome do arquivo."""
+    inferred = _infer_title_artist_from_filename(filename)
+    title = (tags.get('title') or inferred['title'] or '').strip()
+    artist = (tags.get('artist') or inferred['artist'] or '').strip()
+    return title, artist
+
+
+def _row_enrichment(row) -> Optional[Dict[str, Optional[str]]]:
+    """Resultado do Deezer já persistido no índice (None se nunca consultado)."""
+    if not row['enriched']:
+        return None
+    return {'title': row['e_title'], 'artist': row['e_artist'], 'album': row['e_album'], 'year': row['e_year']}
+
+
+def _resolve_track_metadata(filename: str, tags: Dict[str, Optional[str]],
+                            enrichment: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, str]:
+    """Combina tags locais, nome do arquivo e (se faltar título/artista) o Deezer.
+    Se ``enrichment`` for informado, ele é usado no lugar de consultar o Deezer."""
+    tags = dict(tags)
+    title, artist = _local_title_artist(filename, tags)
+
+    # Só busca no Deezer se realmente necessário (título ou artista vazios)
+    if not artist or not title:
+        if enrichment is None:
+            enrichment = _enrich_metadata_from_deezer(title, artist)
+        title = enrichment.get('title') or title
+        artist = enrichment.get('artist') or artist
+        if not tags.get('album'):
+            tags['album'] = enrichment.get('album') or tags.get('album')
+        if not tags.get('year'):
+            tags['year'] = enrichment.get('year') or tags.get('year')
+
+    return {
+        'title': title,
+        'artist': artist,
+        'album': tags.get('album') or '',
+        'year': tags.get('year') or '',
+    }
+
+
 def _safe_stem(name: str) -> str:
     try:
         return re.sub(r'[^a-zA-Z0-9_-]+', '_', name).strip('_')[:80] or 'cover'
@@ -378,7 +1060,8 @@ def _get_or_create_playlist_cover(playlist_name: str) -> str:
                     src = os.path.join(COVERS_DIR, os.path.basename(rel_cover))
                     if os.path.exists(src):
                         try:
-                            shutil.copyfile(src, target_path)
+                            with open(src, 'rb') as f:
+                                _write_cover_file(target_path, f.read())
                             print(f"✅ Capa copiada de música para playlist: {target_path}")
                             return '/musics/covers/' + os.path.basename(target_path)
                         except Exception as e:
@@ -393,88 +1076,488 @@ def _get_or_create_playlist_cover(playlist_name: str) -> str:
         return DEFAULT_COVER
 
 
+_cover_queue = DedupWorkQueue(workers=settings.COVER_RESOLVER_WORKERS, name='cover-resolver')
+_cover_misses: Dict[str, float] = {}
+_cover_misses_lock = threading.Lock()
+
+
+def _playlist_cover_url(playlist_name: str, cover_names: frozenset):
+    """Retorna (url, pendente) sem bloquear: se a capa da playlist ainda não
+    existe, agenda a busca em segundo plano e devolve a capa padrão."""
+    cover_file = f"{_safe_stem(playlist_name)}.jpg"
+    if cover_file in cover_names:
+        return '/musics/covers/' + cover_file, False
+    with _cover_misses_lock:
+        missed_at = _cover_misses.get(playlist_name, 0)
+    if time.time() - missed_at < settings.COVER_MISS_RETRY:
+        return DEFAULT_COVER, False
+
+    def publish(cover_url):
+        found = bool(cover_url) and cover_url != DEFAULT_COVER
+        with _cover_misses_lock:
+            if found:
+                _cover_misses.pop(playlist_name, None)
+            else:
+                _cover_misses[playlist_name] = time.time()
+        # Também a falha vai para o jornal: cover_pending deixa de ser true e
+        # o ETag de /list_playlists precisa mudar junto
+        _library_journal.append('cover', playlist_name, playlist=playlist_name,
+                                cover=cover_url if found else DEFAULT_COVER)
+
+    _cover_queue.submit(('playlist', playlist_name), _get_or_create_playlist_cover, playlist_name, on_done=publish)
+    return DEFAULT_COVER, True
+
+
 @app.route('/list_playlists', methods=['GET'])
 def list_playlists():
-    """Lista todas as playlists disponíveis."""
+    """Lista todas as playlists disponíveis.
+
+    Com ``cover_size=<px>``, ``cover`` é a menor miniatura com pelo menos esse tamanho."""
+    index = _refresh_library()
+    etag = _catalog_etag()
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    
     playlists = []
+    cover_names = _existing_cover_names()
+    cover_size = _parse_cover_size()
     
-    # Lista diretórios dentro de musics/ (excluindo covers)
-    for item in os.listdir(MUSIC_DIR):
-        item_path = os.path.join(MUSIC_DIR, item)
-        if os.path.isdir(item_path) and item != 'covers':
-            # Conta quantas músicas tem na playlist
-            music_count = 0
-            for file in os.listdir(item_path):
-                if file.lower().endswith(('.mp3', '.m4a', '.aac', '.ogg', '.opus', '.wav', '.flac', '.webm')):
-                    music_count += 1
-            
-            playlists.append({
-                'name': item,
-                'path': f'/musics/{item}',
-                'music_count': music_count,
-                'cover': _get_or_create_playlist_cover(item)
-            })
+    # Diretórios de primeiro nível em musics/ (excluindo covers), vindos do índice
+    for entry in index.playlists():
+        item = entry['name']
+        # Capas que faltam são resolvidas em segundo plano e anunciadas no
+        # jornal (evento 'cover' em /check_music_changes)
+        cover, cover_pending = _playlist_cover_url(item, cover_names)
+        playlists.append(_apply_cover_size({
+            'name': item,
+            'path': f'/musics/{item}',
+            'music_count': entry['music_count'],
+            'cover': cover,
+            'cover_thumbs': _cover_thumbs(cover),
+            'cover_pending': cover_pending
+        }, cover_size))
     
-    return jsonify({
+    return _with_etag(jsonify({
         'playlists': sorted(playlists, key=lambda x: x['name'].lower()),
         'count': len(playlists)
-    })
+    }), etag)
 
 
 @app.route('/check_music_changes', methods=['GET'])
 def check_music_changes():
-    """Verifica apenas mudanças nos arquivos de música sem processar metadados."""
+    """Verifica apenas mudanças nos arquivos de música sem processar metadados.
+
+    Com ``since=<seq>`` (e o ``journal_id`` recebido antes) devolve só os eventos
+    do jornal posteriores àquela sequência, incluindo remoções e renomeações.
+    Se o cursor não puder ser atendido, responde ``reset: true`` e o cliente
+    deve recarregar a lista completa. Sem ``since``, usa ``last_check``."""
     playlist_name = request.args.get('playlist', '')
     last_check = request.args.get('last_check', '0')
+    raw_since = request.args.get('since')
     
-    try:
-        last_check_time = float(last_check)
-    except ValueError:
-        last_check_time = 0
+    if playlist_name and not os.path.exists(os.path.join(MUSIC_DIR, playlist_name)):
+        return jsonify({"error": "Playlist não encontrada"}), 404
     
+    index = _refresh_library()
+    # No caminho antigo o last_check muda a cada consulta; a validação depende
+    # só da posição do jornal e do estado do catálogo
+    etag = _catalog_etag(ignore=('last_check',) if raw_since is None else ())
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    
+    prefix = playlist_name.strip('/') + '/' if playlist_name.strip('/') else ''
+    current_seq = _library_journal.seq
+    reset = False
     items = []
     
-    if playlist_name:
-        playlist_dir = os.path.join(MUSIC_DIR, playlist_name)
-        if not os.path.exists(playlist_dir):
-            return jsonify({"error": "Playlist não encontrada"}), 404
-        search_dir = playlist_dir
+    if raw_since is not None:
+        journal_id = request.args.get('journal_id')
+        try:
+            events = _library_journal.since(int(raw_since))
+        except ValueError:
+            events = None
+        if events is None or (journal_id and journal_id != _library_journal.journal_id):
+            reset = True
+            events = []
+        for event in events:
+            if event['seq'] > current_seq:
+                break
+            if _event_in_playlist(event, prefix):
+                items.append(_change_item(event))
     else:
-        search_dir = MUSIC_DIR
-    
-    for root, _, files in os.walk(search_dir):
-        if 'covers' in root:
-            continue
-            
-        for f in files:
-            if f.lower().endswith(('.mp3', '.m4a', '.aac', '.ogg', '.opus', '.wav', '.flac', '.webm')):
-                full_path = os.path.join(root, f)
-                modified_time = os.path.getmtime(full_path)
-                
-                # Só inclui arquivos modificados desde a última verificação
-                if modified_time > last_check_time:
-                    rel_path = os.path.relpath(full_path, os.path.dirname(__file__))
-                    playlist = os.path.basename(os.path.dirname(full_path)) if os.path.dirname(full_path) != MUSIC_DIR else "Geral"
-                    
-                    items.append({
-                        'name': f,
-                        'path': '/' + rel_path.replace('\\', '/'),
-                        'playlist': playlist,
-                        'size': os.path.getsize(full_path),
-                        'modified': modified_time,
-                        'action': 'modified' if os.path.exists(full_path) else 'deleted'
-                    })
+        try:
+            last_check_time = float(last_check)
+        except ValueError:
+            last_check_time = 0
+        
+        # Só inclui arquivos modificados desde a última verificação
+        for row in index.tracks(playlist_name, modified_after=last_check_time):
+            items.append({
+                'name': row['name'],
+                'path': '/musics/' + row['rel'],
+                'playlist': os.path.basename(row['dir']) if row['dir'] else "Geral",
+                'size': row['size'],
+                'modified': row['mtime'],
+                'action': 'modified'
+            })
+        # Remoções (e o caminho antigo das renomeações) vêm do jornal
+        reported = {item['path'] for item in items}
+        from_journal = {}
+        for event in _library_journal.since_time(last_check_time):
+            if event['action'] == 'deleted':
+                from_journal[event['path']] = _change_item(event, 'deleted')
+            elif event['action'] == 'renamed':
+                from_journal[event['old_path']] = _change_item({'seq': event['seq'], 'action': 'deleted', 'path': event['old_path']})
+                from_journal[event['path']] = _change_item(event, 'modified')
+        for rel, item in from_journal.items():
+            if rel.startswith(prefix) and item['path'] not in reported:
+                items.append(item)
     
-    return jsonify({
+    return _with_etag(jsonify({
         'changes': items,
         'count': len(items),
-        'current_time': time.time()
+        'current_time': time.time(),
+        'seq': current_seq,
+        'journal_id': _library_journal.journal_id,
+        'reset': reset
+    }), etag)
+
+
+def _event_id(library_seq: int, download_seq: int) -> str:
+    """Id SSE: cursores dos dois jornais (com seus ids, que mudam a cada processo)."""
+    return f"{_library_journal.journal_id}.{library_seq}.{_download_journal.journal_id}.{download_seq}"
+
+
+def _parse_event_id(raw: str):
+    """(library_seq, download_seq) de um Last-Event-ID deste processo, ou None."""
+    try:
+        library_id, library_seq, download_id, download_seq = raw.split('.')
+        if library_id != _library_journal.journal_id or download_id != _download_journal.journal_id:
+            return None
+        return int(library_seq), int(download_seq)
+    except ValueError:
+        return None
+
+
+def _sse(event: str, data, event_id: Optional[str] = None) -> str:
+    lines = [f'id: {event_id}'] if event_id else []
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False))
+    return '\n'.join(lines) + '\n\n'
+
+
+def _download_item(event: dict) -> dict:
+    item = dict(event)
+    item['download_id'] = item.pop('path')
+    return item
+
+
+@app.route('/events', methods=['GET'])
+def events():
+    """Mudanças da biblioteca, capas prontas e progresso de downloads via
+    Server-Sent Events.
+
+    Eventos: ``library`` (mesmo formato de /check_music_changes?since=N),
+    ``cover``, ``download`` e ``reset`` (o cliente perdeu eventos e deve
+    recarregar as listas). Retoma a partir do cabeçalho ``Last-Event-ID`` (ou
+    do parâmetro ``last_event_id``); ``playlist`` filtra os eventos da
+    biblioteca. Sem eventos, envia um comentário de keep-alive a cada
+    EVENTS_HEARTBEAT segundos."""
+    playlist_name = request.args.get('playlist', '').strip('/')
+    prefix = playlist_name + '/' if playlist_name else ''
+    _refresh_library()
+    
+    raw_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    cursor = _parse_event_id(raw_id) if raw_id else None
+    reset = raw_id is not None and cursor is None
+    if cursor is None:
+        cursor = (_library_journal.seq, _download_journal.seq)
+    
+    def generate():
+        library_seq, download_seq = cursor
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+        hello = {'journal_id': _library_journal.journal_id, 'seq': library_seq}
+        yield _sse('reset' if reset else 'ready', hello, _event_id(library_seq, download_seq))
+        while True:
+            library_events = _library_journal.since(library_seq)
+            download_events = _download_journal.since(download_seq)
+            if library_events is None or download_events is None:
+                # Cliente ficou para trás do buffer: recomeça do estado atual
+                library_seq, download_seq = _library_journal.seq, _download_journal.seq
+                hello = {'journal_id': _library_journal.journal_id, 'seq': library_seq}
+                yield _sse('reset', hello, _event_id(library_seq, download_seq))
+                continue
+            for event in library_events:
+                library_seq = event['seq']
+                if _event_in_playlist(event, prefix):
+                    name = 'cover' if event['action'] == 'cover' else 'library'
+                    yield _sse(name, _change_item(event), _event_id(library_seq, download_seq))
+            for event in download_events:
+                download_seq = event['seq']
+                yield _sse('download', _download_item(event), _event_id(library_seq, download_seq))
+            
+            cursors = {_library_journal: library_seq, _download_journal: download_seq}
+            if not wait_for_events(cursors, settings.EVENTS_HEARTBEAT):
+                if not _library_watcher_running():
+                    # Sem observador (LIBRARY_WATCHER=off), verifica o disco a cada heartbeat
+                    _refresh_library()
+                yield ': keep-alive\n\n'
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
     })
 
 
+def _encode_cursor(row) -> str:
+    raw = json.dumps([row['sort_key'], row['rel']], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor: str):
+    """Cursor opaco -> chave (sort_key, rel) da última música já entregue."""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    sort_key, rel = json.loads(raw.decode('utf-8'))
+    if not isinstance(sort_key, str) or not isinstance(rel, str):
+        raise ValueError('cursor inválido')
+    return sort_key, rel
+
+
+_TAG_KEYS = ('title', 'artist', 'album', 'year')
+
+
+def _needs_remote_lookup(filename: str, tags: Dict[str, Optional[str]]) -> bool:
+    """True se título ou artista continuam vazios após tags e nome do arquivo."""
+    title, artist = _local_title_artist(filename, tags)
+    return not title or not artist
+
+
+def _deezer_enrichment(filename: str, tags: Dict[str, Optional[str]],
+                       strict: bool = False) -> Optional[Dict[str, Optional[str]]]:
+    """Consulta o Deezer para uma faixa; None se a consulta falhou (com
+    ``strict``, a exceção sobe)."""
+    title, artist = _local_title_artist(filename, tags)
+    try:
+        found = _lookup_metadata_on_deezer(title, artist)
+    except Exception:
+        if strict:
+            raise
+        return None
+    return {k: found.get(k) for k in _TAG_KEYS}
+
+
+def _full_track_metadata(row, strict: bool = False) -> Dict[str, str]:
+    """Tags locais (relidas só se o arquivo mudou) + Deezer quando necessário.
+    O resultado do Deezer fica salvo no índice até o arquivo mudar. Sem
+    ``strict``, uma falha do Deezer cai nos dados inferidos do nome do arquivo."""
+    index = _get_library_index()
+    tags = index.ensure_tags([row])[row['rel']]
+    enrichment = _row_enrichment(row)
+    if enrichment is None and _needs_remote_lookup(row['name'], tags):
+        enrichment = _deezer_enrichment(row['name'], tags, strict=strict)
+        if enrichment is not None:
+            index.save_enrichment(row, enrichment)
+    return _resolve_track_metadata(row['name'], tags, enrichment or {})
+
+
+def _fallback_track_metadata(row) -> Dict[str, str]:
+    """Metadados sem nenhum I/O: dados já indexados ou inferidos do nome do arquivo."""
+    tags = {k: row[k] for k in _TAG_KEYS} if row['tags_parsed'] else {}
+    return _resolve_track_metadata(row['name'], tags, _row_enrichment(row) or {})
+
+
+def _enrich_track_row(row) -> Dict[str, str]:
+    """Tarefa dos jobs de enriquecimento: relê a linha atual e completa via Deezer.
+    Falhas do Deezer sobem para o job contar a faixa como ``failed``."""
+    current = _get_library_index().get(row['rel'])
+    if current is None:
+        raise FileNotFoundError(row['rel'])
+    return _full_track_metadata(current, strict=True)
+
+
+def _publish_enrichment(row, metadata: Dict[str, str]) -> None:
+    _library_journal.append('metadata', row['rel'], metadata=metadata)
+
+
+_enrichment_jobs = EnrichmentJobs(_enrich_track_row, workers=settings.METADATA_WORKERS)
+
+
+# Pool único de metadados do processo: ``workers`` limita quantas threads uma
+# listagem ocupa; requisições simultâneas dividem as METADATA_MAX_WORKERS
+_metadata_executor = ThreadPoolExecutor(max_workers=settings.METADATA_MAX_WORKERS, thread_name_prefix='metadata')
+
+
+def _music_items(rows, skip_metadata: bool, cover_names: frozenset,
+                 workers: Optional[int] = None, deadline: Optional[float] = None) -> list:
+    """Converte linhas do índice nas entradas retornadas por /list_music.
+
+    Com metadados completos, as faixas que exigem I/O (tags ainda não lidas ou
+    consulta ao Deezer) são processadas em paralelo por até ``workers`` threads
+    do pool compartilhado.
+    ``deadline`` (time.monotonic()) limita a espera: o que não terminar a tempo
+    volta com os dados inferidos do nome do arquivo e ``metadata_pending``.
+    A ordem das entradas é sempre a ordem de ``rows``."""
+    items = [_track_item(row, cover_names) for row in rows]
+    # Se skip_metadata=True, retorna apenas informações básicas
+    if skip_metadata:
+        return items
+    
+    metadata: List[Optional[Dict[str, str]]] = [None] * len(rows)
+    pending = []
+    for i, row in enumerate(rows):
+        if row['tags_parsed']:
+            tags = {k: row[k] for k in _TAG_KEYS}
+            enrichment = _row_enrichment(row)
+            if enrichment is not None or not _needs_remote_lookup(row['name'], tags):
+                metadata[i] = _resolve_track_metadata(row['name'], tags, enrichment or {})
+                continue
+        pending.append(i)
+    
+    if pending:
+        workers = max(1, min(workers or settings.METADATA_WORKERS, settings.METADATA_MAX_WORKERS, len(pending)))
+        todo = iter(pending)
+        lock = threading.Lock()
+        results: Dict[int, Dict[str, str]] = {}
+        stop = threading.Event()
+
+        def runner() -> None:
+            # Cada tarefa no pool processa faixas desta listagem até acabar;
+            # depois do prazo (stop) os resultados são descartados
+            while not stop.is_set():
+                with lock:
+                    i = next(todo, None)
+                if i is None:
+                    return
+                try:
+                    value = _full_track_metadata(rows[i])
+                except Exception:
+                    continue
+                with lock:
+                    if stop.is_set():
+                        return
+                    results[i] = value
+
+        runners = [_metadata_executor.submit(runner) for _ in range(workers)]
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        futures_wait(runners, timeout=timeout)
+        # Faixas já em andamento terminam em segundo plano (tags e cache do
+        # Deezer ficam gravados para a próxima listagem); as demais são deixadas
+        with lock:
+            stop.set()
+            finished = dict(results)
+        for i, value in finished.items():
+            metadata[i] = value
+    
+    for i, row in enumerate(rows):
+        if metadata[i] is None:
+            items[i].update(_fallback_track_metadata(row))
+            items[i]['metadata_pending'] = True
+        else:
+            items[i].update(metadata[i])
+    return items
+
+
+def _music_items_async(rows, cover_names: frozenset):
+    """Entradas com as tags locais já disponíveis; retorna também as linhas que
+    ainda precisam do Deezer (marcadas com ``metadata_pending``)."""
+    items = [_track_item(row, cover_names) for row in rows]
+    tags_by_path = _get_library_index().ensure_tags(rows)
+    pending = []
+    for item, row in zip(items, rows):
+        tags = tags_by_path[row['rel']]
+        enrichment = _row_enrichment(row)
+        item.update(_resolve_track_metadata(row['name'], tags, enrichment or {}))
+        if enrichment is None and _needs_remote_lookup(row['name'], tags):
+            item['metadata_pending'] = True
+            pending.append(row)
+    return items, pending
+
+
+def _submit_enrichment(pending_rows) -> Optional[str]:
+    if not pending_rows:
+        return None
+    return _enrichment_jobs.submit(pending_rows, key_of=lambda row: row['rel'], on_result=_publish_enrichment)
+
+
+def _iter_track_batches(index: LibraryIndex, prefix: str, after, limit: Optional[int]):
+    """Percorre o índice em lotes (paginação por chave), sem carregar tudo na memória."""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = settings.LIST_MUSIC_STREAM_BATCH if remaining is None else min(settings.LIST_MUSIC_STREAM_BATCH, remaining)
+        rows = index.tracks(prefix, after=after, limit=size)
+        if not rows:
+            return
+        yield rows
+        after = (rows[-1]['sort_key'], rows[-1]['rel'])
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            return
+
+
+def _stream_music(index: LibraryIndex, prefix: str, after, limit: Optional[int],
+                  skip_metadata: bool, fmt: str, workers: Optional[int] = None,
+                  deadline: Optional[float] = None, enrich: str = 'sync',
+                  cover_size: Optional[int] = None) -> Response:
+    """Resposta de /list_music gerada aos poucos (JSON ou NDJSON)."""
+    cover_names = _existing_cover_names()
+    dumps = app.json.dumps
+    
+    def generate():
+        count = 0
+        last_row = None
+        pending_rows = []
+        if fmt == 'json':
+            yield '{"music": ['
+        for rows in _iter_track_batches(index, prefix, after, limit):
+            if skip_metadata or enrich != 'async':
+                batch = _music_items(rows, skip_metadata, cover_names, workers, deadline)
+            else:
+                batch, pending = _music_items_async(rows, cover_names)
+                pending_rows.extend(pending)
+            for item in batch:
+                _apply_cover_size(item, cover_size)
+                if fmt == 'json':
+                    yield (',' if count else '') + dumps(item)
+                else:
+                    yield dumps(item) + '\n'
+                count += 1
+            last_row = rows[-1]
+        next_cursor = None
+        if limit is not None and count == limit and last_row is not None:
+            if index.tracks(prefix, after=(last_row['sort_key'], last_row['rel']), limit=1):
+                next_cursor = _encode_cursor(last_row)
+        trailer = {'count': count, 'next_cursor': next_cursor}
+        if not skip_metadata and enrich == 'async':
+            trailer['enrichment_job'] = _submit_enrichment(pending_rows)
+        if fmt == 'json':
+            yield '], ' + dumps(trailer)[1:]
+        else:
+            yield dumps(trailer) + '\n'
+    
+    mimetype = 'application/json' if fmt == 'json' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
 @app.route('/list_music', methods=['GET'])
 def list_music():
-    """Lista músicas de uma playlist específica ou todas as músicas."""
+    """Lista músicas de uma playlist específica ou todas as músicas.
+
+    Parâmetros opcionais:
+    - ``limit``/``cursor``: paginação estável por (nome, caminho); a resposta
+      traz ``next_cursor`` enquanto houver mais páginas e ``total``.
+    - ``stream=json|ndjson``: envia as músicas à medida que são processadas.
+      No NDJSON a última linha é um resumo com ``count`` e ``next_cursor``.
+    - ``workers``/``deadline`` (segundos): paralelismo e tempo máximo da
+      extração de metadados quando ``skip_metadata=false``.
+    - ``enrich=async``: responde já com as tags locais e deixa a consulta ao
+      Deezer para um job em segundo plano (``enrichment_job``, acompanhado em
+      /enrichment_status/<id>); os resultados ficam salvos no índice.
+    - ``cover_size=<px>``: ``cover`` passa a ser a menor miniatura WebP com
+      pelo menos esse tamanho (todas ficam em ``cover_thumbs``).
+    """
     playlist_name = request.args.get('playlist', '')
     # Default: when a specific playlist is requested and client didn't specify, prefer instant load
     raw_skip = request.args.get('skip_metadata', None)
@@ -482,103 +1565,189 @@ def list_music():
         skip_metadata = bool(playlist_name)
     else:
         skip_metadata = str(raw_skip).lower() == 'true'
-    items = []
     
-    if playlist_name:
-        # Lista músicas de uma playlist específica
-        playlist_dir = os.path.join(MUSIC_DIR, playlist_name)
-        if not os.path.exists(playlist_dir):
-            return jsonify({"error": "Playlist não encontrada"}), 404
-        
-        search_dir = playlist_dir
+    cover_size = _parse_cover_size()
+    enrich = request.args.get('enrich', 'sync').lower()
+    if enrich not in ('sync', 'async'):
+        return jsonify({"error": "enrich deve ser 'sync' ou 'async'"}), 400
+    
+    stream = request.args.get('stream', '').lower()
+    if stream not in ('', 'json', 'ndjson'):
+        return jsonify({"error": "stream deve ser 'json' ou 'ndjson'"}), 400
+    
+    limit = None
+    if request.args.get('limit'):
+        try:
+            limit = int(request.args['limit'])
+        except ValueError:
+            limit = 0
+        if limit < 1 or limit > settings.LIST_MUSIC_MAX_LIMIT:
+            return jsonify({"error": f"limit deve estar entre 1 e {settings.LIST_MUSIC_MAX_LIMIT}"}), 400
+    
+    workers = None
+    if request.args.get('workers'):
+        try:
+            workers = int(request.args['workers'])
+        except ValueError:
+            workers = 0
+        if workers < 1 or workers > settings.METADATA_MAX_WORKERS:
+            return jsonify({"error": f"workers deve estar entre 1 e {settings.METADATA_MAX_WORKERS}"}), 400
+    
+    try:
+        deadline_seconds = float(request.args.get('deadline', settings.METADATA_DEADLINE))
+    except ValueError:
+        deadline_seconds = 0
+    if deadline_seconds <= 0:
+        return jsonify({"error": "deadline deve ser um número de segundos maior que zero"}), 400
+    deadline = time.monotonic() + deadline_seconds
+    
+    after = None
+    if request.args.get('cursor'):
+        try:
+            after = _decode_cursor(request.args['cursor'])
+        except (ValueError, TypeError, UnicodeDecodeError):
+            return jsonify({"error": "Cursor inválido"}), 400
+    
+    if playlist_name and not os.path.exists(os.path.join(MUSIC_DIR, playlist_name)):
+        return jsonify({"error": "Playlist não encontrada"}), 404
+    
+    # Sem playlist, lista as músicas de todas as playlists
+    index = _refresh_library()
+    etag = _catalog_etag(skip_metadata, enrich)
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    
+    if stream:
+        # Com metadados, o stream pode conter faixas incompletas (deadline):
+        # sem ETag, para o cliente não revalidar uma lista parcial
+        return _with_etag(_stream_music(index, playlist_name, after, limit, skip_metadata, stream,
+                                        workers, deadline, enrich, cover_size),
+                          etag if skip_metadata else None)
+    
+    paged = limit is not None or after is not None
+    if paged:
+        # Busca uma linha a mais só para saber se existe próxima página
+        rows = index.tracks(playlist_name, after=after, limit=limit + 1 if limit else None)
+        has_more = limit is not None and len(rows) > limit
+        rows = rows[:limit] if limit else rows
     else:
-        # Lista todas as músicas de todas as playlists
-        search_dir = MUSIC_DIR
+        rows = index.tracks(playlist_name)
     
-    for root, _, files in os.walk(search_dir):
-        # Pula a pasta covers
-        if 'covers' in root:
-            continue
-            
-        for f in files:
-            if f.lower().endswith(('.mp3', '.m4a', '.aac', '.ogg', '.opus', '.wav', '.flac', '.webm')):
-                rel_path = os.path.relpath(os.path.join(root, f), os.path.dirname(__file__))
-                full_path = os.path.join(root, f)
-                
-                # Determina a playlist baseada no diretório
-                playlist = os.path.basename(os.path.dirname(full_path)) if os.path.dirname(full_path) != MUSIC_DIR else "Geral"
-                
-                # Se skip_metadata=True, retorna apenas informações básicas
-                if skip_metadata:
-                    # tenta mapear capa rapidamente pelo nome do arquivo
-                    stem = os.path.splitext(os.path.basename(f))[0]
-                    safe_stem = re.sub(r'[^a-zA-Z0-9_-]+', '_', stem)[:80] or 'cover'
-                    existing_cover = os.path.join(COVERS_DIR, f"{safe_stem}.jpg")
-                    cover_url = ('/musics/covers/' + os.path.basename(existing_cover)) if os.path.exists(existing_cover) else DEFAULT_COVER
-                    items.append({
-                        'name': f,
-                        'path': '/' + rel_path.replace('\\', '/'),
-                        'playlist': playlist,
-                        'cover': cover_url,
-                        'size': os.path.getsize(full_path),
-                        'modified': os.path.getmtime(full_path)
-                    })
-                    continue
-                
-                # Processamento completo de metadados (apenas quando necessário)
-                tags = {'title': None, 'artist': None, 'album': None, 'year': None}
-                cover_url = None
-                
-                # Extrai metadados básicos do arquivo
-                if f.lower().endswith('.m4a'):
-                    tags = _extract_mp4_tags(full_path)
-                else:
-                    gtags = _extract_generic_tags(full_path)
-                    tags.update({k: v or tags.get(k) for k, v in gtags.items()})
-                
-                # Infere título e artista do nome do arquivo
-                inferred = _infer_title_artist_from_filename(f)
-                title = (tags.get('title') or inferred['title'] or '').strip()
-                artist = (tags.get('artist') or inferred['artist'] or '').strip()
-                
-                # Só busca no Deezer se realmente necessário (título ou artista vazios)
-                if not artist or not title:
-                    try:
-                        enriched = _enrich_metadata_from_deezer(title, artist)
-                        title = enriched.get('title') or title
-                        artist = enriched.get('artist') or artist
-                        if not tags.get('album'):
-                            tags['album'] = enriched.get('album') or tags.get('album')
-                        if not tags.get('year'):
-                            tags['year'] = enriched.get('year') or tags.get('year')
-                    except Exception:
-                        pass  # Ignora erros do Deezer para não travar o carregamento
-                
-                # Verifica se já existe cover
-                stem = os.path.splitext(os.path.basename(f))[0]
-                safe_stem = re.sub(r'[^a-zA-Z0-9_-]+', '_', stem)[:80] or 'cover'
-                existing_cover = os.path.join(COVERS_DIR, f"{safe_stem}.jpg")
-                if os.path.exists(existing_cover):
-                    cover_url = '/musics/covers/' + os.path.basename(existing_cover)
-                else:
-                    cover_url = DEFAULT_COVER  # Não baixa cover automaticamente
-                
-                items.append({
-                    'name': f,
-                    'path': '/' + rel_path.replace('\\', '/'),
-                    'title': title,
-                    'artist': artist,
-                    'album': tags.get('album') or '',
-                    'year': tags.get('year') or '',
-                    'cover': cover_url,
-                    'playlist': playlist,
-                    'size': os.path.getsize(full_path),
-                    'modified': os.path.getmtime(full_path)
-                })
+    extra = {}
+    if not skip_metadata and enrich == 'async':
+        items, pending_rows = _music_items_async(rows, _existing_cover_names())
+        extra['enrichment_job'] = _submit_enrichment(pending_rows)
+    else:
+        items = _music_items(rows, skip_metadata, _existing_cover_names(), workers, deadline)
+    for item in items:
+        _apply_cover_size(item, cover_size)
+    if any(item.get('metadata_pending') for item in items):
+        etag = None
     
+    if not paged:
+        return _with_etag(jsonify({
+            'music': items,
+            'count': len(items),
+            **extra
+        }), etag)
+    return _with_etag(jsonify({
+        'music': items,
+        'count': len(items),
+        'total': index.count(playlist_name),
+        'next_cursor': _encode_cursor(rows[-1]) if has_more else None,
+        **extra
+    }), etag)
+
+
+@app.route('/enrichment_status/<job_id>', methods=['GET'])
+def enrichment_status(job_id: str):
+    """Estado de um job de enriquecimento criado por /list_music?enrich=async."""
+    job = _enrichment_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    job['results'] = {'/musics/' + rel: metadata for rel, metadata in job['results'].items()}
+    return jsonify(job)
+
+
+_search_index: Optional[SearchIndex] = None
+_search_state = {'journal': None, 'seq': 0, 'root': None}
+_search_lock = threading.Lock()
+# Eventos do jornal que mudam o conteúdo pesquisável de uma faixa
+_SEARCH_UPDATE_ACTIONS = ('created', 'modified', 'renamed', 'metadata')
+
+
+def _search_document(row):
+    """Campos pesquisáveis e dados devolvidos por /search para uma faixa (sem I/O)."""
+    metadata = _fallback_track_metadata(row)
+    playlist = os.path.basename(row['dir']) if row['dir'] else "Geral"
+    fields = dict(metadata, playlist=playlist, name=os.path.splitext(row['name'])[0])
+    payload = {k: row[k] for k in ('rel', 'dir', 'name', 'size', 'mtime')}
+    payload.update(metadata)
+    return fields, payload
+
+
+def _get_search_index() -> SearchIndex:
+    """Índice de busca em memória, construído na primeira busca e depois
+    atualizado pelos eventos do jornal da biblioteca."""
+    global _search_index
+    index = _refresh_library()
+    with _search_lock:
+        events = None
+        if (_search_index is not None and _search_state['root'] == MUSIC_DIR
+                and _search_state['journal'] == _library_journal.journal_id):
+            events = _library_journal.since(_search_state['seq'])
+        if events is None:
+            # Cursor antes da leitura: eventos que chegarem durante a
+            # construção são reaplicados (a operação é idempotente)
+            _search_state.update(journal=_library_journal.journal_id, seq=_library_journal.seq, root=MUSIC_DIR)
+            search_index = SearchIndex()
+            for row in index.tracks():
+                search_index.add(row['rel'], *_search_document(row))
+            _search_index = search_index
+            return search_index
+
+        for event in events:
+            _search_state['seq'] = event['seq']
+            if event['action'] == 'renamed':
+                _search_index.remove(event['old_path'])
+            if event['action'] in _SEARCH_UPDATE_ACTIONS:
+                row = index.get(event['path'])
+                if row is not None:
+                    _search_index.add(row['rel'], *_search_document(row))
+                    continue
+            if event['action'] in _SEARCH_UPDATE_ACTIONS or event['action'] == 'deleted':
+                _search_index.remove(event['path'])
+        return _search_index
+
+
+@app.route('/search', methods=['GET'])
+def search():
+    """Busca faixas por título, artista, álbum ou playlist, sem diferenciar
+    acentos e maiúsculas, com autocompletar e tolerância a erros de digitação.
+    Parâmetros: q e limit (até SEARCH_MAX_RESULTS)."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"success": False, "error": "Termo de busca é obrigatório"}), 400
+    try:
+        limit = int(request.args.get('limit', settings.SEARCH_MAX_RESULTS))
+    except ValueError:
+        return jsonify({"success": False, "error": "limit inválido"}), 400
+    limit = max(1, min(limit, settings.SEARCH_MAX_RESULTS))
+
+    matches = _get_search_index().search(query, limit)
+    cover_names = _existing_cover_names()
+    results = []
+    for score, _, payload in matches:
+        item = _track_item(payload, cover_names)
+        item.update({k: payload[k] for k in _TAG_KEYS})
+        item['score'] = score
+        results.append(item)
     return jsonify({
-        'music': sorted(items, key=lambda x: x['name'].lower()),
-        'count': len(items)
+        "success": True,
+        "query": query,
+        "results": results,
+        "total": len(results)
     })
 
 
@@ -598,13 +1767,125 @@ def create_playlist():
             "playlist": playlist_name,
             "path": playlist_dir
         })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Erro ao criar playlist: {str(e)}"}), 500
 
 
+UPLOAD_HASH = 'sha256'
+
+
+def _library_rel_dir(path: str) -> str:
+    return os.path.relpath(path, MUSIC_DIR).replace(os.sep, '/')
+
+
+def _find_duplicate(digest: str, size: int, rel_dir: str):
+    """Faixa da biblioteca com o mesmo conteúdo (preferindo a mesma pasta).
+
+    Só as faixas com o mesmo tamanho são candidatas; o hash de cada uma é
+    calculado uma vez e guardado no índice."""
+    index = _refresh_library()
+    candidates = sorted(index.with_size(size), key=lambda row: row['dir'] != rel_dir)
+    for row in candidates:
+        row_digest = row['content_hash']
+        if not row_digest:
+            try:
+                row_digest = generate_file_hash(os.path.join(MUSIC_DIR, row['rel']), UPLOAD_HASH)
+            except OSError:
+                continue
+            index.save_hash(row, row_digest)
+        if row_digest == digest:
+            return row
+    return None
+
+
+def _place_file(tmp_path: str, directory: str, filename: str) -> str:
+    """Move ``tmp_path`` para ``directory`` sem sobrescrever: se o nome já
+    existe, usa 'nome (2).ext', 'nome (3).ext'... Retorna o nome final."""
+    stem, ext = os.path.splitext(filename)
+    candidate = filename
+    n = 1
+    while True:
+        target = os.path.join(directory, candidate)
+        try:
+            # link() falha se o destino existe: a troca é atômica e nunca sobrescreve
+            os.link(tmp_path, target)
+            os.remove(tmp_path)
+            return candidate
+        except FileExistsError:
+            pass
+        except OSError:
+            # Sistema de arquivos sem hardlinks
+            if not os.path.exists(target):
+                os.replace(tmp_path, target)
+                return candidate
+        n += 1
+        candidate = f"{stem} ({n}){ext}"
+
+
+def _store_upload(file, playlist_dir: str) -> dict:
+    """Grava um arquivo enviado na pasta da playlist: o conteúdo vai em
+    blocos para um arquivo temporário enquanto o hash é calculado."""
+    tmp_path = os.path.join(playlist_dir, f'.upload-{uuid.uuid4().hex}.part')
+    try:
+        digest, size = save_stream_with_hash(file.stream, tmp_path, UPLOAD_HASH, settings.UPLOAD_CHUNK_SIZE)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return _ingest_upload(tmp_path, file.filename, playlist_dir, digest, size)
+
+
+def _ingest_upload(tmp_path: str, filename: str, playlist_dir: str, digest: str, size: int) -> dict:
+    """Entrega à playlist um arquivo temporário já completo (em ``playlist_dir``).
+
+    Conteúdo já presente na mesma pasta não é gravado de novo, e de outra
+    pasta vira hardlink se UPLOAD_HARDLINK_DUPLICATES; o nome final nunca
+    sobrescreve um arquivo existente."""
+    filename = sanitize_filename(os.path.basename(filename))
+    rel_dir = _library_rel_dir(playlist_dir)
+    try:
+        duplicate = _find_duplicate(digest, size, rel_dir)
+        if duplicate is not None and duplicate['dir'] == rel_dir:
+            return {'file': duplicate['name'], 'status': 'duplicate'}
+
+        linked = False
+        if duplicate is not None and settings.UPLOAD_HARDLINK_DUPLICATES:
+            link_path = f'{tmp_path}.link'
+            try:
+                os.link(os.path.join(MUSIC_DIR, duplicate['rel']), link_path)
+                os.replace(link_path, tmp_path)
+                linked = True
+            except OSError:
+                pass
+        name = _place_file(tmp_path, playlist_dir, filename)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    # Indexa já a pasta (com o hash conhecido) para o próximo upload enxergar o arquivo
+    index = _get_library_index()
+    _record_library_changes(index.refresh(dirs=[rel_dir]))
+    row = index.get(f'{rel_dir}/{name}')
+    if row is not None:
+        index.save_hash(row, digest)
+
+    # A busca da capa (Deezer) fica fora da requisição
+    path = os.path.join(playlist_dir, name)
+    _cover_queue.submit(('file', path), _ensure_cover_for_file, path)
+    result = {'file': name, 'status': 'linked' if linked else 'uploaded'}
+    if duplicate is not None:
+        result['duplicate_of'] = duplicate['rel']
+    return result
+
+
 @app.route('/upload_to_playlist', methods=['POST'])
 def upload_to_playlist():
-    """Upload de arquivos para uma playlist específica."""
+    """Upload de arquivos para uma playlist específica.
+
+    Arquivos com o mesmo nome de outro já existente recebem um sufixo em vez
+    de sobrescrevê-lo; ``files`` detalha o destino de cada arquivo enviado."""
     if 'file' not in request.files:
         return jsonify({"error": "Nenhum arquivo enviado"}), 400
     
@@ -612,9 +1893,13 @@ def upload_to_playlist():
     files = request.files.getlist('file')
     
     uploaded = []
+    details = []
     errors = []
     
-    playlist_dir = _get_playlist_folder(playlist_name)
+    try:
+        playlist_dir = _get_playlist_folder(playlist_name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     for file in files:
         if file.filename == '':
@@ -622,17 +1907,10 @@ def upload_to_playlist():
             
         if file and file.filename.lower().endswith(('.mp3', '.m4a', '.aac', '.ogg', '.opus', '.wav', '.flac', '.webm')):
             try:
-                # Salva o arquivo na pasta da playlist
-                filename = os.path.join(playlist_dir, file.filename)
-                file.save(filename)
-                uploaded.append(file.filename)
-                
-                # Tenta baixar capa
-                try:
-                    _ensure_cover_for_file(filename)
-                except Exception:
-                    pass
-                    
+                stored = _store_upload(file, playlist_dir)
+                stored['name'] = file.filename
+                details.append(stored)
+                uploaded.append(stored['file'])
             except Exception as e:
                 errors.append(f"Erro ao salvar {file.filename}: {str(e)}")
         else:
@@ -641,40 +1919,192 @@ def upload_to_playlist():
     return jsonify({
         "success": len(uploaded) > 0,
         "uploaded": uploaded,
+        "files": details,
         "errors": errors,
         "playlist": playlist_name
     })
 
 
+_resumable_uploads: Optional[ResumableUploads] = None
+_resumable_uploads_lock = threading.Lock()
+TUS_HEADERS = {'Tus-Resumable': '1.0.0'}
+
+
+def _get_resumable_uploads() -> ResumableUploads:
+    global _resumable_uploads
+    db_path = os.path.join(CACHE_DIR, settings.RESUMABLE_UPLOADS_FILE)
+    with _resumable_uploads_lock:
+        if _resumable_uploads is None or _resumable_uploads.db_path != db_path:
+            _resumable_uploads = ResumableUploads(db_path, ttl=settings.RESUMABLE_UPLOAD_TTL)
+        return _resumable_uploads
+
+
+def _upload_metadata() -> Dict[str, str]:
+    """Cabeçalho ``Upload-Metadata`` do tus ('chave base64,chave base64') mais o corpo JSON."""
+    metadata = {}
+    for pair in request.headers.get('Upload-Metadata', '').split(','):
+        key, _, value = pair.strip().partition(' ')
+        if key:
+            try:
+                metadata[key] = base64.b64decode(value).decode('utf-8') if value else ''
+            except Exception:
+                continue
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        metadata.update({k: str(v) for k, v in body.items() if v is not None})
+    return metadata
+
+
+def _upload_headers(upload: dict) -> dict:
+    return dict(TUS_HEADERS, **{
+        'Upload-Offset': str(upload['offset']),
+        'Upload-Length': str(upload['length']),
+        'Cache-Control': 'no-store',
+    })
+
+
+def _upload_status(upload: dict) -> dict:
+    return {k: v for k, v in upload.items() if k != 'path'}
+
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Cria um upload retomável (tus: creation). Tamanho em ``Upload-Length``
+    (ou ``length`` no JSON); playlist e nome do arquivo em ``Upload-Metadata``
+    (``playlist``, ``filename``) ou no JSON. Responde 201 com ``Location``."""
+    metadata = _upload_metadata()
+    filename = metadata.get('filename') or metadata.get('name') or ''
+    playlist_name = (metadata.get('playlist') or 'Geral').strip()
+    try:
+        length = int(request.headers.get('Upload-Length') or metadata.get('length') or -1)
+    except ValueError:
+        length = -1
+    if length <= 0:
+        return jsonify({"error": "Upload-Length é obrigatório"}), 400, TUS_HEADERS
+    if length > settings.RESUMABLE_UPLOAD_MAX_SIZE:
+        return jsonify({"error": "Arquivo grande demais"}), 413, TUS_HEADERS
+    if not filename.lower().endswith(('.mp3', '.m4a', '.aac', '.ogg', '.opus', '.wav', '.flac', '.webm')):
+        return jsonify({"error": f"Formato não suportado: {filename}"}), 400, TUS_HEADERS
+
+    try:
+        playlist_dir = _get_playlist_folder(playlist_name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400, TUS_HEADERS
+    upload = _get_resumable_uploads().create(playlist_name, filename, length, playlist_dir)
+    headers = _upload_headers(upload)
+    headers['Location'] = f"/uploads/{upload['id']}"
+    return jsonify(_upload_status(upload)), 201, headers
+
+
+@app.route('/uploads/<upload_id>', methods=['HEAD', 'GET'])
+def upload_status(upload_id: str):
+    """Progresso do upload: ``Upload-Offset`` é o trecho contínuo recebido desde
+    o início; ``received`` (GET) lista todos os intervalos já gravados."""
+    upload = _get_resumable_uploads().get(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload não encontrado"}), 404, TUS_HEADERS
+    return jsonify(_upload_status(upload)), 200, _upload_headers(upload)
+
+
+@app.route('/uploads/<upload_id>', methods=['PATCH'])
+def upload_chunk(upload_id: str):
+    """Recebe uma parte (application/offset+octet-stream) na posição
+    ``Upload-Offset``; partes podem chegar fora de ordem e em paralelo.
+    A parte que completa o arquivo o entrega à playlist e responde com o
+    resultado."""
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({"error": "Upload-Offset é obrigatório"}), 400, TUS_HEADERS
+    if request.content_length is not None and request.content_length > settings.RESUMABLE_UPLOAD_MAX_CHUNK:
+        return jsonify({"error": "Parte grande demais"}), 413, TUS_HEADERS
+
+    uploads = _get_resumable_uploads()
+    try:
+        upload, complete = uploads.write(upload_id, offset, request.stream, request.content_length)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status, TUS_HEADERS
+    if not complete:
+        return Response(status=204, headers=_upload_headers(upload))
+
+    playlist_dir = _get_playlist_folder(upload['playlist'])
+    try:
+        digest = generate_file_hash(upload['path'], UPLOAD_HASH, settings.UPLOAD_CHUNK_SIZE)
+        result = _ingest_upload(upload['path'], upload['filename'], playlist_dir, digest, upload['length'])
+        uploads.finish(upload_id, result)
+    except Exception as e:
+        uploads.finish(upload_id, {"error": str(e)}, failed=True)
+        return jsonify({"error": f"Erro ao salvar {upload['filename']}: {str(e)}"}), 500, TUS_HEADERS
+    upload = uploads.get(upload_id)
+    return jsonify(_upload_status(upload)), 200, _upload_headers(upload)
+
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id: str):
+    """Cancela o upload e apaga o que já foi recebido (tus: termination)."""
+    if not _get_resumable_uploads().delete(upload_id):
+        return jsonify({"error": "Upload não encontrado"}), 404, TUS_HEADERS
+    return Response(status=204, headers=TUS_HEADERS)
+
+
+_DEFAULT_COVER_SVG = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<svg xmlns="http://www.w3.org/2000/svg" width="600" height="600" viewBox="0 0 600 600">\n'
+    '<defs>\n'
+    '	<linearGradient id="g" x1="0" y1="0" x2="1" y2="1">\n'
+    '		<stop offset="0%" stop-color="#0d2d1f"/>\n'
+    '		<stop offset="100%" stop-color="#0b1f16"/>\n'
+    '	</linearGradient>\n'
+    '</defs>\n'
+    '<rect width="600" height="600" fill="url(#g)"/>\n'
+    '<g fill="none" stroke="#1db954" stroke-width="18" stroke-linecap="round" stroke-linejoin="round" opacity="0.9" transform="translate(120,120)">\n'
+    '	<path d="M180 12v240c0 44-36 80-80 80s-80-36-80-80 36-80 80-80c16 0 31 5 44 13V52l136-28v152c0 44-36 80-80 80-11 0-22-2-32-7"/>\n'
+    '</g>\n'
+    '<g font-family="Segoe UI, Roboto, Arial" font-size="38" font-weight="600" fill="#cfe9d9" opacity="0.9">\n'
+    '	<text x="50%" y="560" text-anchor="middle">Musickêra</text>\n'
+    '</g>\n'
+    '</svg>'
+).encode('utf-8')
+_DEFAULT_COVER_ETAG = hashlib.sha1(_DEFAULT_COVER_SVG).hexdigest()
+
+
 @app.route('/musics/default-cover.jpg')
 def serve_default_cover():
-	"""Serve a visible SVG default cover to avoid 404s and show a clear placeholder."""
-	try:
-		svg = (
-			'<?xml version="1.0" encoding="UTF-8"?>\n'
-			'<svg xmlns="http://www.w3.org/2000/svg" width="600" height="600" viewBox="0 0 600 600">\n'
-			'<defs>\n'
-			'	<linearGradient id="g" x1="0" y1="0" x2="1" y2="1">\n'
-			'		<stop offset="0%" stop-color="#0d2d1f"/>\n'
-			'		<stop offset="100%" stop-color="#0b1f16"/>\n'
-			'	</linearGradient>\n'
-			'</defs>\n'
-			'<rect width="600" height="600" fill="url(#g)"/>\n'
-			'<g fill="none" stroke="#1db954" stroke-width="18" stroke-linecap="round" stroke-linejoin="round" opacity="0.9" transform="translate(120,120)">\n'
-			'	<path d="M180 12v240c0 44-36 80-80 80s-80-36-80-80 36-80 80-80c16 0 31 5 44 13V52l136-28v152c0 44-36 80-80 80-11 0-22-2-32-7"/>\n'
-			'</g>\n'
-			'<g font-family="Segoe UI, Roboto, Arial" font-size="38" font-weight="600" fill="#cfe9d9" opacity="0.9">\n'
-			'	<text x="50%" y="560" text-anchor="middle">Musickêra</text>\n'
-			'</g>\n'
-			'</svg>'
-		)
-		return Response(svg, mimetype='image/svg+xml')
-	except Exception:
-		return Response(b'', mimetype='image/svg+xml')
+	"""Serve a visible SVG default cover to avoid 404s and show a clear placeholder.
+	The SVG is built once; clients cache it and revalidate with its ETag."""
+	response = Response(_DEFAULT_COVER_SVG, mimetype='image/svg+xml')
+	response.set_etag(_DEFAULT_COVER_ETAG)
+	response.headers['Cache-Control'] = settings.COVER_CACHE_CONTROL
+	return response.make_conditional(request)
 
 @app.route('/musics/<path:filename>')
 def serve_music(filename: str):
-    return send_from_directory(MUSIC_DIR, filename)
+    """Serve áudio e capas com Range/206 (inclusive vários intervalos),
+    revalidação por ETag/Last-Modified e Cache-Control; atrás de um proxy
+    configurado, delega o envio (X-Accel-Redirect/X-Sendfile)."""
+    path = safe_join(MUSIC_DIR, filename)
+    if path is None:
+        abort(404)
+    if filename.startswith('covers/thumbs/'):
+        cache_control, kind = settings.THUMBNAIL_CACHE_CONTROL, 'thumbnail'
+    elif filename.startswith('covers/'):
+        cache_control, kind = settings.COVER_CACHE_CONTROL, 'cover'
+    else:
+        cache_control, kind = settings.AUDIO_CACHE_CONTROL, 'audio'
+    accel_redirect = None
+    if settings.MEDIA_ACCEL_REDIRECT:
+        accel_redirect = settings.MEDIA_ACCEL_REDIRECT.rstrip('/') + '/' + quote(filename)
+    response = send_media_file(
+        request.environ,
+        path,
+        cache_control=cache_control,
+        accel_redirect=accel_redirect,
+        sendfile_header=settings.MEDIA_SENDFILE_HEADER or None,
+    )
+    # Respostas delegadas ao proxy não têm Content-Length: o corpo não sai daqui
+    if response.content_length and request.method != 'HEAD':
+        SERVED_BYTES.labels(kind).inc(response.content_length)
+    return response
 
 
 @app.route('/extract_playlist_name', methods=['POST'])
@@ -699,32 +2129,199 @@ def extract_playlist_name():
         return jsonify({"error": f"Erro ao extrair nome da playlist: {str(e)}"}), 500
 
 
+_download_jobs: Optional[DownloadJobs] = None
+_download_jobs_lock = threading.Lock()
+
+
+def _run_download_job(job: dict, progress, cancelled) -> dict:
+    options = job.get('options') or {}
+    return _download_youtube_playlist(job['url'], job['playlist'], job['id'],
+                                      on_progress=progress, should_cancel=cancelled,
+                                      sync=bool(options.get('sync')), prune=bool(options.get('prune')))
+
+
+def _get_download_jobs() -> DownloadJobs:
+    """Fila persistente de downloads; ao ser criada, retoma os jobs interrompidos."""
+    global _download_jobs
+    db_path = os.path.join(CACHE_DIR, settings.DOWNLOAD_JOBS_FILE)
+    with _download_jobs_lock:
+        if _download_jobs is None or _download_jobs.db_path != db_path:
+            _download_jobs = DownloadJobs(
+                db_path,
+                _run_download_job,
+                workers=settings.DOWNLOAD_WORKERS,
+                keep=settings.DOWNLOAD_JOBS_KEEP,
+                lease=settings.DOWNLOAD_JOB_LEASE,
+            )
+        return _download_jobs
+
+
+def _download_job_samples() -> Dict[tuple, int]:
+    # Só consulta a fila se este processo já a abriu (abrir retoma jobs)
+    if _download_jobs is None:
+        return {}
+    return {(status,): count for status, count in _download_jobs.active_counts().items()}
+
+
+DOWNLOAD_JOBS.set_function(_download_job_samples)
+
+
+_playlist_archive: Optional[PlaylistArchive] = None
+_sync_scheduler: Optional[SyncScheduler] = None
+_playlist_sync_lock = threading.Lock()
+
+
+def _get_playlist_archive() -> PlaylistArchive:
+    global _playlist_archive
+    db_path = os.path.join(CACHE_DIR, settings.PLAYLIST_SYNC_FILE)
+    with _playlist_sync_lock:
+        if _playlist_archive is None or _playlist_archive.db_path != db_path:
+            _playlist_archive = PlaylistArchive(db_path)
+        return _playlist_archive
+
+
+def _submit_sync(item: dict) -> None:
+    _get_download_jobs().submit(item['url'], item['playlist'], {'sync': True, 'prune': item['prune']})
+
+
+def _ensure_sync_scheduler() -> None:
+    """Inicia (uma vez) o agendador que sincroniza as playlists seguidas."""
+    global _sync_scheduler
+    archive = _get_playlist_archive()
+    with _playlist_sync_lock:
+        if _sync_scheduler is not None and _sync_scheduler.is_alive() and _sync_scheduler.archive is archive:
+            return
+        if _sync_scheduler is not None:
+            _sync_scheduler.stop()
+        _sync_scheduler = SyncScheduler(archive, _submit_sync, settings.PLAYLIST_SYNC_CHECK_INTERVAL)
+        _sync_scheduler.start()
+
+
+_background_started = False
+
+
+@app.before_request
+def _start_background_services() -> None:
+    """Na primeira requisição de cada processo (também sob gunicorn/WSGI, onde
+    o bloco __main__ não roda): retoma os downloads interrompidos e inicia o
+    agendador de sincronização. Jobs com lease em dia em outro worker e
+    sincronizações já agendadas por outro processo não são repetidos."""
+    global _background_started
+    if _background_started or not settings.BACKGROUND_SERVICES:
+        return
+    with _playlist_sync_lock:
+        if _background_started:
+            return
+        _background_started = True
+    try:
+        _get_download_jobs()
+        _ensure_sync_scheduler()
+    except Exception as e:
+        print(f"❌ Erro ao iniciar downloads/sincronização em segundo plano: {e}")
+
+
+@app.route('/download_status/<job_id>', methods=['GET'])
+def download_status(job_id: str):
+    """Estado de um job de download (queued, running, done, failed ou cancelled);
+    em execução inclui ``progress`` com o arquivo atual e os bytes baixados."""
+    job = _get_download_jobs().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    return jsonify(job)
+
+
+@app.route('/cancel_download/<job_id>', methods=['POST'])
+def cancel_download(job_id: str):
+    job = _get_download_jobs().cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    return jsonify(job)
+
+
 @app.route('/download_playlist', methods=['POST'])
 def download_playlist():
     data = request.get_json(silent=True) or {}
     url = data.get('url', '').strip()
     playlist_name = data.get('playlist', 'Playlist').strip()
     background = bool(data.get('background', False))
+    # follow: registra a playlist para sincronizações periódicas (implica sync)
+    follow = bool(data.get('follow', False))
+    sync = follow or bool(data.get('sync', False))
+    prune = sync and bool(data.get('prune', False))
     if not url:
         return jsonify({"success": False, "error": "URL é obrigatória."}), 400
     if not (url.startswith('http://') or url.startswith('https://')):
         return jsonify({"success": False, "error": "URL inválida. Cole um link completo começando com http(s)://"}), 400
 
-    if background:
-        result_container = {"result": None}
+    # Todo download passa pela fila (limite de downloads simultâneos); o mesmo
+    # pedido repetido enquanto o job está ativo reaproveita o job existente
+    canonical = canonical_media_url(url)
+    if follow:
+        try:
+            interval = float(data.get('interval') or settings.PLAYLIST_SYNC_INTERVAL)
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "Intervalo inválido."}), 400
+        archive = _get_playlist_archive()
+        archive.follow(playlist_name, canonical, max(interval, settings.PLAYLIST_SYNC_CHECK_INTERVAL), prune)
+        # Esta sincronização conta como a primeira do agendador
+        archive.mark_synced(playlist_name, time.time())
+        _ensure_sync_scheduler()
+    jobs = _get_download_jobs()
+    options = {'sync': True, 'prune': prune} if sync else None
+    job, created = jobs.submit(canonical, playlist_name, options)
+    if not background:
+        job = jobs.wait(job['id'], timeout=settings.DOWNLOAD_TIMEOUT)
+    
+    if job['status'] in ACTIVE_STATUSES:
+        return jsonify({
+            "success": True,
+            "message": "Download iniciado em segundo plano." if created else "Download já estava em andamento.",
+            "job_id": job['id'],
+            "download_id": job['id'],
+            "status": job['status'],
+            "coalesced": not created
+        }), 202
+    
+    result = dict(job['result'] or {"success": False, "error": job['error'] or "Falha no download"})
+    result['job_id'] = job['id']
+    result['status'] = job['status']
+    status = 200 if result.get('success') else 500
+    return jsonify(result), status
+
 
-        def task():
-            result_container["result"] = _download_youtube_playlist(url, playlist_name)
+@app.route('/followed_playlists', methods=['GET'])
+def followed_playlists():
+    """Playlists seguidas, com URL, intervalo (segundos) e última sincronização."""
+    return jsonify({"playlists": _get_playlist_archive().followed()})
 
-        threading.Thread(target=task, daemon=True).start()
-        return jsonify({"success": True, "message": "Download iniciado em segundo plano."}), 202
 
-    result = _download_youtube_playlist(url, playlist_name)
-    status = 200 if result.get('success') else 500
-    return jsonify(result), status
+@app.route('/unfollow_playlist', methods=['POST'])
+def unfollow_playlist():
+    data = request.get_json(silent=True) or {}
+    playlist_name = (data.get('playlist') or '').strip()
+    if not playlist_name:
+        return jsonify({"success": False, "error": "Nome da playlist é obrigatório."}), 400
+    if not _get_playlist_archive().unfollow(playlist_name):
+        return jsonify({"success": False, "error": "Playlist não é seguida."}), 404
+    return jsonify({"success": True, "playlist": playlist_name})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métricas no formato de texto do Prometheus.
+
+    Os valores são do processo que atendeu; com vários workers, colete cada
+    um separadamente ou use um único worker."""
+    if not settings.METRICS_ENABLED:
+        abort(404)
+    return Response(render_metrics(metrics), content_type=METRICS_CONTENT_TYPE)
 
 
 if __name__ == '__main__':
+    # Retoma os downloads que estavam na fila quando o servidor parou e
+    # volta a sincronizar as playlists seguidas
+    _get_download_jobs()
+    _ensure_sync_scheduler()
     port = int(os.environ.get('PORT', '5000'))
     app.run(host='0.0.0.0', port=port, debug=False)
 
@@ -0,0 +1,90 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import build_catalog
+import server
+from utils import catalog as catalog_module
+from utils.catalog import load_catalog, write_catalog
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api')
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    music_dir = tmp_path / 'musics'
+    (music_dir / 'Rock BR').mkdir(parents=True)
+    (music_dir / 'covers').mkdir()
+    (music_dir / 'Rock BR' / 'Titãs - Epitáfio.mp3').write_bytes(b'x')
+    (music_dir / 'Jota Quest - Só Hoje (Acústico).m4a').write_bytes(b'y')
+    (music_dir / 'covers' / 'Rock_BR.jpg').write_bytes(b'jpg')
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(music_dir))
+    monkeypatch.setattr(server, 'COVERS_DIR', str(music_dir / 'covers'))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    return tmp_path
+
+
+def test_snapshot_round_trip_keeps_tracks_playlists_and_search(library):
+    catalog = build_catalog.build(server)
+    path = str(library / 'catalog.json')
+    write_catalog(catalog, path)
+
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    assert data['version'] == 1
+    assert [t['title'] for t in data['tracks']] == ['Só Hoje (Acústico)', 'Epitáfio']
+    assert [(p['name'], p['cover']) for p in data['playlists']] == [
+        ('Geral', server.DEFAULT_COVER), ('Rock BR', '/musics/covers/Rock_BR.jpg')]
+
+    loaded = load_catalog(path)
+    assert [music['filename'] for _, _, music in loaded.search.search('epitafio')] == ['Titãs - Epitáfio.mp3']
+    assert [music['artist'] for _, _, music in loaded.search.search('acustico')] == ['Jota Quest']
+
+
+def test_serverless_handler_serves_the_snapshot(library):
+    catalog = build_catalog.build(server)
+    path = str(library / 'catalog.json')
+    write_catalog(catalog, path)
+
+    script = (
+        "import json, index\n"
+        "client = index.app.test_client()\n"
+        "print(json.dumps([client.get('/api/musics').get_json()['total'],\n"
+        "                  client.get('/api/search?q=titas').get_json()['results'][0]['title'],\n"
+        "                  client.get('/api/playlist').get_json()['playlists'][1]['musics']]))\n"
+    )
+    env = dict(os.environ, CATALOG_PATH=path)
+    out = subprocess.run([sys.executable, '-c', script], cwd=API_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    assert json.loads(out.strip().splitlines()[-1]) == [2, 'Epitáfio', [2]]
+
+
+def test_stale_msgpack_snapshot_is_not_preferred(library, monkeypatch):
+    json_path = str(library / 'catalog.json')
+    msgpack_path = str(library / 'catalog.msgpack')
+    with open(msgpack_path, 'wb') as f:
+        f.write(b'binario')
+
+    class FakeMsgpack:
+        @staticmethod
+        def unpackb(data, **kwargs):
+            return {'version': 1, 'tracks': [], 'playlists': [], 'generated': 1}
+
+    monkeypatch.setattr(catalog_module, '_msgpack', lambda: FakeMsgpack)
+    os.utime(msgpack_path, ns=(1, 1))
+    # Gerado depois, sem --msgpack: o JSON novo vale mais que o binário antigo
+    write_catalog(build_catalog.build(server), json_path)
+    assert len(load_catalog(json_path, msgpack_path).tracks) == 2
+
+    os.utime(msgpack_path)
+    assert load_catalog(json_path, msgpack_path).tracks == []
+
+
+def test_api_bundles_its_own_copy_of_the_catalog_reader():
+    # O api/ é publicado sozinho: a cópia em api/utils/ deve acompanhar utils/
+    assert build_catalog.stale_api_modules() == [], "rode python build_catalog.py para atualizar api/utils/"
+    with open(os.path.join(API_DIR, 'requirements.txt'), encoding='utf-8') as f:
+        assert any(line.lower().startswith('msgpack') for line in f)
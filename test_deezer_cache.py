@@ -0,0 +1,70 @@
+from utils.deezer_cache import DeezerCache, normalize_query
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(tmp_path, clock, max_entries=100):
+    return DeezerCache(str(tmp_path / 'deezer.sqlite3'), hit_ttl=100, miss_ttl=10,
+                       max_entries=max_entries, clock=clock)
+
+
+def test_hits_and_negative_results_expire_with_their_own_ttl(tmp_path):
+    clock = _Clock()
+    cache = _cache(tmp_path, clock)
+    key = normalize_query('Epitáfio  Titãs')
+    assert key == normalize_query('epitafio titas')
+    cache.set(key, {'id': 1})
+    cache.set('desconhecida', None)
+
+    assert cache.get(key) == (True, {'id': 1})
+    # Resultado negativo encontrado: (True, None), diferente de "não está no cache"
+    assert cache.get('desconhecida') == (True, None)
+    assert cache.get('nunca vista') == (False, None)
+
+    clock.now += 11
+    assert cache.get('desconhecida') == (False, None)
+    assert cache.get(key) == (True, {'id': 1})
+    clock.now += 90
+    assert cache.get(key) == (False, None)
+    assert cache.stats() == {'entries': 2, 'hits': 2, 'negative_hits': 1, 'misses': 3, 'evictions': 0}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    clock = _Clock()
+    cache = _cache(tmp_path, clock, max_entries=4)
+    for i in range(4):
+        clock.now += 1
+        cache.set(f'k{i}', {'id': i})
+    clock.now += 1
+    assert cache.get('k0')[0]
+
+    # Passa do limite: sobram 90% (3 entradas), as menos usadas saem
+    clock.now += 1
+    cache.set('k4', {'id': 4})
+    assert [cache.get(f'k{i}')[0] for i in range(5)] == [True, False, False, True, True]
+    assert cache.stats()['entries'] == 3
+    assert cache.stats()['evictions'] == 2
+    cache.close()
+
+    # O total de entradas sobrevive à reabertura
+    assert _cache(tmp_path, clock, max_entries=4).stats()['entries'] == 3
+
+
+def test_expired_entries_are_evicted_first(tmp_path):
+    clock = _Clock()
+    cache = _cache(tmp_path, clock, max_entries=4)
+    cache.set('negativa 1', None)
+    cache.set('negativa 2', None)
+    cache.set('a', {'id': 'a'})
+    cache.set('b', {'id': 'b'})
+    clock.now += 11
+    cache.set('c', {'id': 'c'})
+    assert [cache.get(key)[0] for key in ('negativa 1', 'negativa 2', 'a', 'b', 'c')] == [
+        False, False, True, True, True]
+    assert cache.stats()['evictions'] == 2
@@ -0,0 +1,110 @@
+import pytest
+import requests
+
+from utils.deezer_client import DeezerClient, DeezerError, TokenBucket, parse_rate
+
+
+class _Clock:
+    """Relógio falso: ``sleep`` só avança o tempo."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class _Response:
+    def __init__(self, status_code=200, data=None):
+        self.status_code = status_code
+        self._data = data if data is not None else {}
+        self.content = b''
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'HTTP {self.status_code}')
+
+
+class _Session:
+    """Devolve as respostas (ou exceções) na ordem e conta as chamadas."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _client(clock, *outcomes, **kwargs):
+    client = DeezerClient(base_url='http://deezer.test', clock=clock, sleep=clock.sleep, **kwargs)
+    client.session = _Session(*outcomes)
+    return client
+
+
+def test_parse_rate():
+    assert parse_rate('50 per 5 seconds') == (50, 5.0)
+    assert parse_rate('100 per minute') == (100, 60.0)
+    with pytest.raises(ValueError):
+        parse_rate('50 a cada 5s')
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    clock = _Clock()
+    bucket = TokenBucket(rate=4, capacity=3, clock=clock, sleep=clock.sleep)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == 0.25
+    assert clock.now == 0.25
+    clock.now += 10
+    # Parado por muito tempo: acumula só até a capacidade
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == 0.25
+
+
+def test_rate_is_shared_between_processes():
+    clock = _Clock()
+    client = _client(clock, *[_Response(data={'ok': i}) for i in range(6)], rate='8 per 1 second', processes=2)
+    for _ in range(6):
+        client.get_json('/search')
+    # 4 de rajada (metade da cota) e depois 4 por segundo
+    assert clock.now == 0.5
+
+
+def test_429_and_server_errors_are_retried_with_backoff():
+    clock = _Clock()
+    client = _client(clock, _Response(429), requests.ConnectionError('reset'), _Response(503),
+                     _Response(data={'id': 1}), retries=3, backoff=0.5)
+    assert client.get_json('/track/1') == {'id': 1}
+    assert client.session.calls == 4
+    assert len(clock.sleeps) == 3
+    assert all(0 <= delay <= 0.5 * 2 ** attempt for attempt, delay in enumerate(clock.sleeps))
+
+
+def test_quota_error_is_retried_until_attempts_run_out():
+    clock = _Clock()
+    quota = {'error': {'type': 'Exception', 'message': 'Quota limit exceeded', 'code': 4}}
+    client = _client(clock, *[_Response(data=quota) for _ in range(3)], retries=2)
+    with pytest.raises(requests.RequestException):
+        client.get_json('/search')
+    assert client.session.calls == 3
+
+
+def test_other_api_errors_are_not_retried():
+    clock = _Clock()
+    client = _client(clock, _Response(data={'error': {'code': 800, 'message': 'no data'}}), retries=3)
+    with pytest.raises(DeezerError):
+        client.get_json('/album/0')
+    assert client.session.calls == 1
+    assert clock.sleeps == []
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import threading
+import time
+
+from utils.download_jobs import DownloadJobs
+
+
+def test_jobs_run_coalesce_and_report_result(tmp_path):
+    release = threading.Event()
+    calls = []
+
+    def run(job, progress, cancelled):
+        calls.append(job['url'])
+        progress(file='a.m4a', downloaded_bytes=10)
+        release.wait(5)
+        return {'success': True, 'downloaded': ['a.m4a']}
+
+    jobs = DownloadJobs(str(tmp_path / 'jobs.sqlite3'), run, workers=1)
+    job, created = jobs.submit('https://youtu.be/x', 'Rock')
+    again, created_again = jobs.submit('https://youtu.be/x', 'Rock')
+    assert created and not created_again and again['id'] == job['id']
+
+    release.set()
+    done = jobs.wait(job['id'], timeout=5)
+    assert done['status'] == 'done'
+    assert done['result']['downloaded'] == ['a.m4a']
+    assert calls == ['https://youtu.be/x']
+
+
+def test_cancel_queued_and_running_jobs(tmp_path):
+    started = threading.Event()
+
+    def run(job, progress, cancelled):
+        started.set()
+        while not cancelled():
+            threading.Event().wait(0.01)
+        return {'success': False, 'error': 'Download cancelado'}
+
+    jobs = DownloadJobs(str(tmp_path / 'jobs.sqlite3'), run, workers=1)
+    running, _ = jobs.submit('https://youtu.be/a', None)
+    queued, _ = jobs.submit('https://youtu.be/b', None)
+    assert started.wait(5)
+
+    assert jobs.cancel(queued['id'])['status'] == 'cancelled'
+    jobs.cancel(running['id'])
+    assert jobs.wait(running['id'], timeout=5)['status'] == 'cancelled'
+    assert jobs.cancel('nao-existe') is None
+
+
+def test_interrupted_jobs_resume_after_restart(tmp_path):
+    db_path = str(tmp_path / 'jobs.sqlite3')
+    started = threading.Event()
+    blocker = threading.Event()
+
+    def interrupted(job, progress, cancelled):
+        started.set()
+        blocker.wait(5)
+        return {'success': True}
+
+    first = DownloadJobs(db_path, interrupted, workers=1)
+    job, _ = first.submit('https://youtu.be/x', 'Rock')
+    assert started.wait(5)
+
+    # Novo processo: o job "em execução" do anterior volta para a fila e roda de novo
+    second = DownloadJobs(db_path, lambda job, progress, cancelled: {'success': True, 'resumed': True}, workers=1)
+    assert second.wait(job['id'], timeout=5)['result'] == {'success': True, 'resumed': True}
+    blocker.set()
+
+
+def test_jobs_of_another_live_process_are_not_taken_over(tmp_path):
+    db_path = str(tmp_path / 'jobs.sqlite3')
+    jobs = DownloadJobs(db_path, lambda job, progress, cancelled: {'success': True}, workers=1)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    # Job "em execução" em outro worker (lease em dia) e em um que parou de renovar
+    conn.execute("INSERT INTO jobs (id, url, status, created, owner, heartbeat) VALUES ('vivo', 'u1', 'running', 0, ?, ?)",
+                 (f'{os.getppid()}:abc', time.time()))
+    conn.execute("INSERT INTO jobs (id, url, status, created, owner, heartbeat) "
+                 "VALUES ('orfao', 'u2', 'running', 0, '999999999:abc', ?)", (time.time() - 3600,))
+    jobs.close()
+
+    other = DownloadJobs(db_path, lambda job, progress, cancelled: {'success': True}, workers=1)
+    assert other.wait('orfao', timeout=5)['status'] == 'done'
+    assert other.get('vivo')['status'] == 'running'
+    assert other.active_counts() == {'queued': 0, 'running': 1}
+
+
+def test_cancel_and_finish_done_by_another_worker_are_seen(tmp_path):
+    db_path = str(tmp_path / 'jobs.sqlite3')
+    started = threading.Event()
+
+    def run(job, progress, cancelled):
+        started.set()
+        deadline = time.monotonic() + 5
+        while not cancelled() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return {'success': False, 'error': 'Download cancelado'}
+
+    jobs = DownloadJobs(db_path, run, workers=1)
+    job, _ = jobs.submit('https://youtu.be/a', None)
+    assert started.wait(5)
+    # Outro worker atende o cancelamento: só o banco muda
+    other = sqlite3.connect(db_path, isolation_level=None)
+    other.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ?', (job['id'],))
+    assert jobs.wait(job['id'], timeout=5)['status'] == 'cancelled'
+
+    # Job de outro worker terminado por ele: quem espera aqui não depende de aviso local
+    other.execute("INSERT INTO jobs (id, url, status, created, owner, heartbeat) VALUES ('remoto', 'u', 'running', 0, ?, ?)",
+                  (f'{os.getppid()}:abc', time.time()))
+    threading.Timer(0.2, lambda: sqlite3.connect(db_path, isolation_level=None).execute(
+        "UPDATE jobs SET status = 'done' WHERE id = 'remoto'")).start()
+    started_wait = time.monotonic()
+    assert jobs.wait('remoto', timeout=10)['status'] == 'done'
+    assert time.monotonic() - started_wait < 5
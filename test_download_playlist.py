@@ -0,0 +1,173 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+
+import server
+from utils import download_jobs
+from utils.media_info import InfoCache
+from utils.playlist_sync import PlaylistArchive, SyncScheduler
+
+
+class FakeYoutubeDL:
+    """Imita o yt-dlp: expande a playlist e 'baixa' criando o arquivo."""
+
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+    video_ids = [f'v{i}' for i in range(6)]
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=False):
+        assert self.opts.get('extract_flat') == 'in_playlist'
+        return {
+            '_type': 'playlist',
+            'title': 'Mix',
+            'entries': [{'id': v, 'title': f'Song {v}', 'url': f'https://youtu.be/{v}'} for v in self.video_ids],
+        }
+
+    def download(self, urls):
+        (url,) = urls
+        with FakeYoutubeDL.lock:
+            FakeYoutubeDL.active += 1
+            FakeYoutubeDL.peak = max(FakeYoutubeDL.peak, FakeYoutubeDL.active)
+        try:
+            time.sleep(0.05)
+            if url.endswith('v3'):
+                raise RuntimeError('Video unavailable')
+            path = self.opts['outtmpl'].replace('%(title)s', url[-2:]).replace('%(ext)s', 'm4a')
+            with open(path, 'wb') as f:
+                f.write(b'x')
+            for hook in self.opts['progress_hooks']:
+                hook({'status': 'finished', 'filename': path})
+        finally:
+            with FakeYoutubeDL.lock:
+                FakeYoutubeDL.active -= 1
+        return 0
+
+
+@pytest.fixture
+def fake_ydl(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'YoutubeDL', FakeYoutubeDL)
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(tmp_path / 'musics'))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(server, '_ensure_cover_for_file', lambda path: None)
+    monkeypatch.setattr(server.settings, 'DOWNLOAD_ENTRY_WORKERS', 3)
+    monkeypatch.setattr(server, '_media_info_cache', InfoCache(ttl=60))
+    FakeYoutubeDL.peak = 0
+    return tmp_path / 'musics'
+
+
+def test_entries_download_in_parallel_and_errors_are_per_entry(fake_ydl):
+    result = server._download_youtube_playlist('https://youtube.com/playlist?list=x', 'Mix')
+
+    assert result['success'] and result['partial']
+    assert result['failed_count'] == 1
+    assert sorted(os.listdir(fake_ydl / 'Mix')) == ['v0.m4a', 'v1.m4a', 'v2.m4a', 'v4.m4a', 'v5.m4a']
+    failed = [entry for entry in result['entries'] if entry['status'] == 'failed']
+    assert [entry['id'] for entry in failed] == ['v3']
+    assert 'Video unavailable' in failed[0]['error']
+    assert FakeYoutubeDL.peak == 3
+
+
+def test_playlist_is_expanded_once_per_job(fake_ydl, monkeypatch):
+    calls = []
+    extract_info = FakeYoutubeDL.extract_info
+
+    def counting(self, url, download=False):
+        calls.append(url)
+        return extract_info(self, url, download)
+
+    monkeypatch.setattr(FakeYoutubeDL, 'extract_info', counting)
+    url = 'https://www.youtube.com/watch?v=v0&list=PLx&si=abc'
+
+    assert server._extract_playlist_name_from_url(url) == 'Mix'
+    server._download_youtube_playlist(url)
+    assert calls == ['https://www.youtube.com/playlist?list=PLx']
+
+
+def test_sync_downloads_only_new_entries_and_prunes_removed(fake_ydl, monkeypatch):
+    url = 'https://youtube.com/playlist?list=x'
+    monkeypatch.setattr(FakeYoutubeDL, 'video_ids', ['v0', 'v1', 'v2'])
+    first = server._download_youtube_playlist(url, 'Mix')
+    assert sorted(first['downloaded']) == ['v0.m4a', 'v1.m4a', 'v2.m4a']
+
+    # v1 saiu da playlist e v4 entrou; o cache da expansão é ignorado na sincronização
+    monkeypatch.setattr(FakeYoutubeDL, 'video_ids', ['v0', 'v2', 'v4'])
+    synced = server._download_youtube_playlist(url, 'Mix', sync=True, prune=True)
+    assert synced['success'] and not synced['partial']
+    assert synced['downloaded'] == ['v4.m4a']
+    assert synced['skipped'] == 2
+    assert synced['pruned'] == ['v1.m4a']
+    assert sorted(os.listdir(fake_ydl / 'Mix')) == ['v0.m4a', 'v2.m4a', 'v4.m4a']
+
+    # Nada novo: sincronização sem downloads ainda é sucesso
+    again = server._download_youtube_playlist(url, 'Mix', sync=True)
+    assert again['success'] and again['downloaded'] == [] and again['skipped'] == 3
+
+
+def test_prune_keeps_a_file_still_used_by_another_video(fake_ydl, monkeypatch):
+    url = 'https://youtube.com/playlist?list=x'
+    # Títulos que viram o mesmo nome de arquivo ('a1.m4a')
+    monkeypatch.setattr(FakeYoutubeDL, 'video_ids', ['xa1', 'ya1'])
+    server._download_youtube_playlist(url, 'Mix')
+
+    monkeypatch.setattr(FakeYoutubeDL, 'video_ids', ['ya1'])
+    synced = server._download_youtube_playlist(url, 'Mix', sync=True, prune=True)
+    assert synced['pruned'] == []
+    assert os.listdir(fake_ydl / 'Mix') == ['a1.m4a']
+
+
+def test_due_sync_is_scheduled_by_a_single_process(tmp_path):
+    db_path = str(tmp_path / 'sync.sqlite3')
+    PlaylistArchive(db_path).follow('Mix', 'https://youtube.com/playlist?list=x', 60, prune=False)
+    submitted = []
+    # Dois workers com o próprio agendador sobre o mesmo banco
+    for _ in range(2):
+        SyncScheduler(PlaylistArchive(db_path), submitted.append).run_due()
+    assert [item['playlist'] for item in submitted] == ['Mix']
+
+
+def test_first_request_resumes_interrupted_downloads(tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    conn = sqlite3.connect(str(cache_dir / server.settings.DOWNLOAD_JOBS_FILE), isolation_level=None)
+    conn.executescript(download_jobs.SCHEMA)
+    conn.execute("INSERT INTO jobs (id, url, status, created) VALUES ('parado', 'https://youtu.be/x', 'queued', 0)")
+    monkeypatch.setattr(server, 'CACHE_DIR', str(cache_dir))
+    monkeypatch.setattr(server, '_background_started', False)
+    monkeypatch.setattr(server, '_run_download_job', lambda job, progress, cancelled: {'success': True})
+
+    assert server.app.test_client().get('/followed_playlists').status_code == 200
+    assert server._get_download_jobs().wait('parado', timeout=5)['status'] == 'done'
+
+
+def test_cancel_from_progress_hook_without_yt_dlp_utils(fake_ydl, monkeypatch):
+    # yt_dlp.utils indisponível: o hook usa a exceção local em vez de None
+    monkeypatch.setattr(server, 'DownloadCancelled', None)
+    monkeypatch.setitem(sys.modules, 'yt_dlp.utils', None)
+    cancel = threading.Event()
+
+    class CancellingYoutubeDL(FakeYoutubeDL):
+        def download(self, urls):
+            cancel.set()
+            for hook in self.opts['progress_hooks']:
+                hook({'status': 'downloading', 'filename': 'x.m4a'})
+            return 0
+
+    monkeypatch.setattr(server, 'YoutubeDL', CancellingYoutubeDL)
+    result = server._download_youtube_playlist('https://youtube.com/playlist?list=x', 'Mix',
+                                               should_cancel=cancel.is_set)
+    assert server.DownloadCancelled is None
+    assert {entry['status'] for entry in result['entries']} == {'cancelled'}
@@ -0,0 +1,32 @@
+import mutagen
+
+import server
+from benchmarks.library import DeezerStub, benchmark_library, generate_library, wait_idle
+
+
+def test_synthetic_library_runs_every_scenario_against_the_deezer_stub(tmp_path, monkeypatch):
+    music_dir = tmp_path / 'musics'
+    library = generate_library(str(music_dir), 40, playlists=3, untagged_ratio=0.2, seed=1)
+    assert library['playlists'] == 3 and library['untagged'] > 0
+
+    tagged = [p for p in music_dir.rglob('* - *.m*') if p.parent.name != 'covers']
+    assert {p.suffix for p in tagged} == {'.mp3', '.m4a'}
+    for path in tagged[:4]:
+        tags = mutagen.File(str(path), easy=True)
+        assert tags['artist'][0] and tags['title'][0] in path.stem
+
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(music_dir))
+    monkeypatch.setattr(server, 'COVERS_DIR', str(music_dir / 'covers'))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(server, '_deezer_client', None)
+    monkeypatch.setattr(server.settings, 'LIBRARY_WATCHER', 'off')
+    with DeezerStub() as stub:
+        monkeypatch.setattr(server.settings, 'DEEZER_API_URL', stub.url)
+        results = benchmark_library(server.app.test_client(), repeat=2, journal=server._library_journal,
+                                    settle=lambda: wait_idle(server._cover_queue))
+        assert stub.requests > 0
+
+    assert all(result['status'] == 200 for result in results.values())
+    assert results['list_music_metadata']['items'] == 40
+    assert results['list_music_metadata']['metadata_pending'] == 0
+    assert results['list_playlists']['p50_ms'] <= results['list_playlists']['max_ms']
@@ -0,0 +1,130 @@
+import json
+import os
+
+import pytest
+
+import server
+from utils.library_watcher import ChangeJournal
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    music_dir = tmp_path / 'musics'
+    (music_dir / 'Rock').mkdir(parents=True)
+    (music_dir / 'covers').mkdir()
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(music_dir))
+    monkeypatch.setattr(server, 'COVERS_DIR', str(music_dir / 'covers'))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(server.settings, 'LIBRARY_WATCHER', 'off')
+    return server.app.test_client(), music_dir
+
+
+@pytest.fixture
+def journal(monkeypatch):
+    """Jornais próprios e pequenos, para poder descartar eventos no teste."""
+    library = ChangeJournal(maxlen=4)
+    monkeypatch.setattr(server, '_library_journal', library)
+    monkeypatch.setattr(server, '_download_journal', ChangeJournal(maxlen=4, condition=library.condition))
+    monkeypatch.setattr(server.settings, 'EVENTS_HEARTBEAT', 0.05)
+    return library
+
+
+def _frames(response):
+    """Lê os frames SSE da resposta em streaming: {'id', 'event', 'data'} ou 'keep-alive'."""
+    for chunk in response.response:
+        text = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+        if text.startswith(':'):
+            yield 'keep-alive'
+            continue
+        frame = {}
+        for line in text.strip().split('\n'):
+            field, _, value = line.partition(': ')
+            frame[field] = json.loads(value) if field == 'data' else value
+        if 'event' in frame:
+            yield frame
+
+
+def test_legacy_change_polling_reports_renames(client, journal):
+    client, music_dir = client
+    (music_dir / 'Rock' / 'a.mp3').write_bytes(b'x' * 10)
+    assert client.get('/check_music_changes?last_check=0').status_code == 200
+
+    (music_dir / 'Rock' / 'a.mp3').rename(music_dir / 'Rock' / 'b.mp3')
+    response = client.get('/check_music_changes?playlist=Rock&last_check=0')
+    assert response.status_code == 200
+    changes = {change['path']: change['action'] for change in response.json['changes']}
+    assert changes == {'/musics/Rock/a.mp3': 'deleted', '/musics/Rock/b.mp3': 'modified'}
+
+
+def test_legacy_change_polling_revalidates_across_last_check(client, journal):
+    client, music_dir = client
+    (music_dir / 'Rock' / 'a.mp3').write_bytes(b'x' * 10)
+    # Pasta de capas "antiga": o ETag só é emitido com o mtime estável
+    os.utime(music_dir / 'covers', (0, 0))
+
+    first = client.get('/check_music_changes?last_check=0')
+    assert first.status_code == 200
+    assert [change['path'] for change in first.json['changes']] == ['/musics/Rock/a.mp3']
+    etag = first.headers['ETag']
+
+    # O cliente manda o last_check novo a cada consulta; sem mudanças, 304
+    last_check = first.json['current_time']
+    response = client.get(f'/check_music_changes?last_check={last_check}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    (music_dir / 'Rock' / 'b.mp3').write_bytes(b'y' * 10)
+    response = client.get(f'/check_music_changes?last_check={last_check}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert [change['name'] for change in response.json['changes']] == ['b.mp3']
+
+
+def test_events_stream_heartbeat_and_resume_by_id(client, journal):
+    client, music_dir = client
+
+    response = client.get('/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    frames = _frames(response)
+    ready = next(frames)
+    assert ready['event'] == 'ready' and ready['data']['seq'] == journal.seq
+    assert next(frames) == 'keep-alive'
+    journal.append('created', 'Rock/a.mp3')
+    first = next(frames)
+    assert first['event'] == 'library'
+    assert (first['data']['path'], first['data']['action']) == ('/musics/Rock/a.mp3', 'created')
+    response.close()
+
+    # Reconexão com o último id recebido: só o que veio depois
+    journal.append('created', 'Rock/b.mp3')
+    journal.append('deleted', 'Rock/a.mp3')
+    response = client.get('/events', headers={'Last-Event-ID': first['id']}, buffered=False)
+    frames = _frames(response)
+    assert next(frames)['event'] == 'ready'
+    missed = [next(frames), next(frames)]
+    assert [(f['data']['path'], f['data']['action']) for f in missed] == [
+        ('/musics/Rock/b.mp3', 'created'), ('/musics/Rock/a.mp3', 'deleted')]
+    assert next(frames) == 'keep-alive'
+    response.close()
+
+
+def test_events_reset_when_cursor_cannot_be_served(client, journal):
+    client, music_dir = client
+    journal.append('created', 'Rock/a.mp3')
+    old_id = server._event_id(journal.seq, 0)
+
+    # Id de outro processo: reset logo no primeiro frame
+    response = client.get('/events', headers={'Last-Event-ID': 'outro.1.processo.0'}, buffered=False)
+    reset = next(_frames(response))
+    assert reset['event'] == 'reset' and reset['data']['seq'] == journal.seq
+    response.close()
+
+    # Eventos já descartados do buffer: reset com a posição atual
+    for i in range(6):
+        journal.append('created', f'Rock/{i}.mp3')
+    response = client.get('/events', headers={'Last-Event-ID': old_id}, buffered=False)
+    frames = _frames(response)
+    assert next(frames)['event'] == 'ready'
+    reset = next(frames)
+    assert reset['event'] == 'reset' and reset['data']['seq'] == journal.seq
+    assert reset['id'] == server._event_id(journal.seq, 0)
+    assert next(frames) == 'keep-alive'
+    response.close()
@@ -0,0 +1,105 @@
+import os
+import threading
+
+from utils.library_index import LibraryIndex
+from utils.library_watcher import ChangeJournal, wait_for_events
+
+
+def _write(path, data=b'x' * 16):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _actions(changes):
+    return [(c['action'], c['path'], c.get('old_path')) for c in changes]
+
+
+def _make_index(tmp_path, reader=None):
+    root = tmp_path / 'musics'
+    root.mkdir(exist_ok=True)
+    return LibraryIndex(str(tmp_path / 'cache' / 'library.sqlite3'), str(root), tag_reader=reader), root
+
+
+def test_refresh_reports_created_renamed_and_deleted(tmp_path):
+    index, root = _make_index(tmp_path)
+    _write(str(root / 'Rock' / 'a.mp3'))
+    _write(str(root / 'covers' / 'a.jpg'))
+    _write(str(root / 'Rock' / 'notes.txt'))
+
+    assert _actions(index.refresh()) == [('created', 'Rock/a.mp3', None)]
+    assert [row['rel'] for row in index.tracks()] == ['Rock/a.mp3']
+
+    os.rename(root / 'Rock' / 'a.mp3', root / 'Rock' / 'b.mp3')
+    assert _actions(index.refresh()) == [('renamed', 'Rock/b.mp3', 'Rock/a.mp3')]
+
+    os.remove(root / 'Rock' / 'b.mp3')
+    assert _actions(index.refresh()) == [('deleted', 'Rock/b.mp3', None)]
+    assert index.playlists() == [{'name': 'Rock', 'music_count': 0}]
+
+
+def test_tags_are_parsed_once_until_file_changes(tmp_path):
+    calls = []
+
+    def reader(path):
+        calls.append(path)
+        return {'title': 'Epitáfio', 'artist': 'Titãs'}
+
+    index, root = _make_index(tmp_path, reader)
+    _write(str(root / 'Rock' / 'a.mp3'))
+    index.refresh()
+
+    assert index.ensure_tags(index.tracks())['Rock/a.mp3']['title'] == 'Epitáfio'
+    assert index.ensure_tags(index.tracks())['Rock/a.mp3']['artist'] == 'Titãs'
+    assert len(calls) == 1
+
+    _write(str(root / 'Rock' / 'a.mp3'), b'y' * 32)
+    assert _actions(index.refresh(dirs=['Rock'])) == [('modified', 'Rock/a.mp3', None)]
+    index.ensure_tags(index.tracks())
+    assert len(calls) == 2
+
+
+def test_index_survives_reopen(tmp_path):
+    index, root = _make_index(tmp_path)
+    _write(str(root / 'Pop' / 'a.m4a'))
+    index.refresh()
+    index.close()
+
+    reopened, _ = _make_index(tmp_path)
+    assert [row['rel'] for row in reopened.tracks('Pop')] == ['Pop/a.m4a']
+    assert reopened.refresh() == []
+
+
+def test_journal_since_detects_gaps():
+    journal = ChangeJournal(maxlen=3)
+    for name in ('a', 'b', 'c', 'd'):
+        journal.append('created', f'Rock/{name}.mp3')
+
+    assert [event['path'] for event in journal.since(2)] == ['Rock/c.mp3', 'Rock/d.mp3']
+    assert journal.since(4) == []
+    assert journal.since(0) is None  # evento 1 já saiu do buffer
+    assert journal.since(10) is None
+
+
+def test_enrichment_is_kept_until_file_changes(tmp_path):
+    index, root = _make_index(tmp_path)
+    _write(str(root / 'Rock' / 'faixa.mp3'))
+    index.refresh()
+
+    index.save_enrichment(index.get('Rock/faixa.mp3'), {'title': 'Epitáfio', 'artist': 'Titãs'})
+    row = index.get('Rock/faixa.mp3')
+    assert row['enriched'] == 1 and row['e_artist'] == 'Titãs'
+
+    _write(str(root / 'Rock' / 'faixa.mp3'), b'y' * 32)
+    index.refresh(dirs=['Rock'])
+    assert index.get('Rock/faixa.mp3')['enriched'] == 0
+
+
+def test_wait_for_events_wakes_on_append():
+    library = ChangeJournal()
+    downloads = ChangeJournal(condition=library.condition)
+
+    assert wait_for_events({library: 0, downloads: 0}, timeout=0.01) is False
+    threading.Timer(0.05, downloads.append, ('download_progress', 'abc')).start()
+    assert wait_for_events({library: 0, downloads: 0}, timeout=5) is True
+    assert downloads.since(0)[0]['action'] == 'download_progress'
@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import server
+from utils.enrichment import EnrichmentJobs
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    music_dir = tmp_path / 'musics'
+    (music_dir / 'Rock').mkdir(parents=True)
+    (music_dir / 'covers').mkdir()
+    for name in ('e', 'c', 'a', 'd', 'b'):
+        (music_dir / 'Rock' / f'{name}.mp3').write_bytes(b'x' * 16)
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(music_dir))
+    monkeypatch.setattr(server, 'COVERS_DIR', str(music_dir / 'covers'))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(server.settings, 'LIBRARY_WATCHER', 'off')
+    return server.app.test_client()
+
+
+def test_limit_and_cursor_walk_every_track_once(client):
+    everything = client.get('/list_music?playlist=Rock&skip_metadata=true').json['music']
+    names, cursor, pages = [], None, 0
+    while True:
+        url = '/list_music?playlist=Rock&skip_metadata=true&limit=2'
+        page = client.get(url + (f'&cursor={cursor}' if cursor else '')).json
+        assert page['total'] == 5 and page['count'] <= 2
+        names += [item['name'] for item in page['music']]
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert pages == 3
+    assert names == [item['name'] for item in everything] == ['a.mp3', 'b.mp3', 'c.mp3', 'd.mp3', 'e.mp3']
+
+
+def test_catalog_responses_revalidate_with_etag(client):
+    music_dir = server.MUSIC_DIR
+    # Pasta de capas "antiga": o ETag só é emitido com o mtime estável
+    os.utime(os.path.join(music_dir, 'covers'), (0, 0))
+    url = '/list_music?playlist=Rock&skip_metadata=true'
+    first = client.get(url)
+    etag = first.headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    # Parâmetros diferentes, validador diferente
+    assert client.get(url + '&limit=2', headers={'If-None-Match': etag}).status_code == 200
+
+    with open(os.path.join(music_dir, 'Rock', 'f.mp3'), 'wb') as f:
+        f.write(b'y' * 16)
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.json['count'] == 6
+    assert changed.headers['ETag'] != etag
+
+
+def test_ndjson_stream_ends_with_a_trailer(client):
+    response = client.get('/list_music?playlist=Rock&skip_metadata=true&stream=ndjson&limit=3')
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['name'] for line in lines[:-1]] == ['a.mp3', 'b.mp3', 'c.mp3']
+    trailer = lines[-1]
+    assert trailer['count'] == 3 and trailer['next_cursor']
+
+    rest = client.get('/list_music?playlist=Rock&skip_metadata=true&stream=ndjson&cursor=' + trailer['next_cursor'])
+    lines = [json.loads(line) for line in rest.get_data(as_text=True).splitlines()]
+    assert [line['name'] for line in lines[:-1]] == ['d.mp3', 'e.mp3']
+    assert lines[-1] == {'count': 2, 'next_cursor': None}
+
+
+@pytest.mark.parametrize('query', ['cursor=%21%21%21', 'cursor=WzEsIDJd', 'limit=0', 'limit=abc',
+                                   f'limit={server.settings.LIST_MUSIC_MAX_LIMIT + 1}', 'stream=xml'])
+def test_invalid_paging_parameters_are_rejected(client, query):
+    response = client.get('/list_music?playlist=Rock&' + query)
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+
+def _rows(prefix, count):
+    return [{'name': f'{prefix}{i}.mp3', 'rel': f'P/{prefix}{i}.mp3', 'dir': 'P', 'size': 1, 'mtime': 0,
+             'tags_parsed': 0, 'enriched': 0} for i in range(count)]
+
+
+def test_metadata_threads_are_shared_and_bounded(monkeypatch):
+    lock = threading.Lock()
+    active = {'total': 0, 'peak': 0}
+    per_call = {}
+    threads = set()
+
+    def slow_metadata(row):
+        prefix = row['name'][0]
+        with lock:
+            active['total'] += 1
+            active['peak'] = max(active['peak'], active['total'])
+            per_call[prefix] = per_call.get(prefix, 0) + 1
+            per_call[prefix + '_peak'] = max(per_call.get(prefix + '_peak', 0), per_call[prefix])
+            threads.add(threading.current_thread().name)
+        time.sleep(0.02)
+        with lock:
+            active['total'] -= 1
+            per_call[prefix] -= 1
+        return {'title': row['name'], 'artist': '', 'album': '', 'year': ''}
+
+    monkeypatch.setattr(server, '_full_track_metadata', slow_metadata)
+    monkeypatch.setattr(server, '_cover_thumbs', lambda cover: None)
+    pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix='metadata')
+    monkeypatch.setattr(server, '_metadata_executor', pool)
+
+    # Quatro listagens simultâneas com workers=2: no máximo 2 threads cada e 3 no total
+    with ThreadPoolExecutor(max_workers=4) as requests:
+        results = list(requests.map(
+            lambda prefix: server._music_items(_rows(prefix, 6), False, frozenset(), workers=2),
+            'abcd'))
+
+    assert [[item['title'] for item in items] for items in results] == [
+        [f'{prefix}{i}.mp3' for i in range(6)] for prefix in 'abcd']
+    assert active['peak'] <= 3
+    assert all(per_call[prefix + '_peak'] <= 2 for prefix in 'abcd')
+    assert len(threads) <= 3
+    pool.shutdown()
+
+
+def test_failed_deezer_lookup_counts_as_failed(tmp_path, monkeypatch):
+    music_dir = tmp_path / 'musics'
+    (music_dir / 'Rock').mkdir(parents=True)
+    (music_dir / 'covers').mkdir()
+    (music_dir / 'Rock' / 'untitled.mp3').write_bytes(b'x' * 16)
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(music_dir))
+    monkeypatch.setattr(server, 'COVERS_DIR', str(music_dir / 'covers'))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(server.settings, 'LIBRARY_WATCHER', 'off')
+
+    def unavailable(title, artist):
+        raise ConnectionError('Deezer fora do ar')
+
+    monkeypatch.setattr(server, '_lookup_metadata_on_deezer', unavailable)
+    index = server._refresh_library()
+    row = index.get('Rock/untitled.mp3')
+    published = []
+    jobs = EnrichmentJobs(server._enrich_track_row, workers=1)
+    job_id = jobs.submit([row], key_of=lambda r: r['rel'], on_result=lambda r, metadata: published.append(r))
+    deadline = time.time() + 5
+    while jobs.get(job_id)['status'] != 'done' and time.time() < deadline:
+        time.sleep(0.01)
+
+    job = jobs.get(job_id)
+    assert (job['completed'], job['failed']) == (0, 1)
+    assert published == []
+    assert not index.get('Rock/untitled.mp3')['enriched']
+    # A listagem segue respondendo com o que dá para inferir do nome
+    assert server._full_track_metadata(row)['title'] == 'untitled'
+
+
+def test_deadline_returns_pending_tracks_and_drops_late_results(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    finished = []
+
+    def stuck_metadata(row):
+        started.set()
+        release.wait(5)
+        finished.append(row['name'])
+        return {'title': 'tarde demais', 'artist': '', 'album': '', 'year': ''}
+
+    monkeypatch.setattr(server, '_full_track_metadata', stuck_metadata)
+    monkeypatch.setattr(server, '_cover_thumbs', lambda cover: None)
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='metadata')
+    monkeypatch.setattr(server, '_metadata_executor', pool)
+
+    items = server._music_items(_rows('a', 3), False, frozenset(), workers=2, deadline=time.monotonic() + 0.1)
+    assert started.is_set()
+    assert all(item['metadata_pending'] for item in items)
+    assert [item['title'] for item in items] == ['a0', 'a1', 'a2']
+
+    # As faixas em andamento terminam depois, sem alterar a resposta já montada
+    release.set()
+    pool.shutdown(wait=True)
+    assert sorted(finished) == ['a0.mp3', 'a1.mp3']
+    assert [item['title'] for item in items] == ['a0', 'a1', 'a2']
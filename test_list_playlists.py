@@ -0,0 +1,40 @@
+import os
+import time
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    music_dir = tmp_path / 'musics'
+    (music_dir / 'Rock').mkdir(parents=True)
+    (music_dir / 'covers').mkdir()
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(music_dir))
+    monkeypatch.setattr(server, 'COVERS_DIR', str(music_dir / 'covers'))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(server.settings, 'LIBRARY_WATCHER', 'off')
+    monkeypatch.setattr(server, '_cover_misses', {})
+    return server.app.test_client(), music_dir
+
+
+def test_cover_miss_changes_the_etag(client, monkeypatch):
+    client, music_dir = client
+    (music_dir / 'Rock' / 'a.mp3').write_bytes(b'x' * 10)
+    # Pasta de capas "antiga": o ETag só é emitido com o mtime estável
+    os.utime(music_dir / 'covers', (0, 0))
+    monkeypatch.setattr(server, '_get_or_create_playlist_cover', lambda name: server.DEFAULT_COVER)
+
+    first = client.get('/list_playlists')
+    assert first.json['playlists'][0]['cover_pending'] is True
+    deadline = time.time() + 5
+    while server._cover_queue.is_pending(('playlist', 'Rock')) and time.time() < deadline:
+        time.sleep(0.01)
+
+    # A busca falhou: a resposta muda (cover_pending false), então o ETag também
+    second = client.get('/list_playlists', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.json['playlists'][0]['cover_pending'] is False
+    assert second.json['playlists'][0]['cover'] == server.DEFAULT_COVER
+    assert client.get('/list_playlists', headers={'If-None-Match': second.headers['ETag']}).status_code == 304
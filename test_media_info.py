@@ -0,0 +1,29 @@
+import threading
+import time
+
+from utils.media_info import InfoCache, canonical_media_url
+
+
+def test_canonical_media_url():
+    assert canonical_media_url('https://youtu.be/abc?si=x') == 'https://www.youtube.com/watch?v=abc'
+    assert canonical_media_url('https://m.youtube.com/watch?v=abc&list=PL1&index=3') == \
+        'https://www.youtube.com/playlist?list=PL1'
+    assert canonical_media_url('HTTPS://Example.com/a?b=2&a=1#frag') == 'https://example.com/a?a=1&b=2'
+
+
+def test_info_cache_runs_one_extraction_per_key():
+    cache = InfoCache(ttl=60)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.05)
+        return {'title': 'Mix'}
+
+    threads = [threading.Thread(target=cache.get, args=('k', slow)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.get('k', slow) == {'title': 'Mix'}
+    assert len(calls) == 1
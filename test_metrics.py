@@ -0,0 +1,65 @@
+import pytest
+from prometheus_client import CollectorRegistry
+
+import server
+from utils.metrics import CONTENT_TYPE, SampleCollector, render
+
+
+def test_sample_collector_reads_values_at_collection_time():
+    registry = CollectorRegistry()
+    hits = SampleCollector('counter', 'app_hits_total', 'Acertos', ('cache',), registry=registry)
+    queued = SampleCollector('gauge', 'app_queued', 'Na fila', ('status',), registry=registry)
+    counts = {('deezer',): 3}
+    hits.set_function(lambda: counts)
+    queued.set_function(lambda: 1 / 0)
+
+    text = render(registry).decode('utf-8')
+    assert '# TYPE app_hits_total counter' in text
+    assert 'app_hits_total{cache="deezer"} 3.0' in text
+    # Função com erro: métrica sem amostras, coleta segue
+    assert '# TYPE app_queued gauge' in text and 'app_queued{' not in text
+    counts[('deezer',)] = 5
+    assert 'app_hits_total{cache="deezer"} 5.0' in render(registry).decode('utf-8')
+
+    with pytest.raises(ValueError):
+        SampleCollector('counter', 'app_hits_total', 'de novo', registry=registry)
+    with pytest.raises(ValueError):
+        SampleCollector('summary', 'app_other', 'Outro')
+
+
+def test_metrics_endpoint_reports_routes_scans_and_served_bytes(tmp_path, monkeypatch):
+    music_dir = tmp_path / 'musics'
+    (music_dir / 'Rock').mkdir(parents=True)
+    (music_dir / 'covers').mkdir()
+    (music_dir / 'Rock' / 'song.mp3').write_bytes(b'x' * 1000)
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(music_dir))
+    monkeypatch.setattr(server, 'COVERS_DIR', str(music_dir / 'covers'))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(server.settings, 'LIBRARY_WATCHER', 'off')
+    monkeypatch.setattr(server.settings, 'MEDIA_ACCEL_REDIRECT', '')
+    monkeypatch.setattr(server.settings, 'MEDIA_SENDFILE_HEADER', '')
+    client = server.app.test_client()
+
+    def sample(text, prefix):
+        line = next((line for line in text.splitlines() if line.startswith(prefix + ' ')), None)
+        return float(line.split()[-1]) if line else 0.0
+
+    before = client.get('/metrics').get_data(as_text=True)
+    assert client.get('/list_playlists').status_code == 200
+    assert client.get('/musics/Rock/song.mp3', headers={'Range': 'bytes=0-99'}).status_code == 206
+    assert client.head('/musics/Rock/song.mp3').status_code == 200
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type == CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    route = 'musickera_http_request_duration_seconds_count{method="GET",route="/list_playlists",status="200"}'
+    assert sample(text, route) == sample(before, route) + 1
+    served = 'musickera_served_bytes_total{kind="audio"}'
+    assert sample(text, served) == sample(before, served) + 100
+    scans = 'musickera_library_scan_seconds_count{trigger="request"}'
+    assert sample(text, scans) >= sample(before, scans) + 1
+    assert 'musickera_cache_requests_total{cache="media_info",result="hit"}' in text
+
+    monkeypatch.setattr(server.settings, 'METRICS_ENABLED', False)
+    assert client.get('/metrics').status_code == 404
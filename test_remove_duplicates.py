@@ -0,0 +1,61 @@
+import json
+import os
+
+import remove_duplicates
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_finds_identical_files_across_playlist_folders(tmp_path):
+    block = remove_duplicates.PARTIAL_BLOCK
+    song = os.urandom(4 * block)
+    _write(tmp_path / 'Rock' / 'song.mp3', song)
+    _write(tmp_path / 'Pop' / 'song copy.mp3', song)
+    # Same size, same head and tail, different middle: only the full hash tells them apart
+    _write(tmp_path / 'Pop' / 'other.mp3', song[:block] + os.urandom(2 * block) + song[-block:])
+    _write(tmp_path / 'covers' / 'song.mp3', song)
+
+    report = remove_duplicates.find_duplicates(tmp_path)
+
+    assert len(report['exact']) == 1
+    group = report['exact'][0]
+    assert sorted([group['keep']] + group['duplicates']) == ['Pop/song copy.mp3', 'Rock/song.mp3']
+    assert report['stats']['size_candidates'] == 3
+    assert report['stats']['full_hashed'] == 3
+    json.dumps(report)
+
+
+def test_hardlink_mode_keeps_every_path(tmp_path, capsys):
+    data = os.urandom(1000)
+    a = _write(tmp_path / 'A' / 'x.m4a', data)
+    b = _write(tmp_path / 'B' / 'x.m4a', data)
+
+    assert remove_duplicates.main([str(tmp_path), '--apply', 'hardlink', '--yes', '--json']) == 0
+    report = json.loads(capsys.readouterr().out)
+
+    assert [action['action'] for action in report['actions']] == ['hardlink']
+    assert os.stat(a).st_ino == os.stat(b).st_ino
+    # Already linked copies are not reported again
+    assert remove_duplicates.find_duplicates(tmp_path)['exact'] == []
+
+
+def test_similar_tracks_are_reported_but_not_exact(tmp_path, monkeypatch):
+    _write(tmp_path / 'A' / 'Artist - Song.flac', b'f' * 300)
+    _write(tmp_path / 'A' / 'Artist - Song (Ao Vivo).mp3', b'm' * 100)
+    # Same name, but one duration unknown and the other far away
+    _write(tmp_path / 'B' / 'Artist - Song.ogg', b'o' * 200)
+    _write(tmp_path / 'B' / 'Artist - Song.opus', b'p' * 200)
+    durations = {'Song.flac': 200.0, 'Song (Ao Vivo).mp3': 201.5, 'Song.ogg': None, 'Song.opus': 95.0}
+    monkeypatch.setattr(remove_duplicates, 'read_track_info', lambda path: (
+        'artist - song', durations[os.path.basename(path).split(' - ', 1)[1]]))
+
+    report = remove_duplicates.find_duplicates(tmp_path, similar=True)
+
+    assert report['exact'] == []
+    assert len(report['similar']) == 1
+    assert report['similar'][0]['keep'] == 'A/Artist - Song.flac'
+    assert report['similar'][0]['others'] == ['A/Artist - Song (Ao Vivo).mp3']
@@ -0,0 +1,137 @@
+import base64
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import server
+from utils.resumable_uploads import ResumableUploads, UploadError
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    music_dir = tmp_path / 'musics'
+    music_dir.mkdir()
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(music_dir))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(server.settings, 'LIBRARY_WATCHER', 'off')
+    monkeypatch.setattr(server._cover_queue, 'submit', lambda *args, **kw: True)
+    return server.app.test_client(), music_dir
+
+
+def _create(client, length, filename='long.flac', playlist='Lossless'):
+    metadata = ','.join(f'{k} {base64.b64encode(v.encode()).decode()}'
+                        for k, v in (('filename', filename), ('playlist', playlist)))
+    response = client.post('/uploads', headers={'Upload-Length': str(length), 'Upload-Metadata': metadata,
+                                                'Tus-Resumable': '1.0.0'})
+    assert response.status_code == 201
+    return response.headers['Location']
+
+
+def _patch(client, location, offset, data):
+    return client.patch(location, data=data, headers={'Upload-Offset': str(offset),
+                                                      'Content-Type': 'application/offset+octet-stream'})
+
+
+def test_chunks_out_of_order_and_resume_from_head(client):
+    client, music_dir = client
+    data = os.urandom(300_000)
+    location = _create(client, len(data))
+
+    assert _patch(client, location, 200_000, data[200_000:]).status_code == 204
+    head = client.head(location)
+    assert head.headers['Upload-Offset'] == '0'
+    assert client.get(location).get_json()['received'] == [[200_000, 300_000]]
+
+    response = _patch(client, location, 0, data[:100_000])
+    assert response.headers['Upload-Offset'] == '100000'
+
+    # A conexão "caiu": o cliente pergunta onde parou e envia o resto
+    offset = int(client.head(location).headers['Upload-Offset'])
+    response = _patch(client, location, offset, data[offset:200_000])
+    assert response.status_code == 200
+    assert response.get_json()['result']['file'] == 'long.flac'
+    assert (music_dir / 'Lossless' / 'long.flac').read_bytes() == data
+    assert os.listdir(music_dir / 'Lossless') == ['long.flac']
+    assert _patch(client, location, 0, b'x').status_code == 409
+
+
+def test_parallel_chunks_complete_exactly_once(client):
+    client, music_dir = client
+    data = os.urandom(64 * 1024 * 8)
+    location = _create(client, len(data), filename='parallel.flac')
+    chunk = 64 * 1024
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        statuses = list(executor.map(
+            lambda start: _patch(client, location, start, data[start:start + chunk]).status_code,
+            range(0, len(data), chunk),
+        ))
+
+    assert statuses.count(200) == 1 and statuses.count(204) == 7
+    assert (music_dir / 'Lossless' / 'parallel.flac').read_bytes() == data
+
+
+def test_chunk_past_declared_length_is_rejected(client):
+    client, _ = client
+    location = _create(client, 10)
+    assert _patch(client, location, 5, b'0123456789').status_code == 413
+    assert client.delete(location).status_code == 204
+    assert client.head(location).status_code == 404
+
+
+def test_playlist_outside_music_dir_is_rejected(client):
+    client, music_dir = client
+    metadata = ','.join(f'{k} {base64.b64encode(v.encode()).decode()}' for k, v in (('filename', 'x.mp3'), ('playlist', '..')))
+    response = client.post('/uploads', headers={'Upload-Length': '10', 'Upload-Metadata': metadata})
+    assert response.status_code == 400
+    assert sorted(os.listdir(music_dir.parent)) == ['musics']
+
+
+def test_assembly_waits_for_writes_in_flight(tmp_path):
+    uploads = ResumableUploads(str(tmp_path / 'uploads.sqlite3'))
+    upload = uploads.create('Rock', 'a.flac', 8, str(tmp_path))
+    entered, release = threading.Event(), threading.Event()
+
+    class SlowStream:
+        """Parte repetida que ainda está chegando quando o upload completa."""
+        def __init__(self):
+            self.sent = False
+
+        def read(self, size):
+            if self.sent:
+                return b''
+            entered.set()
+            release.wait(5)
+            self.sent = True
+            return b'ABCD'
+
+    late = []
+
+    def slow_write():
+        try:
+            uploads.write(upload['id'], 0, SlowStream(), 4)
+        except UploadError as e:
+            late.append(e.status)
+
+    slow = threading.Thread(target=slow_write)
+    slow.start()
+    assert entered.wait(5)
+    assert uploads.write(upload['id'], 4, io.BytesIO(b'EFGH'), 4)[1] is False
+    done = []
+    completing = threading.Thread(target=lambda: done.append(uploads.write(upload['id'], 0, io.BytesIO(b'ABCD'), 4)))
+    completing.start()
+    completing.join(0.3)
+    # Montagem bloqueada pela escrita em andamento; novas partes já são recusadas
+    assert not done
+    with pytest.raises(UploadError):
+        uploads.write(upload['id'], 0, io.BytesIO(b'XXXX'), 4)
+    release.set()
+    slow.join(5)
+    completing.join(5)
+    assert done[0][1] is True
+    assert late == [409]
+    with open(upload['path'], 'rb') as f:
+        assert f.read() == b'ABCDEFGH'
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import server
+from utils.search_index import SearchIndex
+
+
+def _ids(results):
+    return [doc_id for _, doc_id, _ in results]
+
+
+def test_accents_prefix_typos_and_ranking():
+    index = SearchIndex()
+    index.add('epitafio', {'title': 'Epitáfio', 'artist': 'Titãs'})
+    index.add('so-hoje', {'title': 'Só Hoje (Acústico)', 'artist': 'Jota Quest'})
+    index.add('facil', {'title': 'Fácil', 'artist': 'Jota Quest', 'album': 'Oxigênio'})
+    index.add('jota', {'title': 'Jota', 'artist': 'Outro'})
+
+    assert _ids(index.search('epitafio')) == ['epitafio']
+    assert _ids(index.search('SO HOJE')) == ['so-hoje']
+    assert _ids(index.search('acust')) == ['so-hoje']
+    assert _ids(index.search('epitafo')) == ['epitafio']
+    assert _ids(index.search('jota fac')) == ['facil']
+    # Título pesa mais que artista
+    assert _ids(index.search('jota'))[0] == 'jota'
+    assert len(index.search('jota', limit=2)) == 2
+
+    index.remove('epitafio')
+    assert index.search('epitafio') == []
+    index.add('facil', {'title': 'Difícil'})
+    assert index.search('oxigenio') == []
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    music_dir = tmp_path / 'musics'
+    (music_dir / 'Rock BR').mkdir(parents=True)
+    (music_dir / 'covers').mkdir()
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(music_dir))
+    monkeypatch.setattr(server, 'COVERS_DIR', str(music_dir / 'covers'))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(server.settings, 'LIBRARY_WATCHER', 'off')
+    return server.app.test_client(), music_dir
+
+
+def test_search_endpoint_follows_library_changes(client, monkeypatch):
+    client, music_dir = client
+    (music_dir / 'Rock BR' / 'Titãs - Epitáfio.mp3').write_bytes(b'x')
+
+    response = client.get('/search?q=titas epitaf').get_json()
+    assert [item['name'] for item in response['results']] == ['Titãs - Epitáfio.mp3']
+    assert response['results'][0]['playlist'] == 'Rock BR'
+
+    os.rename(music_dir / 'Rock BR' / 'Titãs - Epitáfio.mp3', music_dir / 'Rock BR' / 'Titãs - Sonífera Ilha.mp3')
+    assert client.get('/search?q=epitafio').get_json()['results'] == []
+    assert client.get('/search?q=sonifera').get_json()['total'] == 1
+
+    monkeypatch.setattr(server.settings, 'SEARCH_MAX_RESULTS', 1)
+    (music_dir / 'Rock BR' / 'Titãs - Flores.mp3').write_bytes(b'y')
+    assert client.get('/search?q=rock&limit=10').get_json()['total'] == 1
+    assert client.get('/search').status_code == 400
@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+import server
+
+GIB = 1024 ** 3
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    music_dir = tmp_path / 'musics'
+    (music_dir / 'Rock').mkdir(parents=True)
+    (music_dir / 'covers').mkdir()
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(music_dir))
+    monkeypatch.setattr(server, 'COVERS_DIR', str(music_dir / 'covers'))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(server.settings, 'MEDIA_ACCEL_REDIRECT', '')
+    monkeypatch.setattr(server.settings, 'MEDIA_SENDFILE_HEADER', '')
+    return server.app.test_client(), music_dir
+
+
+def _sparse(path, size, marks):
+    """Arquivo esparso de ``size`` bytes com ``marks`` {offset: bytes} gravados."""
+    with open(path, 'wb') as f:
+        f.truncate(size)
+        for offset, data in marks.items():
+            f.seek(offset)
+            f.write(data)
+
+
+def test_single_range_seeks_into_large_file(client):
+    client, music_dir = client
+    size = 3 * GIB
+    _sparse(music_dir / 'Rock' / 'long.flac', size, {size - 8: b'THE-END!', 2 * GIB: b'MIDDLE'})
+
+    response = client.get('/musics/Rock/long.flac', headers={'Range': f'bytes={2 * GIB}-{2 * GIB + 5}'})
+    assert response.status_code == 206
+    assert response.data == b'MIDDLE'
+    assert response.headers['Content-Range'] == f'bytes {2 * GIB}-{2 * GIB + 5}/{size}'
+
+    response = client.get('/musics/Rock/long.flac', headers={'Range': 'bytes=-8'})
+    assert response.status_code == 206
+    assert response.data == b'THE-END!'
+
+    response = client.get('/musics/Rock/long.flac', headers={'Range': f'bytes={size}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{size}'
+
+
+def test_multiple_ranges_return_multipart_byteranges(client):
+    client, music_dir = client
+    _sparse(music_dir / 'Rock' / 'song.wav', GIB, {0: b'RIFF', GIB // 2: b'DATA'})
+
+    response = client.get('/musics/Rock/song.wav', headers={'Range': f'bytes=0-3,{GIB // 2}-{GIB // 2 + 3}'})
+    assert response.status_code == 206
+    assert response.mimetype == 'multipart/byteranges'
+    body = response.get_data()
+    assert int(response.headers['Content-Length']) == len(body)
+    assert b'Content-Range: bytes 0-3/%d\r\n\r\nRIFF\r\n' % GIB in body
+    assert b'Content-Range: bytes %d-%d/%d\r\n\r\nDATA\r\n' % (GIB // 2, GIB // 2 + 3, GIB) in body
+    assert body.endswith(b'--' + response.mimetype_params['boundary'].encode() + b'--\r\n')
+
+
+def test_conditional_requests_and_cache_headers(client):
+    client, music_dir = client
+    (music_dir / 'Rock' / 'a.mp3').write_bytes(b'x' * 1000)
+    (music_dir / 'covers' / 'a.jpg').write_bytes(b'jpeg')
+
+    response = client.get('/musics/Rock/a.mp3')
+    assert response.status_code == 200 and len(response.data) == 1000
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Cache-Control'] == server.settings.AUDIO_CACHE_CONTROL
+    etag = response.headers['ETag']
+
+    assert client.get('/musics/Rock/a.mp3', headers={'If-None-Match': etag}).status_code == 304
+    last_modified = response.headers['Last-Modified']
+    assert client.get('/musics/Rock/a.mp3', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+    # If-Range com validador antigo: arquivo inteiro
+    response = client.get('/musics/Rock/a.mp3', headers={'Range': 'bytes=0-9', 'If-Range': '"antigo"'})
+    assert response.status_code == 200 and len(response.data) == 1000
+    response = client.get('/musics/Rock/a.mp3', headers={'Range': 'bytes=0-9', 'If-Range': etag})
+    assert response.status_code == 206 and len(response.data) == 10
+
+    cover = client.get('/musics/covers/a.jpg')
+    assert cover.headers['Cache-Control'] == server.settings.COVER_CACHE_CONTROL
+    assert client.get('/musics/../server.py').status_code == 404
+
+
+def test_accel_redirect_offloads_body(client, monkeypatch):
+    client, music_dir = client
+    (music_dir / 'Rock' / 'a.mp3').write_bytes(b'x' * 10)
+    monkeypatch.setattr(server.settings, 'MEDIA_ACCEL_REDIRECT', '/_musics/')
+
+    response = client.get('/musics/Rock/a.mp3')
+    assert response.headers['X-Accel-Redirect'] == '/_musics/Rock/a.mp3'
+    assert response.data == b''
+
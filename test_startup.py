@@ -0,0 +1,25 @@
+import pytest
+
+from benchmarks import startup
+
+
+@pytest.mark.parametrize('entry_point', sorted(startup.ENTRY_POINTS))
+def test_entry_points_start_without_heavy_dependencies(entry_point, tmp_path):
+    result = startup.measure(entry_point, runs=1, cache_dir=str(tmp_path / 'cache'),
+                             music_dir=str(tmp_path / 'musics'))
+
+    assert result['status'] == 200
+    assert result['loaded_heavy_modules'] == []
+    assert startup.check(result, {'import_ms': float('inf')}) == []
+
+
+def test_regressions_against_baseline_are_reported():
+    result = {'entry_point': 'server', 'status': 200, 'loaded_heavy_modules': ['yt_dlp'],
+              'import_ms': 130.0, 'first_response_ms': 150.0}
+
+    problems = startup.check(result, {'import_ms': 120, 'first_response_ms': 1000},
+                             baseline={'import_ms': 100, 'first_response_ms': 140}, tolerance=0.25)
+    assert len(problems) == 3
+    assert 'yt_dlp' in problems[0]
+    assert 'orçamento' in problems[1]
+    assert '30% acima' in problems[2]
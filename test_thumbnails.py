@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+
+import pytest
+
+import server
+from utils.thumbnails import CoverThumbnails
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def _cover(path, color=(200, 10, 10)):
+    Image.new('RGB', (1000, 1000), color).save(path, 'JPEG')
+
+
+def test_thumbnails_are_content_addressed_and_shared(tmp_path):
+    covers = tmp_path / 'covers'
+    covers.mkdir()
+    _cover(covers / 'a.jpg')
+    _cover(covers / 'Playlist.jpg')
+    thumbs = CoverThumbnails(str(covers), str(tmp_path / 'thumbs.sqlite3'), sizes=(64, 256))
+
+    assert sorted(thumbs.stale(['a.jpg', 'Playlist.jpg', 'thumbs'])) == ['Playlist.jpg', 'a.jpg']
+    assert thumbs.generate('a.jpg') and thumbs.generate('Playlist.jpg')
+    assert thumbs.stale(['a.jpg', 'Playlist.jpg']) == []
+
+    urls = thumbs.urls('a.jpg', '/musics/covers/')
+    assert urls == thumbs.urls('Playlist.jpg', '/musics/covers/')
+    with Image.open(covers / urls['64'][len('/musics/covers/'):]) as img:
+        assert img.format == 'WEBP' and img.size == (64, 64)
+
+    # Capa alterada: novo hash, e as miniaturas antigas sem dono são apagadas
+    _cover(covers / 'a.jpg', (10, 200, 10))
+    os.remove(covers / 'Playlist.jpg')
+    assert thumbs.stale(['a.jpg']) == ['a.jpg']
+    thumbs.generate('a.jpg')
+    assert thumbs.urls('a.jpg', '/musics/covers/') != urls
+    assert sorted(os.listdir(covers / 'thumbs')) == sorted(
+        os.path.basename(url) for url in thumbs.urls('a.jpg', '/musics/covers/').values()
+    )
+
+
+def test_listing_checks_thumbnails_on_the_cover_queue(tmp_path, monkeypatch):
+    music_dir = tmp_path / 'musics'
+    (music_dir / 'Rock').mkdir(parents=True)
+    covers = music_dir / 'covers'
+    covers.mkdir()
+    _cover(covers / 'Rock.jpg')
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(music_dir))
+    monkeypatch.setattr(server, 'COVERS_DIR', str(covers))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(server.settings, 'LIBRARY_WATCHER', 'off')
+    checked_on = []
+    stale = CoverThumbnails.stale
+
+    def recording_stale(self, names):
+        checked_on.append(threading.current_thread().name)
+        return stale(self, names)
+
+    monkeypatch.setattr(CoverThumbnails, 'stale', recording_stale)
+    client = server.app.test_client()
+    assert client.get('/list_playlists').status_code == 200
+
+    thumbnails = server._get_cover_thumbnails()
+    deadline = time.time() + 10
+    while thumbnails.urls('Rock.jpg', '/musics/covers/') is None and time.time() < deadline:
+        time.sleep(0.02)
+    assert thumbnails.urls('Rock.jpg', '/musics/covers/')
+    assert checked_on and all(name.startswith('cover-resolver') for name in checked_on)
@@ -0,0 +1,52 @@
+import io
+import os
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    music_dir = tmp_path / 'musics'
+    music_dir.mkdir()
+    monkeypatch.setattr(server, 'MUSIC_DIR', str(music_dir))
+    monkeypatch.setattr(server, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(server.settings, 'LIBRARY_WATCHER', 'off')
+    covers = []
+    monkeypatch.setattr(server._cover_queue, 'submit', lambda key, fn, *args, **kw: covers.append(args))
+    return server.app.test_client(), music_dir, covers
+
+
+def _upload(client, playlist, name, data):
+    return client.post('/upload_to_playlist', data={'playlist': playlist, 'file': (io.BytesIO(data), name)},
+                       content_type='multipart/form-data').get_json()
+
+
+def test_upload_never_overwrites_and_skips_identical_content(client):
+    client, music_dir, covers = client
+
+    first = _upload(client, 'Rock', 'song.mp3', b'A' * 1000)
+    assert first['files'][0]['status'] == 'uploaded'
+    # Capa agendada, não buscada durante a requisição
+    assert covers == [(str(music_dir / 'Rock' / 'song.mp3'),)]
+
+    same = _upload(client, 'Rock', 'copy.mp3', b'A' * 1000)
+    assert same['files'][0] == {'file': 'song.mp3', 'status': 'duplicate', 'name': 'copy.mp3'}
+
+    other = _upload(client, 'Rock', 'song.mp3', b'B' * 1000)
+    assert other['uploaded'] == ['song (2).mp3']
+    assert sorted(os.listdir(music_dir / 'Rock')) == ['song (2).mp3', 'song.mp3']
+    assert (music_dir / 'Rock' / 'song.mp3').read_bytes() == b'A' * 1000
+
+
+def test_identical_upload_in_other_playlist_becomes_hardlink(client, monkeypatch):
+    client, music_dir, _ = client
+    monkeypatch.setattr(server.settings, 'UPLOAD_HARDLINK_DUPLICATES', True)
+
+    _upload(client, 'Rock', 'song.mp3', b'A' * 1000)
+    linked = _upload(client, 'Pop', 'song.mp3', b'A' * 1000)
+
+    assert linked['files'][0]['status'] == 'linked'
+    assert linked['files'][0]['duplicate_of'] == 'Rock/song.mp3'
+    assert os.stat(music_dir / 'Pop' / 'song.mp3').st_ino == os.stat(music_dir / 'Rock' / 'song.mp3').st_ino
@@ -0,0 +1,121 @@
+"""
+Cache em disco (SQLite) das respostas da API do Deezer
+
+As chaves são consultas normalizadas (sem acentos, minúsculas), de modo que
+"Epitáfio Titãs" e "epitafio  titas" reaproveitam a mesma resposta. Buscas
+sem resultado também são guardadas (cache negativo), com TTL próprio.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+"""
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normaliza uma consulta: remove acentos, pontuação e espaços repetidos
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r'[^\w]+', ' ', text.lower())
+    return ' '.join(text.split())
+
+
+class DeezerCache:
+    """
+    Cache chave -> JSON com expiração e limite de tamanho (LRU).
+
+    ``get`` retorna ``(encontrado, valor)``; um valor None encontrado é um
+    resultado negativo ("o Deezer não conhece isso") ainda válido. ``clock``
+    fornece o horário usado na expiração e no LRU.
+    """
+
+    def __init__(self, db_path: str, hit_ttl: float, miss_ttl: float, max_entries: int,
+                 clock: Callable[[], float] = time.time):
+        self.db_path = db_path
+        self.hit_ttl = hit_ttl
+        self.miss_ttl = miss_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._count = self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None or row[1] < now:
+                self.misses += 1
+                return False, None
+            self._conn.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            if row[0] is None:
+                self.negative_hits += 1
+                return True, None
+            self.hits += 1
+            return True, json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        """Guarda ``value``; None (ou vazio) é gravado como resultado negativo."""
+        now = self._clock()
+        ttl = self.hit_ttl if value else self.miss_ttl
+        payload = json.dumps(value, ensure_ascii=False) if value else None
+        with self._lock:
+            exists = self._conn.execute('SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, payload, now + ttl, now),
+            )
+            if not exists:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        # Remove expirados e, se ainda preciso, os menos usados até 90% do limite
+        removed = self._conn.execute('DELETE FROM entries WHERE expires < ?', (now,)).rowcount
+        excess = self._count - removed - int(self.max_entries * 0.9)
+        if excess > 0:
+            removed += self._conn.execute(
+                'DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed LIMIT ?)',
+                (excess,),
+            ).rowcount
+        self.evictions += removed
+        self._count -= removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': self._count,
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
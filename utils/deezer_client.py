@@ -0,0 +1,138 @@
+"""
+Cliente HTTP compartilhado para a API do Deezer
+
+Uma única ``requests.Session`` com pool de conexões (keep-alive), limite de
+taxa por token bucket, limite de requisições simultâneas e novas tentativas
+com backoff exponencial e jitter.
+
+O token bucket é por processo: com vários workers (gunicorn) o limite de
+cada um é dividido por ``processes`` para que o total respeite a cota.
+"""
+
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Erro de cota do Deezer ("Quota limit exceeded"), devolvido com HTTP 200
+DEEZER_QUOTA_ERROR_CODE = 4
+
+_UNITS = {'second': 1, 'seconds': 1, 'minute': 60, 'minutes': 60, 'hour': 3600, 'hours': 3600}
+
+
+def parse_rate(spec: str) -> Tuple[int, float]:
+    """
+    Converte '50 per 5 seconds' / '100 per minute' em (requisições, segundos)
+    """
+    match = re.match(r'^\s*(\d+)\s+per\s+(\d+(?:\.\d+)?)?\s*([a-z]+)\s*$', spec.lower())
+    if not match or match.group(3) not in _UNITS:
+        raise ValueError(f"Limite de taxa inválido: {spec!r}")
+    amount = float(match.group(2) or 1)
+    return int(match.group(1)), amount * _UNITS[match.group(3)]
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe: ``rate`` tokens por segundo, até ``capacity``
+    acumulados (rajada máxima).
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Consome um token, esperando se necessário. Retorna o tempo esperado."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+
+class DeezerError(Exception):
+    """Erro devolvido pela API do Deezer (corpo JSON com a chave 'error')."""
+
+
+class _RetryableError(requests.RequestException):
+    """Falha temporária (429, 5xx, cota do Deezer) que vale tentar de novo."""
+
+
+class DeezerClient:
+    """
+    Cliente da API do Deezer compartilhado entre threads.
+
+    ``get_json`` respeita o limite de taxa da API; ``get_bytes`` (imagens de
+    capa, servidas por CDN) usa o mesmo pool e o mesmo limite de concorrência.
+    ``rate`` é a cota total, repartida igualmente entre ``processes``.
+    """
+
+    def __init__(self, base_url: str = 'https://api.deezer.com', rate: str = '50 per 5 seconds',
+                 timeout: float = 10, retries: int = 3, max_concurrency: int = 4,
+                 backoff: float = 0.5, processes: int = 1,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._sleep = sleep
+        count, seconds = parse_rate(rate)
+        share = count / max(1, processes)
+        self._bucket = TokenBucket(share / seconds, max(1.0, share), clock=clock, sleep=sleep)
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, max_concurrency))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """GET em ``base_url + path`` e retorna o JSON. Lança DeezerError/RequestException."""
+        url = path if path.startswith(('http://', 'https://')) else self.base_url + path
+        return self._request(url, params, rate_limited=True, as_json=True)
+
+    def get_bytes(self, url: str) -> bytes:
+        return self._request(url, None, rate_limited=False, as_json=False)
+
+    def _request(self, url: str, params, rate_limited: bool, as_json: bool):
+        attempt = 0
+        while True:
+            try:
+                if rate_limited:
+                    self._bucket.acquire()
+                with self._slots:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise _RetryableError(f"HTTP {response.status_code}", response=response)
+                if not as_json:
+                    response.raise_for_status()
+                    return response.content
+                data = response.json()
+                error = data.get('error') if isinstance(data, dict) else None
+                if error:
+                    if isinstance(error, dict) and error.get('code') == DEEZER_QUOTA_ERROR_CODE:
+                        raise _RetryableError('Deezer: limite de requisições excedido')
+                    raise DeezerError(error)
+                return data
+            except (requests.ConnectionError, requests.Timeout, _RetryableError):
+                if attempt >= self.retries:
+                    raise
+                # Backoff exponencial com jitter completo
+                self._sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+                attempt += 1
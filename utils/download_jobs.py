@@ -0,0 +1,314 @@
+"""
+Fila persistente de downloads (SQLite)
+
+Os jobs sobrevivem a reinícios: os que estavam na fila ou em execução voltam
+para a fila quando o processo sobe de novo. Um número limitado de workers
+executa os downloads, e pedidos repetidos (mesma URL e playlist) enquanto um
+job ainda está ativo reaproveitam esse job.
+
+Vários processos (ex.: workers do gunicorn) podem compartilhar o banco: cada
+job é reservado por um único processo (``owner``), que renova periodicamente
+um lease (``heartbeat``); outro processo só retoma o job depois que o lease
+expira. Cancelamentos e términos são lidos do banco, então valem para jobs
+de qualquer processo.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    playlist TEXT,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    options TEXT,
+    owner TEXT,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs(created);
+"""
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Intervalo máximo (segundos) entre consultas ao banco de quem espera um job
+# ou verifica se ele foi cancelado em outro processo
+POLL_INTERVAL = 1.0
+
+# run(job, progress, cancelled) -> resultado (dict com 'success')
+JobRunner = Callable[[Dict[str, Any], Callable[..., None], Callable[[], bool]], Dict[str, Any]]
+
+
+class DownloadJobs:
+    """
+    Gerenciador de jobs de download com pool de ``workers`` threads.
+
+    O progresso de cada job (arquivo atual, bytes, arquivos concluídos) fica
+    só em memória; no banco vão as transições de estado e o resultado final.
+    """
+
+    def __init__(self, db_path: str, run: JobRunner, workers: int = 2, keep: int = 500, lease: float = 30.0):
+        self.db_path = db_path
+        self.run = run
+        self.workers = max(1, workers)
+        self.keep = keep
+        self.lease = lease
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        self._cancelling = set()
+        self._lock = threading.RLock()
+        self._finished = threading.Condition(self._lock)
+        self._threads = []
+        self._closed = threading.Event()
+        # Dono dos jobs em execução: pid + instância (uma instância nova no
+        # mesmo processo equivale a um reinício)
+        self.owner = f'{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        # Bancos criados antes das colunas 'options' (sincronização), 'owner' e 'heartbeat'
+        columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        for column, kind in (('options', 'TEXT'), ('owner', 'TEXT'), ('heartbeat', 'REAL')):
+            if column not in columns:
+                self._conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {kind}')
+        self._resume()
+        threading.Thread(target=self._keep_leases, name='download-lease', daemon=True).start()
+
+    def _orphaned(self, owner: Optional[str], heartbeat: Optional[float], now: float) -> bool:
+        """True se o dono de um job em execução deixou de renovar o lease."""
+        if owner == self.owner:
+            return False
+        if (owner or '').split(':')[0] == str(os.getpid()):
+            # Outra instância neste mesmo processo: reinício (ex.: nos testes)
+            return True
+        return heartbeat is None or now - heartbeat > self.lease
+
+    def _resume(self, min_age: float = 0.0) -> None:
+        # Jobs interrompidos (lease expirado) voltam para a fila (o yt-dlp pula
+        # o que já baixou); os de outro processo vivo continuam com ele.
+        # ``min_age`` deixa de fora jobs recém-enfileirados por outro processo
+        now = time.time()
+        with self._lock:
+            for row in self._conn.execute("SELECT id, owner, heartbeat FROM jobs WHERE status = 'running'").fetchall():
+                if self._orphaned(row['owner'], row['heartbeat'], now):
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'queued', started = NULL, owner = NULL, heartbeat = NULL "
+                        "WHERE id = ? AND status = 'running' AND owner IS ?",
+                        (row['id'], row['owner']),
+                    )
+            pending = [row['id'] for row in self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND created <= ? ORDER BY created", (now - min_age,)
+            )]
+            if pending:
+                self._start_workers()
+        for job_id in pending:
+            self._queue.put(job_id)
+
+    def _keep_leases(self) -> None:
+        # Renova o lease dos jobs deste processo e assume os de processos que
+        # pararam de renovar (a reserva em _work é atômica, repetir é inofensivo)
+        while not self._closed.wait(self.lease / 3):
+            try:
+                with self._lock:
+                    self._conn.execute(
+                        "UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = 'running'",
+                        (time.time(), self.owner),
+                    )
+                self._resume(min_age=self.lease)
+            except sqlite3.Error:
+                if self._closed.is_set():
+                    return
+
+    def submit(self, url: str, playlist: Optional[str],
+               options: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], bool]:
+        """Enfileira um download; retorna (job, criado). Se já existe um job
+        ativo para a mesma URL e playlist, retorna esse job com criado=False.
+        ``options`` (ex.: {'sync': True}) é repassado ao executor em ``job['options']``."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE url = ? AND playlist IS ? AND status IN ('queued', 'running') "
+                "ORDER BY created LIMIT 1",
+                (url, playlist),
+            ).fetchone()
+            if row is not None:
+                return self._job(row), False
+            job_id = uuid.uuid4().hex[:12]
+            self._conn.execute(
+                "INSERT INTO jobs (id, url, playlist, status, created, options) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, url, playlist, time.time(), json.dumps(options) if options else None),
+            )
+            self._prune()
+            self._start_workers()
+            job = self._job(self._row(job_id))
+        self._queue.put(job_id)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._row(job_id)
+            return self._job(row) if row is not None else None
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancela um job: na fila, é descartado na hora; em execução, o
+        download é interrompido no próximo aviso de progresso."""
+        with self._lock:
+            row = self._row(job_id)
+            if row is None:
+                return None
+            if row['status'] == 'queued':
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished = ? WHERE id = ?",
+                    (time.time(), job_id),
+                )
+                self._finished.notify_all()
+            elif row['status'] == 'running':
+                self._conn.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ?', (job_id,))
+                self._cancelling.add(job_id)
+            return self._job(self._row(job_id))
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Espera o job terminar (ou ``timeout``) e retorna o estado atual.
+
+        Jobs deste processo avisam ao terminar; os de outro processo são
+        vistos consultando o banco a cada POLL_INTERVAL."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                row = self._row(job_id)
+                if row is None or row['status'] not in ACTIVE_STATUSES:
+                    break
+                remaining = POLL_INTERVAL if deadline is None else deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._finished.wait(min(POLL_INTERVAL, remaining))
+            return self._job(row) if row is not None else None
+
+    def active_counts(self) -> Dict[str, int]:
+        """Jobs por status ativo no banco (de todos os processos)."""
+        counts = dict.fromkeys(ACTIVE_STATUSES, 0)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status"
+            ).fetchall()
+        counts.update((status, count) for status, count in rows)
+        return counts
+
+    def _row(self, job_id: str) -> Optional[sqlite3.Row]:
+        return self._conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+    def _job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = {
+            'id': row['id'],
+            'url': row['url'],
+            'playlist': row['playlist'],
+            'status': row['status'],
+            'created': row['created'],
+            'started': row['started'],
+            'finished': row['finished'],
+            'cancel_requested': bool(row['cancel_requested']),
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'options': json.loads(row['options']) if row['options'] else {},
+        }
+        if row['status'] == 'running':
+            job['progress'] = dict(self._progress.get(row['id'], {}))
+        return job
+
+    def _prune(self) -> None:
+        self._conn.execute(
+            "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND id NOT IN "
+            "(SELECT id FROM jobs ORDER BY created DESC LIMIT ?)",
+            (self.keep,),
+        )
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._work, name=f'download-{len(self._threads) + 1}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                # Reserva atômica: outro processo pode ter pego o mesmo job
+                now = time.time()
+                claimed = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', started = ?, owner = ?, heartbeat = ? "
+                    "WHERE id = ? AND status = 'queued'",
+                    (now, self.owner, now, job_id),
+                ).rowcount
+                if not claimed:
+                    continue
+                self._progress[job_id] = {}
+                job = self._job(self._row(job_id))
+            self._execute(job)
+
+    def _execute(self, job: Dict[str, Any]) -> None:
+        job_id = job['id']
+
+        def progress(**fields) -> None:
+            with self._lock:
+                self._progress.setdefault(job_id, {}).update(fields)
+
+        last_poll = [time.monotonic()]
+
+        def cancelled() -> bool:
+            # Chamado a cada aviso de progresso: consulta a memória e, no máximo
+            # a cada POLL_INTERVAL, o banco (cancelamento feito por outro processo)
+            if job_id in self._cancelling:
+                return True
+            now = time.monotonic()
+            if now - last_poll[0] < POLL_INTERVAL:
+                return False
+            last_poll[0] = now
+            with self._lock:
+                row = self._conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+                if row is not None and row[0]:
+                    self._cancelling.add(job_id)
+            return job_id in self._cancelling
+
+        result = None
+        error = None
+        try:
+            result = self.run(job, progress, cancelled)
+            if not result.get('success'):
+                error = result.get('error') or 'Falha no download'
+        except Exception as e:
+            print(f"❌ Erro no job de download {job_id}: {e}")
+            error = str(e)
+
+        with self._lock:
+            if cancelled():
+                status = 'cancelled'
+            else:
+                status = 'failed' if error else 'done'
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, finished = ?, result = ?, error = ? WHERE id = ?',
+                (status, time.time(), json.dumps(result, ensure_ascii=False) if result else None, error, job_id),
+            )
+            self._progress.pop(job_id, None)
+            self._cancelling.discard(job_id)
+            self._finished.notify_all()
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,94 @@
+"""
+Jobs de enriquecimento de metadados em segundo plano
+"""
+
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+class EnrichmentJobs:
+    """
+    Registro de jobs que enriquecem faixas (uma chamada de ``enrich_one`` por
+    faixa) em um pool de threads compartilhado.
+
+    Pedidos para o mesmo conjunto de faixas enquanto um job ainda está ativo
+    reaproveitam esse job. Apenas os ``max_jobs`` jobs mais recentes ficam
+    disponíveis para consulta; os resultados em si devem ser persistidos por
+    ``enrich_one``.
+    """
+
+    def __init__(self, enrich_one: Callable[[Any], Dict[str, Any]], workers: int = 4, max_jobs: int = 100):
+        self.enrich_one = enrich_one
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='enrichment')
+        self._jobs: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._active: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, items: List[Any], key_of: Callable[[Any], str],
+               on_result: Optional[Callable[[Any, Dict[str, Any]], None]] = None) -> str:
+        """Cria (ou reaproveita) um job para ``items`` e retorna o id."""
+        keys = sorted(key_of(item) for item in items)
+        scope = hashlib.sha1('\0'.join(keys).encode('utf-8')).hexdigest()
+        with self._lock:
+            job_id = self._active.get(scope)
+            if job_id is not None:
+                return job_id
+            job_id = uuid.uuid4().hex[:16]
+            self._jobs[job_id] = {
+                'id': job_id,
+                'status': 'queued',
+                'total': len(items),
+                'completed': 0,
+                'failed': 0,
+                'created': time.time(),
+                'finished': None,
+                'results': {},
+            }
+            self._active[scope] = job_id
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        for item in items:
+            self._executor.submit(self._run_one, job_id, scope, item, key_of(item), on_result)
+        return job_id
+
+    def _run_one(self, job_id: str, scope: str, item: Any, key: str, on_result) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job['status'] == 'queued':
+                job['status'] = 'running'
+        result = None
+        try:
+            result = self.enrich_one(item)
+            if on_result is not None:
+                on_result(item, result)
+        except Exception as e:
+            print(f"❌ Erro ao enriquecer {key}: {e}")
+        with self._lock:
+            if job is None:
+                job = self._jobs.get(job_id)
+            if job is not None:
+                if result is None:
+                    job['failed'] += 1
+                else:
+                    job['completed'] += 1
+                    job['results'][key] = result
+                if job['completed'] + job['failed'] >= job['total']:
+                    job['status'] = 'done'
+                    job['finished'] = time.time()
+            if job is None or job['status'] == 'done':
+                self._active.pop(scope, None)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            job['results'] = dict(job['results'])
+            return job
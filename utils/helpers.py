@@ -112,15 +112,30 @@ def extract_metadata_from_filename(filename: str) -> Dict[str, str]:
         'album': 'Desconhecido'
     }
 
-def generate_file_hash(file_path: str) -> str:
+def generate_file_hash(file_path: str, algorithm: str = 'md5', chunk_size: int = 1024 * 1024) -> str:
     """
-    Gera um hash MD5 do arquivo
+    Gera um hash do arquivo (MD5 por padrão)
     """
-    hash_md5 = hashlib.md5()
+    file_hash = hashlib.new(algorithm)
     with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+def save_stream_with_hash(stream, dest_path: str, algorithm: str = 'md5',
+                          chunk_size: int = 1024 * 1024) -> Tuple[str, int]:
+    """
+    Grava um stream em dest_path em blocos, calculando o hash ao mesmo tempo.
+    Retorna (hash, tamanho em bytes)
+    """
+    file_hash = hashlib.new(algorithm)
+    size = 0
+    with open(dest_path, "wb") as f:
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            file_hash.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return file_hash.hexdigest(), size
 
 def create_playlist_directory(playlist_name: str, base_dir: str) -> str:
     """
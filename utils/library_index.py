@@ -0,0 +1,443 @@
+"""
+Índice persistente da biblioteca de músicas (SQLite)
+
+Guarda, para cada arquivo de áudio dentro de MUSIC_DIR, o tamanho, o mtime e
+as tags locais já extraídas. Um arquivo só é relido quando (size, mtime) muda
+e um diretório só é listado de novo quando o seu próprio mtime muda.
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.aac', '.ogg', '.opus', '.wav', '.flac', '.webm')
+
+# Incrementar sempre que o esquema mudar: o índice é apenas um cache e é recriado
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    rel TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    rel TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    sort_key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL DEFAULT 0,
+    tags_parsed INTEGER NOT NULL DEFAULT 0,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    year TEXT,
+    enriched INTEGER NOT NULL DEFAULT 0,
+    e_title TEXT,
+    e_artist TEXT,
+    e_album TEXT,
+    e_year TEXT,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS tracks_dir ON tracks(dir);
+CREATE INDEX IF NOT EXISTS tracks_sort ON tracks(sort_key, rel);
+CREATE INDEX IF NOT EXISTS tracks_mtime ON tracks(mtime);
+CREATE INDEX IF NOT EXISTS tracks_size ON tracks(size);
+"""
+
+# Diretórios modificados há menos que isso não são marcados como "limpos":
+# a resolução do mtime pode esconder uma alteração feita logo após a leitura.
+RACY_WINDOW_NS = 2 * 1_000_000_000
+
+# Tentativas de refresh quando outro processo grava no mesmo banco
+REFRESH_ATTEMPTS = 8
+
+TagReader = Callable[[str], Dict[str, Optional[str]]]
+
+
+def is_audio_file(filename: str) -> bool:
+    """
+    Verifica se o nome de arquivo tem uma extensão de áudio suportada
+    """
+    return filename.lower().endswith(AUDIO_EXTENSIONS)
+
+
+def _join_rel(parent: str, name: str) -> str:
+    return f"{parent}/{name}" if parent else name
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    # Todos os caminhos que começam com "<prefix>/" são < "<prefix>0" ('0' sucede '/')
+    return prefix + '0'
+
+
+class LibraryIndex:
+    """
+    Índice da biblioteca em SQLite, seguro para uso por várias threads.
+
+    Os caminhos são relativos a ``root`` e sempre separados por '/'. A pasta
+    ``covers`` na raiz é ignorada.
+    """
+
+    def __init__(self, db_path: str, root: str, tag_reader: Optional[TagReader] = None):
+        self.db_path = db_path
+        self.root = root
+        self.tag_reader = tag_reader
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._init_schema()
+        self._dirs = {
+            row['rel']: row['mtime_ns']
+            for row in self._conn.execute('SELECT rel, mtime_ns FROM dirs')
+        }
+        self._children: Dict[str, List[str]] = {}
+        for row in self._conn.execute('SELECT rel, parent FROM dirs WHERE parent IS NOT NULL'):
+            self._children.setdefault(row['parent'], []).append(row['rel'])
+
+    def _init_schema(self) -> None:
+        version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self._conn.executescript(
+                'DROP TABLE IF EXISTS meta; DROP TABLE IF EXISTS dirs; DROP TABLE IF EXISTS tracks;'
+            )
+        self._conn.executescript(SCHEMA)
+        self._conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'root'").fetchone()
+        root = os.path.abspath(self.root)
+        if row is None or row['value'] != root:
+            # Índice de outra biblioteca: descarta tudo
+            self._conn.execute('DELETE FROM dirs')
+            self._conn.execute('DELETE FROM tracks')
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('root', ?)", (root,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Sincronização com o sistema de arquivos
+    # ------------------------------------------------------------------
+
+    def refresh(self, force: bool = False, dirs: Optional[Iterable[str]] = None) -> List[Dict[str, object]]:
+        """
+        Atualiza o índice e retorna a lista de mudanças encontradas.
+
+        Sem argumentos, percorre a árvore inteira mas só lista os diretórios
+        cujo mtime mudou. ``dirs`` força a releitura (com stat de cada arquivo)
+        apenas dos diretórios informados; ``force`` faz isso para todos.
+        Cada mudança é um dict com ``action`` ('created', 'modified',
+        'deleted' ou 'renamed'), ``path`` e, para renomeações, ``old_path``;
+        exceto nas remoções, inclui também ``size`` e ``mtime``.
+        """
+        with self._lock:
+            for attempt in range(REFRESH_ATTEMPTS - 1):
+                try:
+                    return self._refresh(force, dirs)
+                except sqlite3.OperationalError as e:
+                    # Outro processo (ex.: outro worker) gravou no banco entre a
+                    # leitura e a escrita desta transação: recomeça do zero
+                    if 'locked' not in str(e):
+                        raise
+                    time.sleep(random.uniform(0.02, 0.1) * (attempt + 1))
+            # Última tentativa com a trava de escrita desde o início: espera os
+            # outros processos em vez de disputar com eles
+            return self._refresh(force, dirs, 'BEGIN IMMEDIATE')
+
+    def _refresh(self, force: bool, dirs: Optional[Iterable[str]],
+                 begin: str = 'BEGIN') -> List[Dict[str, object]]:
+        created: List[sqlite3.Row] = []
+        deleted: List[sqlite3.Row] = []
+        modified: List[Dict[str, object]] = []
+        saved = (dict(self._dirs), {rel: list(children) for rel, children in self._children.items()})
+        self._conn.execute(begin)
+        try:
+            if dirs is None:
+                self._walk('', force, created, deleted, modified)
+            else:
+                for rel_dir in sorted(set(dirs)):
+                    self._walk(rel_dir.strip('/'), True, created, deleted, modified, recursive=False)
+            changes = self._pair_renames(created, deleted)
+            changes.extend(dict(item, action='modified') for item in modified)
+            self._conn.execute('COMMIT')
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            # O que foi desfeito no banco também sai da memória
+            self._dirs, self._children = saved
+            raise
+        return changes
+
+    def _walk(self, start: str, force: bool, created: list, deleted: list, modified: list,
+              recursive: bool = True) -> None:
+        stack = [start]
+        now_ns = time.time_ns()
+        while stack:
+            rel_dir = stack.pop()
+            abs_dir = os.path.join(self.root, rel_dir) if rel_dir else self.root
+            try:
+                st = os.stat(abs_dir)
+            except OSError:
+                self._drop_dir(rel_dir, deleted)
+                continue
+
+            known = self._dirs.get(rel_dir)
+            if not force and known is not None and known == st.st_mtime_ns:
+                if recursive:
+                    stack.extend(self._children.get(rel_dir, ()))
+                continue
+
+            subdirs = []
+            files = {}
+            try:
+                with os.scandir(abs_dir) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir():
+                                if not rel_dir and entry.name == 'covers':
+                                    continue
+                                subdirs.append(_join_rel(rel_dir, entry.name))
+                            elif is_audio_file(entry.name) and entry.is_file():
+                                files[entry.name] = entry.stat()
+                        except OSError:
+                            continue
+            except OSError:
+                self._drop_dir(rel_dir, deleted)
+                continue
+
+            self._sync_dir_files(rel_dir, files, created, deleted, modified)
+
+            for old_child in set(self._children.get(rel_dir, ())) - set(subdirs):
+                self._drop_dir(old_child, deleted)
+            self._children[rel_dir] = subdirs
+            clean = now_ns - st.st_mtime_ns > RACY_WINDOW_NS
+            mtime_ns = st.st_mtime_ns if clean else -1
+            self._dirs[rel_dir] = mtime_ns
+            parent = None if not rel_dir else (rel_dir.rsplit('/', 1)[0] if '/' in rel_dir else '')
+            self._conn.execute(
+                'INSERT OR REPLACE INTO dirs (rel, parent, mtime_ns) VALUES (?, ?, ?)',
+                (rel_dir, parent, mtime_ns),
+            )
+            if recursive:
+                stack.extend(subdirs)
+            else:
+                # Subdiretórios novos ainda precisam ser indexados
+                stack.extend(d for d in subdirs if d not in self._dirs)
+
+    def _sync_dir_files(self, rel_dir: str, files: Dict[str, os.stat_result],
+                        created: list, deleted: list, modified: list) -> None:
+        existing = {
+            row['name']: row
+            for row in self._conn.execute('SELECT * FROM tracks WHERE dir = ?', (rel_dir,))
+        }
+        for name, row in existing.items():
+            if name not in files:
+                deleted.append(row)
+                self._conn.execute('DELETE FROM tracks WHERE rel = ?', (row['rel'],))
+
+        for name, st in files.items():
+            rel = _join_rel(rel_dir, name)
+            row = existing.get(name)
+            if row is not None and row['size'] == st.st_size and row['mtime_ns'] == st.st_mtime_ns:
+                continue
+            # Arquivo novo ou alterado: tags precisam ser relidas
+            self._conn.execute(
+                'INSERT OR REPLACE INTO tracks '
+                '(rel, dir, name, sort_key, size, mtime, mtime_ns, inode, tags_parsed) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)',
+                (rel, rel_dir, name, name.lower(), st.st_size, st.st_mtime, st.st_mtime_ns, st.st_ino),
+            )
+            if row is None:
+                created.append({'rel': rel, 'inode': st.st_ino, 'size': st.st_size, 'mtime': st.st_mtime})
+            else:
+                modified.append({'path': rel, 'size': st.st_size, 'mtime': st.st_mtime})
+
+    def _drop_dir(self, rel_dir: str, deleted: list) -> None:
+        """Remove do índice um diretório que deixou de existir (e tudo abaixo dele)."""
+        if rel_dir not in self._dirs:
+            return
+        for child in self._children.pop(rel_dir, ()):
+            self._drop_dir(child, deleted)
+        deleted.extend(self._conn.execute('SELECT * FROM tracks WHERE dir = ?', (rel_dir,)).fetchall())
+        self._conn.execute('DELETE FROM tracks WHERE dir = ?', (rel_dir,))
+        self._conn.execute('DELETE FROM dirs WHERE rel = ?', (rel_dir,))
+        del self._dirs[rel_dir]
+
+    def _pair_renames(self, created: list, deleted: list) -> List[Dict[str, str]]:
+        """Casa remoções e criações do mesmo inode como renomeações (preservando as tags)."""
+        changes = []
+        by_inode = {}
+        for row in deleted:
+            if row['inode']:
+                by_inode.setdefault((row['inode'], row['size']), []).append(row)
+        renamed_from = set()
+        for item in created:
+            candidates = by_inode.get((item['inode'], item['size'])) if item['inode'] else None
+            if candidates:
+                old = candidates.pop(0)
+                renamed_from.add(old['rel'])
+                self._conn.execute(
+                    'UPDATE tracks SET tags_parsed = ?, title = ?, artist = ?, album = ?, year = ?, '
+                    'enriched = ?, e_title = ?, e_artist = ?, e_album = ?, e_year = ?, content_hash = ? '
+                    'WHERE rel = ?',
+                    (old['tags_parsed'], old['title'], old['artist'], old['album'], old['year'],
+                     old['enriched'], old['e_title'], old['e_artist'], old['e_album'], old['e_year'],
+                     old['content_hash'], item['rel']),
+                )
+                changes.append({'action': 'renamed', 'path': item['rel'], 'old_path': old['rel'],
+                                'size': item['size'], 'mtime': item['mtime']})
+            else:
+                changes.append({'action': 'created', 'path': item['rel'],
+                                'size': item['size'], 'mtime': item['mtime']})
+        changes.extend(
+            {'action': 'deleted', 'path': row['rel']} for row in deleted if row['rel'] not in renamed_from
+        )
+        return changes
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _where(prefix: str, modified_after: Optional[float] = None) -> Tuple[List[str], list]:
+        clauses = []
+        params: list = []
+        prefix = prefix.strip('/')
+        if prefix:
+            clauses.append('rel > ? AND rel < ?')
+            params.extend([prefix + '/', _prefix_upper_bound(prefix)])
+        if modified_after is not None:
+            clauses.append('mtime > ?')
+            params.append(modified_after)
+        return clauses, params
+
+    def tracks(self, prefix: str = '', modified_after: Optional[float] = None,
+               after: Optional[Tuple[str, str]] = None, limit: Optional[int] = None) -> List[sqlite3.Row]:
+        """
+        Retorna as faixas indexadas, ordenadas por nome (sem diferenciar
+        maiúsculas) e, em caso de empate, pelo caminho.
+
+        ``prefix`` limita a busca a um diretório (e seus subdiretórios).
+        ``after`` é a chave ``(sort_key, rel)`` da última faixa da página
+        anterior, para paginação por cursor.
+        """
+        clauses, params = self._where(prefix, modified_after)
+        if after is not None:
+            clauses.append('(sort_key, rel) > (?, ?)')
+            params.extend(after)
+        sql = 'SELECT * FROM tracks'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY sort_key, rel'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def count(self, prefix: str = '') -> int:
+        clauses, params = self._where(prefix)
+        sql = 'SELECT COUNT(*) FROM tracks'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def playlists(self) -> List[Dict[str, object]]:
+        """
+        Lista os diretórios de primeiro nível com a quantidade de músicas
+        diretamente dentro de cada um.
+        """
+        with self._lock:
+            names = [rel for rel in self._children.get('', ())]
+            counts = {
+                row['dir']: row['n']
+                for row in self._conn.execute(
+                    "SELECT dir, COUNT(*) AS n FROM tracks WHERE dir != '' AND instr(dir, '/') = 0 GROUP BY dir"
+                )
+            }
+        return [{'name': name, 'music_count': counts.get(name, 0)} for name in names]
+
+    def has_dir(self, rel_dir: str) -> bool:
+        with self._lock:
+            return rel_dir.strip('/') in self._dirs
+
+    def ensure_tags(self, rows: Iterable[sqlite3.Row]) -> Dict[str, Dict[str, Optional[str]]]:
+        """
+        Retorna as tags locais de cada faixa, lendo do arquivo (e persistindo)
+        somente as que ainda não foram extraídas desde a última alteração.
+        """
+        result = {}
+        pending = []
+        for row in rows:
+            if row['tags_parsed']:
+                result[row['rel']] = {k: row[k] for k in ('title', 'artist', 'album', 'year')}
+            else:
+                pending.append(row)
+
+        parsed = []
+        for row in pending:
+            tags = {'title': None, 'artist': None, 'album': None, 'year': None}
+            if self.tag_reader is not None:
+                try:
+                    tags.update(self.tag_reader(os.path.join(self.root, row['rel'])))
+                except Exception:
+                    pass
+            tags = {k: (str(tags[k]) if tags.get(k) is not None else None) for k in ('title', 'artist', 'album', 'year')}
+            result[row['rel']] = tags
+            parsed.append((tags['title'], tags['artist'], tags['album'], tags['year'],
+                           row['rel'], row['size'], row['mtime_ns']))
+
+        if parsed:
+            with self._lock:
+                # Só grava se o arquivo não mudou enquanto as tags eram lidas
+                self._conn.execute('BEGIN')
+                self._conn.executemany(
+                    'UPDATE tracks SET tags_parsed = 1, title = ?, artist = ?, album = ?, year = ? '
+                    'WHERE rel = ? AND size = ? AND mtime_ns = ?',
+                    parsed,
+                )
+                self._conn.execute('COMMIT')
+        return result
+
+    def save_enrichment(self, row: sqlite3.Row, data: Dict[str, Optional[str]]) -> None:
+        """
+        Persiste o resultado da consulta externa (Deezer) de uma faixa. Um dict
+        vazio registra que nada foi encontrado. É descartado se o arquivo mudou.
+        """
+        values = tuple(str(data[k]) if data.get(k) else None for k in ('title', 'artist', 'album', 'year'))
+        with self._lock:
+            self._conn.execute(
+                'UPDATE tracks SET enriched = 1, e_title = ?, e_artist = ?, e_album = ?, e_year = ? '
+                'WHERE rel = ? AND size = ? AND mtime_ns = ?',
+                values + (row['rel'], row['size'], row['mtime_ns']),
+            )
+
+    def with_size(self, size: int) -> List[sqlite3.Row]:
+        """Faixas com exatamente ``size`` bytes (candidatas a conteúdo idêntico)."""
+        with self._lock:
+            return self._conn.execute('SELECT * FROM tracks WHERE size = ?', (size,)).fetchall()
+
+    def save_hash(self, row: sqlite3.Row, digest: str) -> None:
+        """Guarda o hash do conteúdo de uma faixa; descartado se o arquivo mudou."""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE tracks SET content_hash = ? WHERE rel = ? AND size = ? AND mtime_ns = ?',
+                (digest, row['rel'], row['size'], row['mtime_ns']),
+            )
+
+    def get(self, rel: str) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute('SELECT * FROM tracks WHERE rel = ?', (rel,)).fetchone()
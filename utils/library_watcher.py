@@ -0,0 +1,277 @@
+"""
+Observador da biblioteca e jornal de mudanças
+
+O ``LibraryWatcher`` usa inotify (Linux, via ctypes) para descobrir quais
+diretórios mudaram e, na falta dele, faz polling periódico. As mudanças
+encontradas pelo índice são registradas no ``ChangeJournal``, um buffer
+circular com números de sequência crescentes.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+# on_change(dirs, force): dirs=None significa "verificar a árvore inteira"
+ChangeCallback = Callable[[Optional[Set[str]], bool], None]
+
+
+class ChangeJournal:
+    """
+    Buffer circular de eventos da biblioteca com sequência monotônica.
+
+    ``journal_id`` muda a cada processo: um cliente com cursor de outro
+    processo (ou antigo demais, já descartado do buffer) precisa recarregar.
+
+    Cada ``append`` notifica ``condition``; jornais que compartilham a mesma
+    condição podem ser aguardados juntos (ver ``wait_for_events``).
+    """
+
+    def __init__(self, maxlen: int = 4096, condition: Optional[threading.Condition] = None):
+        self.journal_id = uuid.uuid4().hex[:12]
+        self.condition = condition or threading.Condition()
+        self._events = deque(maxlen=maxlen)
+        self._seq = 0
+        self._lock = self.condition
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def append(self, action: str, path: str, **extra) -> Dict[str, object]:
+        with self._lock:
+            self._seq += 1
+            event = {'seq': self._seq, 'time': time.time(), 'action': action, 'path': path}
+            event.update(extra)
+            self._events.append(event)
+            self.condition.notify_all()
+            return event
+
+    def since(self, seq: int) -> Optional[List[Dict[str, object]]]:
+        """
+        Eventos com sequência maior que ``seq``, ou None se o cursor não
+        puder ser atendido (eventos já descartados ou cursor do futuro).
+        """
+        with self._lock:
+            if seq > self._seq or seq < 0:
+                return None
+            if seq == self._seq:
+                return []
+            if not self._events or self._events[0]['seq'] > seq + 1:
+                return None
+            # Os eventos são contíguos: posição direta no deque
+            start = seq + 1 - self._events[0]['seq']
+            return [self._events[i] for i in range(start, len(self._events))]
+
+    def since_time(self, timestamp: float) -> List[Dict[str, object]]:
+        with self._lock:
+            return [event for event in self._events if event['time'] > timestamp]
+
+
+def wait_for_events(cursors: Dict['ChangeJournal', int], timeout: float) -> bool:
+    """
+    Bloqueia até algum jornal passar da sequência em ``cursors`` (todos devem
+    compartilhar a mesma condição) ou até ``timeout``. Retorna True se houve
+    evento novo.
+    """
+    condition = next(iter(cursors)).condition
+    with condition:
+        return condition.wait_for(
+            lambda: any(journal.seq > seq for journal, seq in cursors.items()), timeout
+        )
+
+
+class _Inotify:
+    """Acesso mínimo à API inotify do Linux via ctypes."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 falhou')
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: float):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        buf = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = buf[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class LibraryWatcher(threading.Thread):
+    """
+    Thread que avisa ``on_change`` sempre que algo muda em ``root``.
+
+    Com inotify, informa apenas os diretórios afetados (agrupando rajadas de
+    eventos por ``debounce`` segundos). Sem inotify, chama ``on_change(None,
+    False)`` a cada ``poll_interval`` segundos e faz uma verificação completa
+    (``force=True``) a cada ``full_scan_every`` ciclos, pois o mtime do
+    diretório não muda quando um arquivo é reescrito no lugar.
+    """
+
+    def __init__(self, root: str, on_change: ChangeCallback, mode: str = 'auto',
+                 poll_interval: float = 2.0, debounce: float = 0.3, full_scan_every: int = 30,
+                 is_relevant: Optional[Callable[[str], bool]] = None):
+        super().__init__(name='library-watcher', daemon=True)
+        self.root = root
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.full_scan_every = full_scan_every
+        self.is_relevant = is_relevant or (lambda name: True)
+        self._stop_event = threading.Event()
+        self._inotify: Optional[_Inotify] = None
+        self._wd_to_dir: Dict[int, str] = {}
+        self.mode = 'poll'
+        if mode in ('auto', 'inotify'):
+            try:
+                self._inotify = _Inotify()
+                self._watch_tree('')
+                self.mode = 'inotify'
+            except (OSError, AttributeError):
+                # Sem inotify (outro SO, limite de watches etc.): cai para polling
+                if self._inotify is not None:
+                    self._inotify.close()
+                    self._inotify = None
+                self._wd_to_dir.clear()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        try:
+            if self.mode == 'inotify':
+                self._run_inotify()
+            else:
+                self._run_polling()
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+
+    def _run_polling(self) -> None:
+        cycle = 0
+        while not self._stop_event.wait(self.poll_interval):
+            cycle += 1
+            self._notify(None, cycle % self.full_scan_every == 0)
+
+    def _run_inotify(self) -> None:
+        dirty: Set[str] = set()
+        force = False
+        deadline = None
+        while not self._stop_event.is_set():
+            timeout = self.poll_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            for wd, mask, _cookie, name in self._inotify.read_events(timeout):
+                if mask & IN_Q_OVERFLOW:
+                    force = True
+                    continue
+                rel_dir = self._wd_to_dir.get(wd)
+                if mask & IN_IGNORED:
+                    self._wd_to_dir.pop(wd, None)
+                    continue
+                if rel_dir is None:
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    parent = rel_dir.rsplit('/', 1)[0] if '/' in rel_dir else ''
+                    dirty.add(parent)
+                    continue
+                child = f"{rel_dir}/{name}" if rel_dir else name
+                if mask & IN_ISDIR:
+                    if not rel_dir and name == 'covers':
+                        continue
+                    if mask & IN_MOVED_FROM:
+                        self._unwatch_tree(child)
+                    elif mask & (IN_CREATE | IN_MOVED_TO):
+                        try:
+                            self._watch_tree(child)
+                        except OSError:
+                            # Limite de watches atingido: ao menos reindexa tudo
+                            force = True
+                    dirty.add(rel_dir)
+                elif self.is_relevant(name):
+                    dirty.add(rel_dir)
+                if deadline is None and (dirty or force):
+                    deadline = time.monotonic() + self.debounce
+
+            if deadline is not None and time.monotonic() >= deadline:
+                if force:
+                    self._notify(None, True)
+                else:
+                    self._notify(dirty, False)
+                dirty = set()
+                force = False
+                deadline = None
+
+    def _notify(self, dirs: Optional[Set[str]], force: bool) -> None:
+        try:
+            self.on_change(dirs, force)
+        except Exception as e:
+            print(f"❌ Erro ao atualizar a biblioteca: {e}")
+
+    def _watch_tree(self, rel_dir: str) -> None:
+        base = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        for current, dirnames, _ in os.walk(base):
+            rel = os.path.relpath(current, self.root).replace(os.sep, '/')
+            rel = '' if rel == '.' else rel
+            if not rel:
+                dirnames[:] = [d for d in dirnames if d != 'covers']
+            try:
+                wd = self._inotify.add_watch(current, WATCH_MASK)
+            except FileNotFoundError:
+                continue
+            self._wd_to_dir[wd] = rel
+
+    def _unwatch_tree(self, rel_dir: str) -> None:
+        prefix = rel_dir + '/'
+        for wd, rel in list(self._wd_to_dir.items()):
+            if rel == rel_dir or rel.startswith(prefix):
+                self._inotify.rm_watch(wd)
+                self._wd_to_dir.pop(wd, None)
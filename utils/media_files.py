@@ -0,0 +1,188 @@
+"""
+Entrega de arquivos de mídia (áudio e capas)
+
+Respostas condicionais (ETag/Last-Modified), pedidos Range com um ou vários
+intervalos (206, multipart/byteranges), envio zero-cópia via
+``wsgi.file_wrapper`` (sendfile no gunicorn/uWSGI) e delegação do envio ao
+proxy (X-Accel-Redirect do nginx ou X-Sendfile).
+"""
+
+import mimetypes
+import os
+import stat
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from werkzeug.datastructures import Headers
+from werkzeug.exceptions import NotFound
+from werkzeug.http import http_date, is_resource_modified, parse_if_range_header, parse_range_header, quote_etag
+from werkzeug.wrappers import Response
+
+CHUNK_SIZE = 64 * 1024
+# Acima disso o pedido Range é ignorado e o arquivo vai inteiro (RFC 7233, 4.1)
+MAX_RANGES = 16
+
+
+def file_etag(st: os.stat_result) -> str:
+    """ETag forte a partir de inode, tamanho e mtime (sem ler o arquivo)."""
+    return f'{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}'
+
+
+def requested_ranges(environ, etag: str, st: os.stat_result) -> Optional[List[Tuple[int, int]]]:
+    """
+    Intervalos ``(início, fim exclusivo)`` pedidos em ``Range``, ordenados e
+    sem sobreposição. None: responder com o arquivo inteiro (sem Range,
+    Range inválido ou If-Range desatualizado). Lista vazia: nenhum intervalo
+    satisfazível (416).
+    """
+    header = environ.get('HTTP_RANGE')
+    size = st.st_size
+    if not header or size == 0:
+        return None
+    if_range = parse_if_range_header(environ.get('HTTP_IF_RANGE'))
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None and int(st.st_mtime) > if_range.date.timestamp():
+        return None
+    parsed = parse_range_header(header)
+    if parsed is None or parsed.units != 'bytes':
+        return None
+
+    spans = []
+    for start, stop in parsed.ranges:
+        if stop is None:
+            # 'N-' vai até o fim; '-N' são os últimos N bytes
+            start = max(0, size + start) if start < 0 else start
+            stop = size
+        stop = min(stop, size)
+        if start < stop:
+            spans.append((start, stop))
+    if not spans:
+        return []
+
+    # Junta intervalos sobrepostos ou adjacentes
+    spans.sort()
+    merged = [spans[0]]
+    for start, stop in spans[1:]:
+        last_start, last_stop = merged[-1]
+        if start <= last_stop:
+            merged[-1] = (last_start, max(last_stop, stop))
+        else:
+            merged.append((start, stop))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def _read_span(path: str, start: int, length: int):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _span_body(environ, path: str, start: int, length: int):
+    file_wrapper = environ.get('wsgi.file_wrapper')
+    if file_wrapper is None:
+        return _read_span(path, start, length)
+    # PEP 3333: o servidor transmite da posição atual até Content-Length
+    # bytes, com sendfile quando disponível
+    f = open(path, 'rb')
+    f.seek(start)
+    return file_wrapper(f, CHUNK_SIZE)
+
+
+def _multipart_body(path: str, parts, closing: bytes):
+    with open(path, 'rb') as f:
+        for head, start, stop in parts:
+            yield head
+            f.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+            yield b'\r\n'
+        yield closing
+
+
+def send_media_file(environ, path: str, mimetype: Optional[str] = None,
+                    cache_control: Optional[str] = None,
+                    accel_redirect: Optional[str] = None,
+                    sendfile_header: Optional[str] = None) -> Response:
+    """
+    Resposta para ``path`` respeitando If-None-Match/If-Modified-Since,
+    Range e If-Range.
+
+    Com ``accel_redirect`` (URL interna do nginx) ou ``sendfile_header``
+    (ex.: 'X-Sendfile') o corpo fica por conta do proxy, que também trata os
+    pedidos Range; a validação condicional continua sendo feita aqui.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        raise NotFound()
+    if not stat.S_ISREG(st.st_mode):
+        raise NotFound()
+
+    etag = file_etag(st)
+    mimetype = mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    headers = Headers()
+    headers['ETag'] = quote_etag(etag)
+    headers['Last-Modified'] = http_date(st.st_mtime)
+    headers['Accept-Ranges'] = 'bytes'
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+
+    last_modified = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+    if not is_resource_modified(environ, etag, last_modified=last_modified):
+        return Response(status=304, headers=headers)
+
+    if accel_redirect or sendfile_header:
+        response = Response(status=200, mimetype=mimetype, headers=headers)
+        if accel_redirect:
+            response.headers['X-Accel-Redirect'] = accel_redirect
+        else:
+            response.headers[sendfile_header] = path
+        return response
+
+    head_only = environ.get('REQUEST_METHOD') == 'HEAD'
+    size = st.st_size
+    ranges = requested_ranges(environ, etag, st)
+
+    if ranges == []:
+        headers['Content-Range'] = f'bytes */{size}'
+        return Response(status=416, headers=headers)
+
+    if ranges is None or len(ranges) == 1:
+        start, stop = ranges[0] if ranges else (0, size)
+        body = () if head_only else _span_body(environ, path, start, stop - start)
+        response = Response(body, status=206 if ranges else 200, mimetype=mimetype,
+                            headers=headers, direct_passthrough=True)
+        if ranges:
+            response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+        response.content_length = stop - start
+        return response
+
+    boundary = uuid.uuid4().hex
+    parts = []
+    length = 0
+    for start, stop in ranges:
+        head = (f'--{boundary}\r\nContent-Type: {mimetype}\r\n'
+                f'Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n').encode('latin-1')
+        parts.append((head, start, stop))
+        length += len(head) + (stop - start) + 2
+    closing = f'--{boundary}--\r\n'.encode('latin-1')
+    length += len(closing)
+    body = () if head_only else _multipart_body(path, parts, closing)
+    response = Response(body, status=206, headers=headers, direct_passthrough=True,
+                        content_type=f'multipart/byteranges; boundary={boundary}')
+    response.content_length = length
+    return response
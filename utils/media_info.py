@@ -0,0 +1,88 @@
+"""
+Cache das extrações do yt-dlp (extract_info)
+
+Uma mesma ação do usuário (extrair o nome, escolher a thumbnail e baixar)
+consulta a mesma URL várias vezes; expandir uma playlist grande leva
+segundos. ``InfoCache`` guarda o resultado por alguns minutos, indexado pela
+URL canônica, e garante uma única extração simultânea por URL.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+_YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com')
+# Parâmetros que não mudam o conteúdo (rastreamento, posição na reprodução)
+_IGNORED_PARAMS = {'si', 'feature', 'pp', 't', 'index', 'start_radio', 'utm_source', 'utm_medium', 'utm_campaign'}
+
+
+def canonical_media_url(url: str) -> str:
+    """
+    Forma canônica de uma URL de mídia: esquema/host em minúsculas, sem
+    fragmento nem parâmetros irrelevantes; links do YouTube viram
+    ``/playlist?list=`` (se houver lista) ou ``/watch?v=``.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in _IGNORED_PARAMS]
+    if host in _YOUTUBE_HOSTS or host == 'youtu.be':
+        query = dict(params)
+        video_id = parts.path.strip('/') if host == 'youtu.be' else query.get('v')
+        if query.get('list'):
+            return 'https://www.youtube.com/playlist?' + urlencode({'list': query['list']})
+        if video_id:
+            return 'https://www.youtube.com/watch?' + urlencode({'v': video_id})
+    return urlunsplit((parts.scheme.lower(), host, parts.path, urlencode(sorted(params)), ''))
+
+
+class InfoCache:
+    """
+    Cache em memória com TTL e limite de entradas (LRU). Chamadas simultâneas
+    de ``get`` para a mesma chave esperam uma única execução de ``compute``;
+    erros não são guardados.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._inflight: Dict[Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Outra thread já está extraindo: espera e tenta o cache de novo
+            event.wait()
+
+        try:
+            value = compute()
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def invalidate(self, key: Hashable) -> None:
+        """Descarta o resultado guardado para ``key`` (a próxima ``get`` recalcula)."""
+        with self._lock:
+            self._entries.pop(key, None)
@@ -0,0 +1,69 @@
+"""
+Métricas no formato de texto do Prometheus (GET /metrics)
+
+Contadores, gauges e histogramas são os do ``prometheus_client``, num
+``CollectorRegistry`` próprio do servidor. Valores que já são contados em
+outro lugar (acertos dos caches, jobs na fila) não precisam ser duplicados:
+``SampleCollector`` lê esses valores só na hora da coleta.
+
+Os valores são por processo: com vários workers (gunicorn) cada coleta vê
+apenas o worker que a atendeu.
+"""
+
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST as CONTENT_TYPE
+from prometheus_client import CollectorRegistry, disable_created_metrics, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+
+# Sem as séries *_created: nenhum painel usa o horário de criação
+disable_created_metrics()
+
+LabelValues = Tuple[str, ...]
+# {valores dos labels: número}
+SampleFunction = Callable[[], Dict[LabelValues, float]]
+
+_FAMILIES = {'counter': CounterMetricFamily, 'gauge': GaugeMetricFamily}
+
+
+class SampleCollector(Collector):
+    """Contador ou gauge com labels cujos valores vêm de ``set_function``.
+    Exceções na função omitem as amostras."""
+
+    def __init__(self, kind: str, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[CollectorRegistry] = None):
+        if kind not in _FAMILIES:
+            raise ValueError(f'tipo de métrica inválido: {kind!r}')
+        self._family = _FAMILIES[kind]
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._function: Optional[SampleFunction] = None
+        if registry is not None:
+            registry.register(self)
+
+    def set_function(self, func: SampleFunction) -> None:
+        self._function = func
+
+    def _metric(self) -> Metric:
+        return self._family(self.name, self.documentation, labels=self.labelnames)
+
+    def describe(self) -> Iterator[Metric]:
+        # Só o nome, para o registro recusar duplicatas sem chamar a função
+        yield self._metric()
+
+    def collect(self) -> Iterator[Metric]:
+        metric = self._metric()
+        try:
+            values = self._function() if self._function is not None else {}
+        except Exception:
+            values = {}
+        for labels, value in values.items():
+            metric.add_metric([str(v) for v in labels], value)
+        yield metric
+
+
+def render(registry: CollectorRegistry) -> bytes:
+    """Todas as métricas de ``registry`` no formato de texto (CONTENT_TYPE)."""
+    return generate_latest(registry)
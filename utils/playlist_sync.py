@@ -0,0 +1,159 @@
+"""
+Sincronização incremental de playlists
+
+``PlaylistArchive`` guarda (SQLite) quais vídeos de cada playlist já foram
+baixados e em qual arquivo, o equivalente ao ``download_archive`` do yt-dlp
+mas com o nome do arquivo, para permitir remover o que saiu da playlist.
+Também registra as playlists seguidas, que o ``SyncScheduler`` sincroniza
+periodicamente.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive (
+    playlist TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    file TEXT,
+    added REAL NOT NULL,
+    PRIMARY KEY (playlist, video_id)
+);
+CREATE TABLE IF NOT EXISTS followed (
+    playlist TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    interval REAL NOT NULL,
+    prune INTEGER NOT NULL DEFAULT 0,
+    last_sync REAL
+);
+"""
+
+
+class PlaylistArchive:
+    """Arquivo de downloads por playlist e cadastro das playlists seguidas."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    # ------------------------------------------------------------------
+    # Arquivo de downloads
+
+    def archived(self, playlist: str) -> Dict[str, Optional[str]]:
+        """{video_id: arquivo} já baixados para ``playlist``."""
+        with self._lock:
+            return {
+                row['video_id']: row['file']
+                for row in self._conn.execute('SELECT video_id, file FROM archive WHERE playlist = ?', (playlist,))
+            }
+
+    def record(self, playlist: str, video_id: str, file: Optional[str]) -> None:
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO archive (playlist, video_id, file, added) VALUES (?, ?, ?, ?)',
+                (playlist, video_id, file, time.time()),
+            )
+
+    def forget(self, playlist: str, video_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                'DELETE FROM archive WHERE playlist = ? AND video_id = ?',
+                [(playlist, video_id) for video_id in video_ids],
+            )
+
+    # ------------------------------------------------------------------
+    # Playlists seguidas
+
+    def follow(self, playlist: str, url: str, interval: float, prune: bool) -> None:
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO followed (playlist, url, interval, prune) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(playlist) DO UPDATE SET url = excluded.url, interval = excluded.interval, '
+                'prune = excluded.prune',
+                (playlist, url, interval, int(prune)),
+            )
+
+    def unfollow(self, playlist: str) -> bool:
+        with self._lock:
+            return self._conn.execute('DELETE FROM followed WHERE playlist = ?', (playlist,)).rowcount > 0
+
+    def followed(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    'playlist': row['playlist'],
+                    'url': row['url'],
+                    'interval': row['interval'],
+                    'prune': bool(row['prune']),
+                    'last_sync': row['last_sync'],
+                }
+                for row in self._conn.execute('SELECT * FROM followed ORDER BY playlist')
+            ]
+
+    def due(self, now: float) -> List[Dict[str, Any]]:
+        """Playlists seguidas cuja próxima sincronização já venceu."""
+        return [
+            item for item in self.followed()
+            if item['last_sync'] is None or item['last_sync'] + item['interval'] <= now
+        ]
+
+    def claim_sync(self, item: Dict[str, Any], when: float) -> bool:
+        """Marca ``item`` (de ``due``) como sincronizado em ``when`` se ninguém
+        o fez antes: com vários processos, só um agenda cada sincronização."""
+        with self._lock:
+            return self._conn.execute(
+                'UPDATE followed SET last_sync = ? WHERE playlist = ? AND last_sync IS ?',
+                (when, item['playlist'], item['last_sync']),
+            ).rowcount > 0
+
+    def mark_synced(self, playlist: str, when: float) -> None:
+        with self._lock:
+            self._conn.execute('UPDATE followed SET last_sync = ? WHERE playlist = ?', (when, playlist))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SyncScheduler(threading.Thread):
+    """
+    Thread daemon que, a cada ``check_interval`` segundos, chama
+    ``submit(item)`` para cada playlist seguida com sincronização vencida.
+    Pode rodar em vários processos sobre o mesmo banco (``claim_sync``).
+    """
+
+    def __init__(self, archive: PlaylistArchive, submit: Callable[[Dict[str, Any]], None],
+                 check_interval: float = 60):
+        super().__init__(name='playlist-sync', daemon=True)
+        self.archive = archive
+        self.submit = submit
+        self.check_interval = check_interval
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            self.run_due()
+            self._stop_event.wait(self.check_interval)
+
+    def run_due(self) -> None:
+        now = time.time()
+        for item in self.archive.due(now):
+            if not self.archive.claim_sync(item, now):
+                continue
+            try:
+                self.submit(item)
+            except Exception as e:
+                # Devolve a vez: tenta de novo na próxima verificação
+                self.archive.mark_synced(item['playlist'], item['last_sync'])
+                print(f"❌ Erro ao agendar sincronização de {item['playlist']}: {e}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
@@ -0,0 +1,249 @@
+"""
+Uploads retomáveis em partes (protocolo no estilo tus)
+
+O cliente cria o upload informando o tamanho total e envia partes com
+``PATCH`` em qualquer ordem (inclusive em paralelo); cada parte é gravada
+direto na posição certa de um arquivo temporário, sem passar inteira pela
+memória. Os intervalos recebidos ficam em SQLite, então um upload
+interrompido (ou um reinício do servidor) continua de onde parou.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id TEXT PRIMARY KEY,
+    playlist TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    result TEXT
+);
+CREATE TABLE IF NOT EXISTS ranges (
+    upload_id TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    stop INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ranges_upload ON ranges(upload_id);
+CREATE TABLE IF NOT EXISTS writers (
+    upload_id TEXT NOT NULL,
+    started REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS writers_upload ON writers(upload_id);
+"""
+
+CHUNK_SIZE = 1024 * 1024
+# Reservas de escrita mais antigas que isso são de um processo que morreu no
+# meio de uma parte e não seguram mais a montagem do arquivo
+WRITE_TIMEOUT = 300
+
+
+class UploadError(Exception):
+    """Parte inválida; ``status`` é o código HTTP sugerido."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Junta intervalos ``(início, fim exclusivo)`` sobrepostos ou adjacentes."""
+    merged: List[Tuple[int, int]] = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+class ResumableUploads:
+    """
+    Registro dos uploads em andamento.
+
+    ``write`` devolve True para a única chamada que completou o arquivo: é ela
+    que deve entregá-lo à playlist e depois chamar ``finish``.
+    """
+
+    def __init__(self, db_path: str, ttl: float = 24 * 3600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def create(self, playlist: str, filename: str, length: int, directory: str) -> Dict[str, Any]:
+        """Cria o upload com um arquivo temporário (oculto) em ``directory``."""
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(directory, f'.upload-{upload_id}.part')
+        with open(path, 'wb') as f:
+            # Arquivo esparso do tamanho final: cada parte é gravada na sua posição
+            f.truncate(length)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO uploads (id, playlist, filename, length, path, status, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, 'receiving', ?, ?)",
+                (upload_id, playlist, filename, length, path, now, now),
+            )
+            return self._upload(self._row(upload_id))
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._row(upload_id)
+            return self._upload(row) if row is not None else None
+
+    def write(self, upload_id: str, offset: int, stream, length: Optional[int]) -> Tuple[Dict[str, Any], bool]:
+        """Grava ``length`` bytes de ``stream`` a partir de ``offset``.
+        Retorna (upload, completou).
+
+        A escrita é reservada (tabela ``writers``) antes de tocar no arquivo;
+        quem completa o upload o passa para 'assembling', o que barra novas
+        partes, e espera as escritas em andamento terminarem antes de retornar."""
+        with self._lock:
+            row = self._row(upload_id)
+            if row is None:
+                raise UploadError('Upload não encontrado', 404)
+            if row['status'] != 'receiving':
+                raise UploadError('Upload já concluído', 409)
+            if offset < 0 or offset > row['length']:
+                raise UploadError('Upload-Offset inválido', 409)
+            if length is not None and offset + length > row['length']:
+                raise UploadError('Parte além do tamanho do arquivo', 413)
+            reservation = self._conn.execute('INSERT INTO writers (upload_id, started) VALUES (?, ?)',
+                                             (upload_id, time.time())).lastrowid
+
+        limit = row['length'] - offset if length is None else length
+        written = 0
+        try:
+            with open(row['path'], 'r+b') as f:
+                f.seek(offset)
+                while written < limit:
+                    chunk = stream.read(min(CHUNK_SIZE, limit - written))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    written += len(chunk)
+        except BaseException:
+            with self._lock:
+                self._conn.execute('DELETE FROM writers WHERE rowid = ?', (reservation,))
+            raise
+
+        with self._lock:
+            self._conn.execute('DELETE FROM writers WHERE rowid = ?', (reservation,))
+            row = self._row(upload_id)
+            if row is None or row['status'] != 'receiving':
+                raise UploadError('Upload já concluído', 409)
+            if written:
+                self._conn.execute(
+                    'INSERT INTO ranges (upload_id, start, stop) VALUES (?, ?, ?)',
+                    (upload_id, offset, offset + written),
+                )
+            received = self._received(upload_id)
+            complete = received == [(0, row['length'])]
+            status = 'assembling' if complete else 'receiving'
+            self._conn.execute('UPDATE uploads SET status = ?, updated = ? WHERE id = ?',
+                               (status, time.time(), upload_id))
+            upload = self._upload(self._row(upload_id))
+        if complete:
+            self._wait_writers(upload_id)
+        return upload, complete
+
+    def _wait_writers(self, upload_id: str) -> None:
+        # Partes repetidas que começaram antes da montagem ainda podem estar
+        # gravando (inclusive em outro processo): o arquivo só é entregue depois
+        while True:
+            with self._lock:
+                busy = self._conn.execute(
+                    'SELECT COUNT(*) FROM writers WHERE upload_id = ? AND started > ?',
+                    (upload_id, time.time() - WRITE_TIMEOUT),
+                ).fetchone()[0]
+            if not busy:
+                return
+            time.sleep(0.05)
+
+    def finish(self, upload_id: str, result: Dict[str, Any], failed: bool = False) -> None:
+        """Registra o resultado da entrega à playlist e descarta os intervalos."""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE uploads SET status = ?, result = ?, updated = ? WHERE id = ?',
+                ('failed' if failed else 'done', json.dumps(result, ensure_ascii=False), time.time(), upload_id),
+            )
+            self._conn.execute('DELETE FROM ranges WHERE upload_id = ?', (upload_id,))
+
+    def delete(self, upload_id: str) -> bool:
+        with self._lock:
+            row = self._row(upload_id)
+            if row is None:
+                return False
+            self._drop(row)
+            return True
+
+    def expire(self) -> None:
+        """Descarta uploads sem atividade há mais de ``ttl`` segundos."""
+        with self._lock:
+            for row in self._conn.execute('SELECT * FROM uploads WHERE updated < ?',
+                                          (time.time() - self.ttl,)).fetchall():
+                self._drop(row)
+
+    def _drop(self, row: sqlite3.Row) -> None:
+        if row['status'] in ('receiving', 'assembling'):
+            try:
+                os.remove(row['path'])
+            except OSError:
+                pass
+        self._conn.execute('DELETE FROM ranges WHERE upload_id = ?', (row['id'],))
+        self._conn.execute('DELETE FROM writers WHERE upload_id = ?', (row['id'],))
+        self._conn.execute('DELETE FROM uploads WHERE id = ?', (row['id'],))
+
+    def _row(self, upload_id: str) -> Optional[sqlite3.Row]:
+        return self._conn.execute('SELECT * FROM uploads WHERE id = ?', (upload_id,)).fetchone()
+
+    def _received(self, upload_id: str) -> List[Tuple[int, int]]:
+        rows = self._conn.execute('SELECT start, stop FROM ranges WHERE upload_id = ?', (upload_id,))
+        merged = merge_ranges([(row['start'], row['stop']) for row in rows])
+        # Mantém a tabela compacta: um registro por intervalo contínuo
+        self._conn.execute('DELETE FROM ranges WHERE upload_id = ?', (upload_id,))
+        self._conn.executemany('INSERT INTO ranges (upload_id, start, stop) VALUES (?, ?, ?)',
+                               [(upload_id, start, stop) for start, stop in merged])
+        return merged
+
+    def _upload(self, row: sqlite3.Row) -> Dict[str, Any]:
+        ranges = merge_ranges([
+            (r['start'], r['stop'])
+            for r in self._conn.execute('SELECT start, stop FROM ranges WHERE upload_id = ?', (row['id'],))
+        ])
+        # Offset no sentido do tus: bytes contínuos recebidos desde o início
+        offset = ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+        if row['status'] in ('assembling', 'done', 'failed'):
+            offset = row['length']
+        return {
+            'id': row['id'],
+            'playlist': row['playlist'],
+            'filename': row['filename'],
+            'length': row['length'],
+            'offset': offset,
+            'received': [[start, stop] for start, stop in ranges],
+            'path': row['path'],
+            'status': row['status'],
+            'created': row['created'],
+            'updated': row['updated'],
+            'result': json.loads(row['result']) if row['result'] else None,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
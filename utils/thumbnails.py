@@ -0,0 +1,159 @@
+"""
+Miniaturas das capas em vários tamanhos (WebP)
+
+Cada capa em COVERS_DIR gera miniaturas em ``COVERS_DIR/thumbs`` com nomes
+derivados do conteúdo (``<hash>-<tamanho>.webp``): o mesmo nome sempre tem
+os mesmos bytes, então as URLs podem ser guardadas em cache para sempre.
+Capas idênticas (ex.: capa da playlist copiada de uma música) compartilham
+as miniaturas. Requer Pillow; sem ele nenhuma miniatura é gerada. O Pillow
+só é importado ao gerar a primeira miniatura.
+"""
+
+import hashlib
+import importlib.util
+import os
+import sqlite3
+import threading
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional, Tuple
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+THUMBS_DIRNAME = 'thumbs'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS covers (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+
+
+def thumbnail_name(digest: str, size: int) -> str:
+    return f'{digest}-{size}.webp'
+
+
+class CoverThumbnails:
+    """
+    Registro (SQLite) das miniaturas já geradas para cada capa.
+
+    ``stale`` diz quais capas precisam (re)gerar miniaturas; ``generate`` faz
+    o trabalho pesado e deve rodar fora da requisição. ``generation`` muda a
+    cada miniatura nova, para invalidar ETags de listagens.
+    """
+
+    def __init__(self, covers_dir: str, db_path: str, sizes: Iterable[int] = (64, 256, 600), quality: int = 80):
+        self.covers_dir = covers_dir
+        self.thumbs_dir = os.path.join(covers_dir, THUMBS_DIRNAME)
+        self.db_path = db_path
+        self.sizes = tuple(sorted(sizes))
+        self.quality = quality
+        self.generation = 0
+        self._available: Optional[bool] = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._entries: Dict[str, Tuple[int, int, str]] = {
+            name: (size, mtime_ns, digest)
+            for name, size, mtime_ns, digest in self._conn.execute('SELECT name, size, mtime_ns, digest FROM covers')
+        }
+
+    @property
+    def available(self) -> bool:
+        if self._available is None:
+            self._available = importlib.util.find_spec('PIL') is not None
+        return self._available
+
+    def urls(self, name: str, prefix: str) -> Optional[Dict[str, str]]:
+        """{tamanho: URL} das miniaturas de ``name`` (None se ainda não existem)."""
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        digest = entry[2]
+        return {str(size): f'{prefix}{THUMBS_DIRNAME}/{thumbnail_name(digest, size)}' for size in self.sizes}
+
+    def stale(self, names: Iterable[str]) -> List[str]:
+        """Capas sem miniaturas ou alteradas desde a última geração; esquece as removidas."""
+        if not self.available:
+            return []
+        names = [name for name in names if name.lower().endswith(IMAGE_EXTENSIONS)]
+        stale = []
+        for name in names:
+            try:
+                st = os.stat(os.path.join(self.covers_dir, name))
+            except OSError:
+                continue
+            entry = self._entries.get(name)
+            if entry is None or entry[:2] != (st.st_size, st.st_mtime_ns):
+                stale.append(name)
+        with self._lock:
+            removed = set(self._entries) - set(names)
+            for name in removed:
+                digest = self._entries.pop(name)[2]
+                self._conn.execute('DELETE FROM covers WHERE name = ?', (name,))
+                self._drop_unused(digest)
+        return stale
+
+    def generate(self, name: str) -> bool:
+        """Gera as miniaturas de ``name``; False se a imagem não pôde ser lida."""
+        if not self.available:
+            return False
+        path = os.path.join(self.covers_dir, name)
+        try:
+            st = os.stat(path)
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False
+        digest = hashlib.sha1(data).hexdigest()[:20]
+
+        os.makedirs(self.thumbs_dir, exist_ok=True)
+        missing = [s for s in self.sizes
+                   if not os.path.exists(os.path.join(self.thumbs_dir, thumbnail_name(digest, s)))]
+        if missing:
+            try:
+                from PIL import Image
+                with Image.open(BytesIO(data)) as img:
+                    img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+                    # Do maior para o menor: cada redução parte da anterior
+                    for size in sorted(missing, reverse=True):
+                        img.thumbnail((size, size), Image.LANCZOS)
+                        self._save(img, thumbnail_name(digest, size))
+            except Exception as e:
+                print(f"❌ Erro ao gerar miniaturas de {name}: {e}")
+                return False
+
+        with self._lock:
+            previous = self._entries.get(name)
+            self._entries[name] = (st.st_size, st.st_mtime_ns, digest)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO covers (name, size, mtime_ns, digest) VALUES (?, ?, ?, ?)',
+                (name, st.st_size, st.st_mtime_ns, digest),
+            )
+            self.generation += 1
+            if previous is not None and previous[2] != digest:
+                self._drop_unused(previous[2])
+        return True
+
+    def _save(self, img, filename: str) -> None:
+        # Escreve em arquivo temporário e renomeia: quem lê nunca vê meia imagem
+        target = os.path.join(self.thumbs_dir, filename)
+        tmp = f'{target}.{threading.get_ident()}.tmp'
+        img.save(tmp, 'WEBP', quality=self.quality, method=4)
+        os.replace(tmp, target)
+
+    def _drop_unused(self, digest: str) -> None:
+        if any(entry[2] == digest for entry in self._entries.values()):
+            return
+        for size in self.sizes:
+            try:
+                os.remove(os.path.join(self.thumbs_dir, thumbnail_name(digest, size)))
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,70 @@
+"""
+Fila de trabalho em segundo plano com deduplicação por chave
+"""
+
+import queue
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class DedupWorkQueue:
+    """
+    Executa tarefas em threads daemon, ignorando chaves que já estão na fila
+    ou em execução. As threads só são criadas no primeiro ``submit``.
+    """
+
+    def __init__(self, workers: int = 1, name: str = 'worker'):
+        self.workers = max(1, workers)
+        self.name = name
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._pending: Dict[Hashable, bool] = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args,
+               on_done: Optional[Callable[[Any], None]] = None) -> bool:
+        """
+        Agenda ``fn(*args)``; ``on_done`` recebe o resultado (None em caso
+        de erro). Retorna False se a chave já estava pendente.
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending[key] = True
+            self._start_workers()
+        self._queue.put((key, fn, args, on_done))
+        return True
+
+    def is_pending(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._pending
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._run, name=f'{self.name}-{len(self._threads) + 1}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self) -> None:
+        while True:
+            key, fn, args, on_done = self._queue.get()
+            result = None
+            try:
+                result = fn(*args)
+            except Exception as e:
+                print(f"❌ Erro na tarefa {key!r} ({self.name}): {e}")
+            try:
+                if on_done is not None:
+                    on_done(result)
+            except Exception as e:
+                print(f"❌ Erro ao concluir a tarefa {key!r} ({self.name}): {e}")
+            finally:
+                # Só libera a chave depois de on_done, para não reagendar no meio
+                with self._lock:
+                    self._pending.pop(key, None)